@@ -1,42 +1,163 @@
-from datetime import datetime, UTC
-from typing import Any, Dict, List, Tuple
+from datetime import datetime, timedelta, UTC
+from functools import wraps
+from os import getenv
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
-from flask import Flask, request
+from flask import Flask, Response, request
+from flask.typing import ResponseReturnValue
 from flask_cors import CORS
 from pymongo.errors import DuplicateKeyError
 
-from components.database import subscriptions
+from components.database import get_resolutions_collection, imports, subscriptions, videos
+from components.extractor.resolution_cache import ResolutionCache
+from components.subscriptions.bulk_import import ImportResult, parse_import, start_import_job
 from components.subscriptions.main import Subscription
-from components.videos import VideoTuple
-from components.extractor.extract_sub_info import get_sub_info_from_yt_url
-from .utils import vid_dicts_from_tuple_list, sub_info_from_dict
+from components.subscriptions.polling import HISTORY_SIZE, merge_upload_history
+from components.videos import VIDEO_KEYS, decode_video_fields, video_projection
+from .cache import ALL_SUBSCRIPTIONS, CachedResponse, ResponseCache
+from .utils import (FEED_KEYS, FEED_PAGE_SIZE, PAGE_KEYS, SUB_INFO_PROJECTION, cache_headers,
+                    feed_query, iter_sub_infos, iter_video_fields, parse_interval,
+                    parse_video_page, sort_order, stream_json, sub_info_from_dict,
+                    versions_etag, video_page_query, videos_page)
 
 app = Flask(__name__)
-CORS(app)
+# Let the front-end read the paging and caching headers.
+CORS(app, expose_headers=["ETag", "X-Next-Cursor"])
+cache = ResponseCache(
+    maxsize=int(getenv("API_CACHE_SIZE") or 1024),
+    ttl=float(getenv("API_CACHE_TTL") or 30),
+)
+resolutions = ResolutionCache(get_resolutions_collection(subscriptions))
+
+def cached_view(view: Callable[..., Union[CachedResponse, ResponseReturnValue]]) -> Callable[..., ResponseReturnValue]:
+    """
+    Serve successful responses of the view from the cache, keyed by the
+    request's path and query string. Errors are not cached.
+    """
+    @wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> ResponseReturnValue:
+        cache.watch(subscriptions)
+        response = cache.get(request.full_path)
+        if response is None:
+            result = view(*args, **kwargs)
+            if not isinstance(result, CachedResponse):
+                return result
+            cache.put(request.full_path, result)
+            response = result
+        headers = {**cache_headers(response.etag), **response.headers}
+        if request.if_none_match.contains_weak(response.etag):
+            return "", 304, headers
+        return response.body, 200, headers
+    return wrapper
+
+def streamed(items: Iterable[Any], etag: str, weak: bool = False) -> Response:
+    """
+    Stream the items from the cursor as they are serialised, as a JSON array
+    or, with format=ndjson, one JSON document per line. Such responses can
+    be arbitrarily large, so they are not cached.
+    """
+    ndjson = request.args.get("format") == "ndjson"
+    return Response(
+        stream_json(items, app.json.dumps, ndjson),
+        mimetype="application/x-ndjson" if ndjson else "application/json",
+        headers=cache_headers(etag, weak),
+    )
+
+def not_modified(etag: str, weak: bool = False) -> Optional[ResponseReturnValue]:
+    """
+    Answer from the ETag alone if the client has the response already.
+    """
+    if request.if_none_match.contains_weak(etag):
+        return "", 304, cache_headers(etag, weak)
+    return None
 
 @app.route("/vid-from-link/<id>")
-def videos_from_link(id: str) -> Tuple[List[Dict[str, Any]], int]:
-    sub_dict = subscriptions.find_one({"_id": id})
-    if sub_dict:
-        return vid_dicts_from_tuple_list(sub_dict["videos"]), 200
-    return [{'error': "Subscription %s not found"%id }], 404
+@cached_view
+def videos_from_link(id: str) -> Union[CachedResponse, ResponseReturnValue]:
+    sub_dict = subscriptions.find_one({"_id": id}, {"version": 1})
+    if not sub_dict:
+        return [{'error': "Subscription %s not found"%id }], 404
+    etag = versions_etag([sub_dict], request.query_string)
+    if unchanged := not_modified(etag):
+        return unchanged
+    try:
+        page = parse_video_page(request.args)
+        query = video_page_query(id, page)
+    except ValueError:
+        return [{'error': 'Invalid data'}], 400
+    # The cursor is built from the last video, so always fetch its keys.
+    docs = videos.find(
+        query, video_projection({*page.fields, *PAGE_KEYS})
+    ).sort(sort_order(PAGE_KEYS)).limit(page.limit)
+    if not page.limit:
+        return streamed(iter_video_fields(docs, page.fields), etag)
+    vids, headers = videos_page(docs, page.limit, PAGE_KEYS, page.fields)
+    return CachedResponse(etag, vids, headers, frozenset([id]))
+
+@app.route("/feed")
+@cached_view
+def feed() -> Union[CachedResponse, ResponseReturnValue]:
+    sub_ids = request.args.get("subs")
+    only_new = request.args.get("only_new") in ("1", "true")
+    sub_filter = {"_id": {"$in": sub_ids.split(",")}} if sub_ids else {}
+    sub_dicts = list(subscriptions.find(sub_filter, {"last_viewed": 1, "version": 1}))
+    if sub_ids:
+        found = {sub_dict["_id"] for sub_dict in sub_dicts}
+        for id in sub_ids.split(","):
+            if id not in found:
+                return [{'error': "Subscription %s not found"%id }], 404
+    etag = versions_etag(sub_dicts, request.query_string)
+    if unchanged := not_modified(etag):
+        return unchanged
+    tags = frozenset(sub_ids.split(",") if sub_ids else [ALL_SUBSCRIPTIONS])
+    if not sub_dicts:
+        return CachedResponse(etag, [], {}, tags)
+    try:
+        page = parse_video_page(request.args)
+        query = feed_query(sub_dicts if sub_ids or only_new else None, page, only_new)
+    except ValueError:
+        return [{'error': 'Invalid data'}], 400
+    limit = page.limit or FEED_PAGE_SIZE
+    docs = videos.find(
+        query, video_projection({*page.fields, *FEED_KEYS})
+    ).sort(sort_order(FEED_KEYS)).limit(limit)
+    vids, headers = videos_page(docs, limit, FEED_KEYS, (*page.fields, "sub_id"))
+    return CachedResponse(etag, vids, headers, tags)
 
 @app.route("/sub-info/<id>")
-def sub_dict(id: str) -> Tuple[Dict[str, Any], int]:
-    sub_dict = subscriptions.find_one({"_id": id})
-    if sub_dict:
-        return sub_info_from_dict(sub_dict), 200
-    return {'error': "Subscription %s not found"%id }, 404
+@cached_view
+def sub_dict(id: str) -> Union[CachedResponse, ResponseReturnValue]:
+    sub_dict = subscriptions.find_one({"_id": id}, SUB_INFO_PROJECTION)
+    if not sub_dict:
+        return {'error': "Subscription %s not found"%id }, 404
+    etag = versions_etag([sub_dict])
+    if unchanged := not_modified(etag):
+        return unchanged
+    return CachedResponse(etag, sub_info_from_dict(sub_dict, videos), {}, frozenset([id]))
 
 @app.route("/subs-info")
-def subs_info() -> List[Dict[str, Any]]:
-    return [sub_info_from_dict(sub_dict) for sub_dict in subscriptions.find()]
+def subs_info() -> ResponseReturnValue:
+    """
+    Streamed from the cursor, so that memory does not grow with the number
+    of subscriptions, and thus not cached. The ETag is computed beforehand
+    from the versions alone, so it is weak: the body may include writes made
+    in between, but is never older than the ETag says.
+    """
+    etag = versions_etag(subscriptions.find({}, {"version": 1}).sort("_id"), request.query_string)
+    if unchanged := not_modified(etag, weak=True):
+        return unchanged
+    sub_dicts = subscriptions.find({}, SUB_INFO_PROJECTION).sort("_id")
+    return streamed(iter_sub_infos(sub_dicts, videos), etag, weak=True)
+
+@app.route("/cache-stats")
+def cache_stats() -> Dict[str, Any]:
+    return {**cache.stats(), "resolutions": resolutions.stats()}
 
 @app.post("/add-sub/")
 def add_sub() -> Tuple[Dict[str, Any], int]:
     try:
-        sub_info = get_sub_info_from_yt_url(request.form["url"])
-        time_between_fetches = int(request.form["time_between_fetches"])
+        time_between_fetches = parse_interval(request.form["time_between_fetches"])
+        sub_info = resolutions.get_sub_info(request.form["url"])
     except:
         return {'error': 'Invalid data'}, 400
     sub = Subscription(
@@ -47,24 +168,88 @@ def add_sub() -> Tuple[Dict[str, Any], int]:
     )
     try:
         sub.insert()
-        return sub_info_from_dict(sub.asdict()), 201
+        cache.invalidate(sub._id)
+        return sub_info_from_dict(sub.asdict(), videos), 201
     except DuplicateKeyError:
         return {'error': "Subscription %s already exists"%sub_info["id"] }, 409
 
+@app.post("/import-subs/")
+def import_subs() -> ResponseReturnValue:
+    """
+    Subscribe to every URL of an uploaded OPML file or URL list ("file"), or
+    of the "urls" field. Resolving them can take far longer than a request
+    may, so this only starts a background job; GET /import-subs/<job_id>
+    reports the outcome for each URL once it is done.
+    """
+    try:
+        time_between_fetches = parse_interval(request.form["time_between_fetches"])
+        if "file" in request.files:
+            text = request.files["file"].read().decode()
+        else:
+            text = request.form["urls"]
+        urls = parse_import(text)
+    except:
+        return {'error': 'Invalid data'}, 400
+    def invalidate(results: List[ImportResult]) -> None:
+        for result in results:
+            if result.status == "added":
+                cache.invalidate(result.id)
+    job_id = start_import_job(
+        urls, time_between_fetches, subscriptions, imports,
+        max_workers=int(getenv("IMPORT_WORKERS") or 8),
+        get_sub_info=resolutions.get_sub_info,
+        on_done=invalidate,
+    )
+    return {"_id": job_id, "status": "running"}, 202, {"Location": "/import-subs/%s" % job_id}
+
+@app.route("/import-subs/<job_id>")
+def import_status(job_id: str) -> Tuple[Dict[str, Any], int]:
+    job = imports.find_one({"_id": job_id}, {"expires_at": 0})
+    if not job:
+        return {'error': "Import %s not found"%job_id }, 404
+    return dict(job), 200
+
 @app.patch("/set-time-between-fetches/<id>")
 def set_time_between_fetches(id: str) -> Tuple[Dict[str, Any], int]:
+    """
+    Setting both min_time_between_fetches and max_time_between_fetches turns
+    on the adaptive mode, where the collector adjusts time_between_fetches
+    (starting from the given one) within these bounds. Without them, the
+    interval is fixed.
+    """
     try:
-        time_between_fetches = int(request.form["time_between_fetches"])
+        time_between_fetches = parse_interval(request.form["time_between_fetches"])
+        min_time_between_fetches = int(request.form.get("min_time_between_fetches") or 0)
+        max_time_between_fetches = int(request.form.get("max_time_between_fetches") or 0)
+        if max_time_between_fetches and not 0 < min_time_between_fetches <= max_time_between_fetches:
+            raise ValueError("Invalid bounds")
     except:
         return {'error': 'Invalid data'}, 400
-    result = subscriptions.update_one(
-        {"_id": id},
-        {"$set": {"time_between_fetches": time_between_fetches}}
-    )
-    if result.modified_count:
+    sub_dict = subscriptions.find_one({"_id": id}, {"last_fetch": 1, "max_time_between_fetches": 1})
+    if not sub_dict:
+        return {'error': "Subscription %s not found"%id }, 404
+    updated_values: Dict[str, Any] = {
+        "time_between_fetches": time_between_fetches,
+        "min_time_between_fetches": min_time_between_fetches,
+        "max_time_between_fetches": max_time_between_fetches,
+        "next_fetch_at": sub_dict["last_fetch"] + timedelta(seconds=time_between_fetches),
+    }
+    if max_time_between_fetches and not sub_dict.get("max_time_between_fetches"):
+        # The feed may well be unchanged (and come back as 304) until the
+        # next upload, so the history starts from the stored videos.
+        updated_values["upload_history"] = merge_upload_history([], (
+            decode_video_fields(doc)["published"] for doc in
+            videos.find({VIDEO_KEYS["sub_id"]: id}, video_projection(["published"]))
+                  .sort(VIDEO_KEYS["published"], -1).limit(HISTORY_SIZE)
+        ))
+    result = subscriptions.update_one({"_id": id}, {"$set": updated_values, "$inc": {"version": 1}})
+    cache.invalidate(id)
+    if result.matched_count:
         return {
             "_id": id,
             "time_between_fetches": time_between_fetches,
+            "min_time_between_fetches": min_time_between_fetches,
+            "max_time_between_fetches": max_time_between_fetches,
         }, 200
     return {'error': "Subscription %s not found"%id }, 404
 
@@ -73,6 +258,8 @@ def delete_sub(id: str) -> Tuple[Dict[str, Any], int]:
     result = subscriptions.delete_one({"_id": id})
     if not result.deleted_count:
         return {'error': "Subscription %s not found"%id }, 404
+    videos.delete_many({VIDEO_KEYS["sub_id"]: id})
+    cache.invalidate(id)
     return { "_id": id, }, 200
 
 @app.patch("/set-viewed/<id>")
@@ -87,8 +274,9 @@ def set_viewed(id:str) -> Tuple[Dict[str, Any], int]:
         viewed_time = datetime.now(tz=UTC)
     result = subscriptions.update_one(
         {"_id": id},
-        {"$set": {"last_viewed": viewed_time}}
+        {"$set": {"last_viewed": viewed_time}, "$inc": {"version": 1}}
     )
+    cache.invalidate(id)
     if result.modified_count:
         return {
             "_id": id,
@@ -0,0 +1,134 @@
+from collections import OrderedDict
+from sys import stderr
+from threading import Lock, Thread
+from time import monotonic
+from typing import Any, Callable, Dict, FrozenSet, NamedTuple, Optional, Tuple
+
+from pymongo.collection import Collection
+from pymongo.errors import ConnectionFailure
+
+from components.subscriptions.typing import SubsDict
+
+# The tag of responses built from every subscription, such as /subs-info.
+# They are dropped whenever any subscription changes.
+ALL_SUBSCRIPTIONS = "*"
+
+# Seconds before reopening a change stream which failed, doubled after each
+# failure up to the maximum.
+WATCH_RETRY_DELAY = 1
+MAX_WATCH_RETRY_DELAY = 300
+
+class CachedResponse(NamedTuple):
+    etag: str
+    body: Any
+    headers: Dict[str, str]
+    tags: FrozenSet[str] # The ids of the subscriptions it was built from.
+
+class ResponseCache:
+    """
+    A bounded LRU cache of API responses, which also expire after ttl
+    seconds. Entries are dropped when a subscription they were built from
+    changes, as reported by the API's own writes and by a change stream on
+    the subscriptions collection. Change streams need a replica set, so
+    without one (or under mongomock) only the TTL bounds staleness. A stream
+    which fails once open, or cannot reach the server, is reopened with an
+    exponential backoff.
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = 30,
+                 clock: Callable[[], float] = monotonic) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.watching = False
+        self._entries: OrderedDict[str, Tuple[float, CachedResponse]] = OrderedDict()
+        self._lock = Lock()
+        self._watcher: Optional[Thread] = None
+        # When to reopen the change stream, None while it is open or if it
+        # cannot be watched at all.
+        self._retry_at: Optional[float] = None
+        self._retry_delay: float = WATCH_RETRY_DELAY
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, response: CachedResponse) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, sub_id: str) -> None:
+        """
+        Drop the responses built from the given subscription, and those
+        built from all of them.
+        """
+        with self._lock:
+            for key in [
+                key for key, (_, response) in self._entries.items()
+                if sub_id in response.tags or ALL_SUBSCRIPTIONS in response.tags
+            ]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "watching": self.watching,
+        }
+
+    def watch(self, subs_collection: Collection[SubsDict]) -> None:
+        """
+        Start following the changes to the subscriptions in the background,
+        unless already done or waiting to retry. Every write to a
+        subscription or its videos increases its version, so its document
+        changes every time.
+        """
+        with self._lock:
+            if self._watcher and (self._retry_at is None or self.clock() < self._retry_at):
+                return
+            self._retry_at = None
+            self._watcher = Thread(target=self._follow_changes, args=(subs_collection,), daemon=True)
+        self._watcher.start()
+
+    def _follow_changes(self, subs_collection: Collection[SubsDict]) -> None:
+        change: Any # Change events, not subscriptions.
+        retry = True
+        try:
+            with subs_collection.watch() as stream:
+                self.watching = True
+                self._retry_delay = WATCH_RETRY_DELAY
+                for change in stream:
+                    if "documentKey" in change:
+                        self.invalidate(change["documentKey"]["_id"])
+                    else: # The collection was dropped, renamed, ...
+                        self.clear()
+        except Exception as e:
+            # Failing to open it for any other reason than the network means
+            # that it cannot be watched at all, e.g. without a replica set.
+            retry = self.watching or isinstance(e, ConnectionFailure)
+            print("Not watching the subscriptions, cached responses expire after",
+                  self.ttl, "seconds:", e, file=stderr)
+        # Changes may have been missed.
+        self.watching = False
+        self.clear()
+        if retry:
+            with self._lock:
+                self._retry_at = self.clock() + self._retry_delay
+                self._retry_delay = min(self._retry_delay * 2, MAX_WATCH_RETRY_DELAY)
@@ -1,14 +1,258 @@
-from typing import Any, Dict, List
-from components.subscriptions.main import Subscription
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, UTC
+from hashlib import sha1
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple, cast
+from pymongo.collection import Collection
 from components.subscriptions.typing import SubsDict
-from components.videos import VideoTuple
+from components.videos import VIDEO_KEYS, VideoDict, VideoTuple, decode_video_fields
 
-def vid_dicts_from_tuple_list(tuple_list: List[VideoTuple]) -> List[Dict[str, Any]]:
-    return [VideoTuple._make(vid)._asdict() for vid in tuple_list]
+MAX_PAGE_SIZE = 500
+# Streamed responses are sent in chunks of about this many characters.
+STREAM_CHUNK_SIZE = 64 * 1024
+FEED_PAGE_SIZE = 50
+# Streamed subscriptions have their new videos counted this many at a time.
+SUB_INFO_BATCH_SIZE = 100
+# The orders pages are returned in (newest first), ending with a unique key
+# so that a cursor points at exactly one video.
+PAGE_KEYS = ("published", "id")
+FEED_KEYS = ("published", "id", "sub_id")
+# Fields of the subscription documents which are not sent to clients.
+# upload_history and the leases only serve the collectors' scheduling.
+HIDDEN_SUB_FIELDS = ("videos", "upload_history", "lease_owner", "lease_expires")
+SUB_INFO_PROJECTION = {field: 0 for field in HIDDEN_SUB_FIELDS}
 
-def sub_info_from_dict(sub_dict: SubsDict) -> Dict[str, Any]:
-    return {
-        **sub_dict,
-        "videos": len(sub_dict["videos"]),
-        "new_vids": len(Subscription(**sub_dict).get_new_vids()),
-    }
+class VideoPage(NamedTuple):
+    limit: int
+    cursor: Optional[Tuple[Any, ...]]
+    since: Optional[datetime]
+    fields: Tuple[str, ...]
+
+def vid_dicts_from_documents(docs: Iterable[VideoDict]) -> List[Dict[str, Any]]:
+    return [decode_video_fields(doc) for doc in docs]
+
+def iter_video_fields(docs: Iterable[VideoDict], fields: Sequence[str]) -> Iterator[Dict[str, Any]]:
+    for doc in docs:
+        vid = decode_video_fields(doc)
+        yield {key: vid[key] for key in fields}
+
+def videos_page(docs: Iterable[VideoDict], limit: int, keys: Sequence[str],
+                fields: Sequence[str]) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """
+    The requested fields of a page of videos, and the headers pointing to the
+    next page if there may be one. docs must include the fields in keys.
+    """
+    vids = vid_dicts_from_documents(docs)
+    headers: Dict[str, str] = {}
+    if limit and len(vids) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(vids[-1], keys)
+    return [{key: vid[key] for key in fields} for vid in vids], headers
+
+def stream_json(items: Iterable[Any], dumps: Callable[[Any], str],
+                ndjson: bool = False) -> Iterator[str]:
+    """
+    Serialise the items one at a time, as a JSON array or as newline
+    delimited JSON, so that only one chunk is held in memory at once.
+    """
+    chunk: List[str] = [] if ndjson else ["["]
+    size = 0
+    for i, item in enumerate(items):
+        part = dumps(item) + "\n" if ndjson else ("," if i else "") + dumps(item)
+        chunk.append(part)
+        size += len(part)
+        if size >= STREAM_CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk, size = [], 0
+    if not ndjson:
+        chunk.append("]")
+    yield "".join(chunk)
+
+def versions_etag(sub_dicts: Iterable[Mapping[str, Any]], query: bytes = b"") -> str:
+    """
+    A strong validator for a response built from the given subscriptions
+    (in that order) and request parameters. Every write to a subscription
+    or its videos increases its version, which changes the validator.
+    """
+    digest = sha1(query)
+    for sub_dict in sub_dicts:
+        digest.update(("%s:%d;" % (sub_dict["_id"], sub_dict.get("version", 0))).encode())
+    return digest.hexdigest()
+
+def cache_headers(etag: str, weak: bool = False) -> Dict[str, str]:
+    # Clients may keep responses, but must check the ETag before reusing them.
+    return {"ETag": ('W/"%s"' if weak else '"%s"') % etag, "Cache-Control": "no-cache"}
+
+def new_video_counts(sub_dicts: Sequence[SubsDict], videos_collection: Collection[VideoDict]) -> Dict[str, int]:
+    """
+    The number of videos published since each subscription was last viewed,
+    counted by a single aggregation rather than one query per subscription.
+    Each clause is a range of the (sub_id, published) index, so the cost grows
+    with the number of new videos (every video, for a subscription which was
+    never viewed), not with the rest of the history.
+    """
+    counts = {sub_dict["_id"]: 0 for sub_dict in sub_dicts}
+    if not sub_dicts:
+        return counts
+    sub_id, published = VIDEO_KEYS["sub_id"], VIDEO_KEYS["published"]
+    # The grouped documents do not match VideoDict.
+    groups = cast(Collection[Dict[str, Any]], videos_collection).aggregate([
+        {"$match": {"$or": [
+            {sub_id: sub_dict["_id"], published: {"$gt": sub_dict["last_viewed"]}}
+            for sub_dict in sub_dicts
+        ]}},
+        {"$group": {"_id": "$" + sub_id, "count": {"$sum": 1}}},
+    ])
+    for group in groups:
+        counts[group["_id"]] = group["count"]
+    return counts
+
+def sub_infos_from_dicts(sub_dicts: Sequence[SubsDict], videos_collection: Collection[VideoDict]) -> List[Dict[str, Any]]:
+    """
+    The total number of videos is kept on each subscription, and the new
+    ones are counted for all of them at once by new_video_counts().
+    """
+    new_vids = new_video_counts(sub_dicts, videos_collection)
+    sub_infos = []
+    for sub_dict in sub_dicts:
+        video_count = sub_dict.get("video_count")
+        if video_count is None:
+            # Not yet counted by the migration.
+            video_count = videos_collection.count_documents({VIDEO_KEYS["sub_id"]: sub_dict["_id"]})
+        sub_infos.append({
+            **{key: value for key, value in sub_dict.items() if key not in HIDDEN_SUB_FIELDS},
+            "videos": video_count,
+            "new_vids": new_vids[sub_dict["_id"]],
+        })
+    return sub_infos
+
+def iter_sub_infos(sub_dicts: Iterable[SubsDict], videos_collection: Collection[VideoDict],
+                   batch_size: int = SUB_INFO_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Like sub_infos_from_dicts(), but reading the subscriptions batch_size at
+    a time, so that they can be streamed from a cursor.
+    """
+    batch: List[SubsDict] = []
+    for sub_dict in sub_dicts:
+        batch.append(sub_dict)
+        if len(batch) == batch_size:
+            yield from sub_infos_from_dicts(batch, videos_collection)
+            batch = []
+    yield from sub_infos_from_dicts(batch, videos_collection)
+
+def sub_info_from_dict(sub_dict: SubsDict, videos_collection: Collection[VideoDict]) -> Dict[str, Any]:
+    return sub_infos_from_dicts([sub_dict], videos_collection)[0]
+
+def parse_datetime(value: str) -> datetime:
+    """
+    Parse an ISO 8601 timestamp, taking naive ones to be in UTC like the
+    stored dates are.
+    """
+    date = datetime.fromisoformat(value)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=UTC)
+    return date
+
+def parse_interval(value: str) -> int:
+    """
+    Parse a number of seconds between fetches, which must be positive for
+    the collector not to fetch the subscription over and over.
+    """
+    interval = int(value)
+    if interval <= 0:
+        raise ValueError("Non-positive interval %d" % interval)
+    return interval
+
+def encode_cursor(vid: Mapping[str, Any], keys: Sequence[str]) -> str:
+    """
+    An opaque token pointing just past the given video in the order of keys,
+    the first of which is the published date.
+    """
+    values = [vid[keys[0]].isoformat(), *(vid[key] for key in keys[1:])]
+    return urlsafe_b64encode("|".join(values).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[Any, ...]:
+    try:
+        published, *ids = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return (parse_datetime(published), *ids)
+    except Exception as e:
+        raise ValueError("Invalid cursor %r" % cursor) from e
+
+def parse_video_page(args: Mapping[str, str]) -> VideoPage:
+    """
+    Read the paging parameters of a request. Without a limit every video
+    is returned, and without fields every field is, as before paging.
+    Raises ValueError on malformed input.
+    """
+    limit = int(args.get("limit", 0))
+    if limit < 0:
+        raise ValueError("Negative limit %d" % limit)
+    cursor = decode_cursor(args["cursor"]) if args.get("cursor") else None
+    since = parse_datetime(args["since"]) if args.get("since") else None
+    if args.get("fields"):
+        fields = tuple(args["fields"].split(","))
+        for name in fields:
+            if name not in VideoTuple._fields:
+                raise ValueError("Unknown field %r" % name)
+    else:
+        fields = VideoTuple._fields
+    return VideoPage(min(limit, MAX_PAGE_SIZE), cursor, since, fields)
+
+def sort_order(keys: Sequence[str]) -> List[Tuple[str, int]]:
+    return [(VIDEO_KEYS[key], -1) for key in keys]
+
+def after_cursor(cursor: Tuple[Any, ...], keys: Sequence[str]) -> Dict[str, Any]:
+    """
+    The filter for the videos after the cursor in the (descending) order of
+    keys. Keying on the last video seen rather than on an offset keeps pages
+    stable while new videos are being inserted.
+    """
+    if len(cursor) != len(keys):
+        raise ValueError("Cursor does not match the order")
+    clauses = []
+    for n, key in enumerate(keys):
+        clause: Dict[str, Any] = {VIDEO_KEYS[k]: value for k, value in zip(keys[:n], cursor)}
+        clause[VIDEO_KEYS[key]] = {"$lt": cursor[n]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+def all_of(conditions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+def video_page_query(sub_id: str, page: VideoPage) -> Dict[str, Any]:
+    """
+    The filter for a page of a subscription's videos in PAGE_KEYS order.
+    """
+    conditions: List[Dict[str, Any]] = [{VIDEO_KEYS["sub_id"]: sub_id}]
+    if page.since:
+        conditions.append({VIDEO_KEYS["published"]: {"$gt": page.since}})
+    if page.cursor:
+        conditions.append(after_cursor(page.cursor, PAGE_KEYS))
+    return all_of(conditions)
+
+def feed_query(sub_dicts: Optional[List[SubsDict]], page: VideoPage,
+               only_new: bool = False) -> Dict[str, Any]:
+    """
+    The filter for a page of the videos of the given (non-empty list of)
+    subscriptions, or of all of them if None, in FEED_KEYS order. With only_new, each
+    subscription only contributes the videos published since it was last
+    viewed. Every clause is a range of the (sub_id, published) index, or of
+    the (published) one for the whole collection, so the database merges
+    index ranges instead of sorting the videos.
+    """
+    sub_id, published = VIDEO_KEYS["sub_id"], VIDEO_KEYS["published"]
+    conditions: List[Dict[str, Any]] = []
+    if only_new:
+        if sub_dicts is None:
+            raise ValueError("only_new needs the subscriptions")
+        conditions.append({"$or": [
+            {sub_id: sub_dict["_id"], published: {"$gt": sub_dict["last_viewed"]}}
+            for sub_dict in sub_dicts
+        ]})
+    elif sub_dicts is not None:
+        conditions.append({sub_id: {"$in": [sub_dict["_id"] for sub_dict in sub_dicts]}})
+    if page.since:
+        conditions.append({published: {"$gt": page.since}})
+    if page.cursor:
+        conditions.append(after_cursor(page.cursor, FEED_KEYS))
+    return all_of(conditions) if conditions else {}
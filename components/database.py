@@ -1,12 +1,18 @@
 import atexit
 from os import getenv
-from typing import Any, Dict
+from sys import stderr
+from time import monotonic
+from types import TracebackType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Type, cast
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, MongoClient, UpdateOne
 from pymongo.database import Database
 from pymongo.collection import Collection
-from components.subscriptions.typing import SubsDict
+from pymongo.errors import BulkWriteError
+from components.extractor.typing import ResolutionDict
+from components.subscriptions.typing import ImportJobDict, SubsDict
 from components.users.typing import UserDict
+from components.videos import VIDEO_KEYS, VideoDict
 
 load_dotenv('.env')
 
@@ -16,7 +22,215 @@ client: MongoClient[Any] = MongoClient(
 )
 database: Database[Any] = client.get_database(getenv('YT_DB') or "youtube")
 subscriptions: Collection[SubsDict] = database.get_collection("subscriptions")
+videos: Collection[VideoDict] = database.get_collection("videos")
 users: Collection[UserDict] = database.get_collection("users")
+resolutions: Collection[ResolutionDict] = database.get_collection("resolutions")
+imports: Collection[ImportJobDict] = database.get_collection("imports")
+
+def get_videos_collection(subs_collection: Collection[SubsDict]) -> Collection[VideoDict]:
+    """
+    Videos live in a "videos" collection next to the subscriptions, so
+    passing a (possibly mocked) subscriptions collection is enough.
+    """
+    return cast(Collection[VideoDict], subs_collection.database.get_collection("videos"))
+
+def get_resolutions_collection(subs_collection: Collection[SubsDict]) -> Collection[ResolutionDict]:
+    return cast(Collection[ResolutionDict], subs_collection.database.get_collection("resolutions"))
+
+def get_imports_collection(subs_collection: Collection[SubsDict]) -> Collection[ImportJobDict]:
+    return cast(Collection[ImportJobDict], subs_collection.database.get_collection("imports"))
+
+# The update operators which BatchWriter knows how to combine.
+MERGEABLE_OPERATORS = ("$set", "$inc", "$unset")
+
+def merge_updates(first: Mapping[str, Any], second: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    A single update doing what first and then second do, or None if they
+    cannot be combined (other operators, or a field both set and increased).
+    """
+    if not set(first) | set(second) <= set(MERGEABLE_OPERATORS):
+        return None
+    merged: Dict[str, Dict[str, Any]] = {op: dict(first.get(op, {})) for op in MERGEABLE_OPERATORS}
+    for field, value in second.get("$set", {}).items():
+        if field in merged["$inc"]:
+            return None
+        merged["$unset"].pop(field, None)
+        merged["$set"][field] = value
+    for field, value in second.get("$unset", {}).items():
+        if field in merged["$inc"]:
+            return None
+        merged["$set"].pop(field, None)
+        merged["$unset"][field] = value
+    for field, value in second.get("$inc", {}).items():
+        if field in merged["$set"] or field in merged["$unset"]:
+            return None
+        merged["$inc"][field] = merged["$inc"].get(field, 0) + value
+    return {op: fields for op, fields in merged.items() if fields}
+
+class BatchWriter:
+    """
+    Queues updates to a collection and writes them with one unordered
+    bulk_write() once max_ops documents are queued or the oldest update has
+    waited max_delay seconds, and on flush() or when leaving a with block.
+    The delay is only checked as updates come in, so callers which may wait
+    for them should flush after seconds_until_due(). Updates to a document
+    which is already queued are merged into its queued update, so each
+    document is written once per batch. Write errors are reported per update
+    to on_error (printed by default) instead of being raised, as the rest of
+    the batch is written anyway; other errors, e.g. losing the connection,
+    are raised.
+
+    on_upsert is called with the filter of every update which inserted a
+    document, and the writers in flush_first are flushed before this one.
+    A writer is meant to be used by a single thread.
+    """
+    def __init__(self, collection: Collection[Any], max_ops: int = 1000, max_delay: float = 1,
+                 on_error: Optional[Callable[[Mapping[str, Any], Dict[str, Any]], None]] = None,
+                 on_upsert: Optional[Callable[[Mapping[str, Any]], None]] = None,
+                 flush_first: Sequence["BatchWriter"] = (),
+                 clock: Callable[[], float] = monotonic) -> None:
+        self.collection = collection
+        self.max_ops = max_ops
+        self.max_delay = max_delay
+        self.on_error = on_error or self.report_error
+        self.on_upsert = on_upsert
+        self.flush_first = flush_first
+        self.clock = clock
+        self.queued = 0
+        self.written = 0
+        self.flushes = 0
+        self.errors = 0
+        # Keyed by filter, in the order the documents were first queued.
+        self._pending: Dict[str, Tuple[Mapping[str, Any], Dict[str, Any], bool]] = {}
+        self._oldest: Optional[float] = None
+
+    def update(self, filter: Mapping[str, Any], update: Mapping[str, Any], upsert: bool = False) -> None:
+        key = repr(sorted(filter.items()))
+        queued = self._pending.get(key)
+        if queued is not None:
+            merged = merge_updates(queued[1], update) if queued[2] == upsert else None
+            if merged is not None:
+                self._pending[key] = (filter, merged, upsert)
+                self.queued += 1
+                return
+            # The order of the operations of an unordered bulk write is
+            # not guaranteed, so the queued update has to be written first.
+            self.flush()
+        self._pending[key] = (filter, dict(update), upsert)
+        self.queued += 1
+        if self._oldest is None:
+            self._oldest = self.clock()
+        if len(self._pending) >= self.max_ops or self.clock() - self._oldest >= self.max_delay:
+            self.flush()
+
+    def flush(self) -> None:
+        for writer in self.flush_first:
+            writer.flush()
+        if not self._pending:
+            return
+        operations = list(self._pending.values())
+        self._pending = {}
+        self._oldest = None
+        self.flushes += 1
+        errors: List[Dict[str, Any]] = []
+        try:
+            result = self.collection.bulk_write([
+                UpdateOne(filter, update, upsert=upsert) for filter, update, upsert in operations
+            ], ordered=False)
+            upserted = list(result.upserted_ids or {})
+        except BulkWriteError as e:
+            upserted = [upsert["index"] for upsert in e.details["upserted"]]
+            errors = e.details["writeErrors"]
+        self.written += len(operations) - len(errors)
+        for error in errors:
+            self.errors += 1
+            self.on_error(operations[error["index"]][0], error)
+        if self.on_upsert:
+            for index in sorted(upserted):
+                self.on_upsert(operations[index][0])
+
+    def seconds_until_due(self) -> Optional[float]:
+        """
+        How long until the oldest queued update has waited max_delay, or
+        None if nothing is queued.
+        """
+        if self._oldest is None:
+            return None
+        return max(0, self._oldest + self.max_delay - self.clock())
+
+    def report_error(self, filter: Mapping[str, Any], error: Dict[str, Any]) -> None:
+        print("Could not write", dict(filter), "to", self.collection.name + ":",
+              error.get("errmsg"), file=stderr)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.queued,
+            "written": self.written,
+            "flushes": self.flushes,
+            "errors": self.errors,
+            "pending": len(self._pending),
+        }
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, exc_type: Optional[Type[BaseException]],
+                 exc: Optional[BaseException], tb: Optional[TracebackType]) -> None:
+        self.flush()
+
+class SubscriptionsWriter:
+    """
+    Batch writers for subscriptions and their videos, for the processes
+    which update many of them at once. The videos are always written before
+    the subscriptions, whose versions tell the API that something changed,
+    and every video inserted increases its subscription's video_count.
+    """
+    def __init__(self, subs_collection: Collection[SubsDict],
+                 max_ops: int = 1000, max_delay: float = 1) -> None:
+        self.videos = BatchWriter(get_videos_collection(subs_collection), max_ops, max_delay,
+                                  on_upsert=self._video_added)
+        self.subs = BatchWriter(subs_collection, max_ops, max_delay, flush_first=[self.videos])
+
+    def _video_added(self, filter: Mapping[str, Any]) -> None:
+        self.subs.update({"_id": filter[VIDEO_KEYS["sub_id"]]}, {"$inc": {"video_count": 1}})
+
+    def flush(self) -> None:
+        self.subs.flush()
+
+    def seconds_until_due(self) -> Optional[float]:
+        delays = [delay for delay in (self.videos.seconds_until_due(), self.subs.seconds_until_due())
+                  if delay is not None]
+        return min(delays, default=None)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"subscriptions": self.subs.stats(), "videos": self.videos.stats()}
+
+    def __enter__(self) -> "SubscriptionsWriter":
+        return self
+
+    def __exit__(self, exc_type: Optional[Type[BaseException]],
+                 exc: Optional[BaseException], tb: Optional[TracebackType]) -> None:
+        self.flush()
+
+def ensure_indexes(subs_collection: Collection[SubsDict]) -> None:
+    subs_collection.create_index("next_fetch_at")
+    videos_collection = get_videos_collection(subs_collection)
+    sub_id, vid_id, published = VIDEO_KEYS["sub_id"], VIDEO_KEYS["id"], VIDEO_KEYS["published"]
+    videos_collection.create_index([(sub_id, ASCENDING), (vid_id, ASCENDING)], unique=True)
+    # Serves both newest-first listings and their (published, id) cursors.
+    videos_collection.create_index([(sub_id, ASCENDING), (published, DESCENDING), (vid_id, DESCENDING)])
+    # The timeline of all subscriptions, in the /feed order.
+    videos_collection.create_index([(published, DESCENDING), (vid_id, DESCENDING), (sub_id, DESCENDING)])
+    # Only pending videos are indexed, so the index stays tiny once the
+    # backlog is analysed and an idle analyser cycle reads nothing.
+    videos_collection.create_index(
+        VIDEO_KEYS["analysed"],
+        name="pending_analysis",
+        partialFilterExpression={VIDEO_KEYS["analysed"]: False},
+    )
+    # Expired resolutions are deleted by MongoDB itself.
+    get_resolutions_collection(subs_collection).create_index("expires_at", expireAfterSeconds=0)
+    get_imports_collection(subs_collection).create_index("expires_at", expireAfterSeconds=0)
 
 @atexit.register
 def _cleanup() -> None:
@@ -30,3 +30,14 @@ def is_channel(url: str) -> bool:
         return False
     parsed_url = urlparse(url)
     return parsed_url.path.startswith(('/c/', '/user/', '/channel/', '/@'))
+
+def is_feed(url: str) -> bool:
+    """
+    The RSS feed of a channel or playlist, as found in OPML exports.
+    """
+    if not is_youtube(url):
+        return False
+    parsed_url = urlparse(url)
+    query_params = parse_qs(parsed_url.query)
+    return parsed_url.path == '/feeds/videos.xml' and bool(
+        {'channel_id', 'playlist_id'} & query_params.keys())
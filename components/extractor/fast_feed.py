@@ -0,0 +1,77 @@
+from datetime import datetime
+from io import BytesIO
+from typing import Any, List
+from xml.etree.ElementTree import Element, iterparse
+
+from feedparser import FeedParserDict # type: ignore
+
+from components.videos import VideoTuple
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+MEDIA = "{http://search.yahoo.com/mrss/}"
+
+class UnexpectedFeed(Exception):
+    pass
+
+def element_text(parent: Element, path: str, required: bool = True) -> str:
+    element = parent.find(path)
+    if element is None:
+        raise UnexpectedFeed("No %s in %s" % (path, parent.tag))
+    if element.text is None and required:
+        raise UnexpectedFeed("Empty %s in %s" % (path, parent.tag))
+    return (element.text or '').strip()
+
+def element_attribute(parent: Element, path: str, attribute: str) -> str:
+    element = parent.find(path)
+    if element is None or attribute not in element.attrib:
+        raise UnexpectedFeed("No %s with %s in %s" % (path, attribute, parent.tag))
+    return element.attrib[attribute]
+
+def video_from_entry(entry: Element) -> VideoTuple:
+    return VideoTuple(
+        id = element_text(entry, ATOM + "id"),
+        link = element_attribute(entry, ATOM + "link[@rel='alternate']", "href"),
+        title = element_text(entry, ATOM + "title", required=False),
+        author = element_text(entry, ATOM + "author/" + ATOM + "name"),
+        author_channel = element_text(entry, ATOM + "author/" + ATOM + "uri"),
+        published = datetime.fromisoformat(element_text(entry, ATOM + "published")),
+        updated = datetime.fromisoformat(element_text(entry, ATOM + "updated")),
+        thumbnail = element_attribute(entry, MEDIA + "group/" + MEDIA + "thumbnail", "url"),
+        summary = element_text(entry, MEDIA + "group/" + MEDIA + "description", required=False),
+    )
+
+def parse_youtube_feed(content: bytes) -> Any:
+    """
+    Parse a YouTube Atom feed straight into VideoTuples (under "videos")
+    without going through feedparser's generic entries. Only the fields
+    used elsewhere are filled in the "feed" part. Raises UnexpectedFeed (or
+    a ParseError or ValueError) for anything that does not look like one,
+    so that the caller can fall back to feedparser.
+    """
+    videos: List[VideoTuple] = []
+    root = None
+    for _, element in iterparse(BytesIO(content), events=("end",)):
+        if element.tag == ATOM + "entry":
+            videos.append(video_from_entry(element))
+            element.clear()
+        root = element
+    if root is None or root.tag != ATOM + "feed":
+        raise UnexpectedFeed("Not an Atom feed")
+    return FeedParserDict(
+        feed=FeedParserDict(
+            id=element_text(root, ATOM + "id"),
+            title=element_text(root, ATOM + "title", required=False),
+            links=[FeedParserDict(link.attrib) for link in root.findall(ATOM + "link")],
+        ),
+        entries=[],
+        videos=videos,
+        bozo=False,
+    )
+
+def feed_videos(rss: Any) -> List[VideoTuple]:
+    """
+    The videos of a feed, whichever parser it came from.
+    """
+    if "videos" in rss:
+        return list(rss["videos"])
+    return [VideoTuple.from_rss_entry(entry) for entry in rss.entries]
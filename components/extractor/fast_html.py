@@ -0,0 +1,29 @@
+from functools import lru_cache
+from html import unescape
+from re import IGNORECASE, Pattern, compile
+from typing import Dict, Mapping, Optional
+
+ATTRIBUTE_RE = compile(r'''([^\s"'<>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?''')
+
+@lru_cache(maxsize=None)
+def tag_pattern(tag: str) -> Pattern[str]:
+    return compile(r'<%s\b([^>]*)>' % tag, IGNORECASE)
+
+def parse_attributes(text: str) -> Dict[str, str]:
+    return {
+        name.lower(): unescape(double or single or bare)
+        for name, double, single, bare in ATTRIBUTE_RE.findall(text)
+    }
+
+def find_tag_attribute(html: str, tag: str, attrs: Mapping[str, str], attribute: str) -> Optional[str]:
+    """
+    The attribute of the first tag with the given attributes, found by
+    scanning the page for the tag instead of parsing all of it, so it stops
+    at the first match. None if there is no such tag, in which case callers
+    fall back to BeautifulSoup in case the page is unusual.
+    """
+    for match in tag_pattern(tag).finditer(html):
+        tag_attrs = parse_attributes(match.group(1))
+        if attribute in tag_attrs and all(tag_attrs.get(name) == value for name, value in attrs.items()):
+            return tag_attrs[attribute]
+    return None
@@ -0,0 +1,105 @@
+from os import getenv
+from os.path import isfile
+from sys import stderr
+from threading import Lock
+from typing import Any, Dict, Optional
+
+from feedparser import FeedParserDict, parse # type: ignore
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .fast_feed import parse_youtube_feed
+
+# A single session is shared by the whole process, so that connections to
+# the few hosts we talk to (YouTube and googleapis) are kept alive and
+# reused instead of paying a TCP and TLS handshake per request. Sessions
+# send Accept-Encoding: gzip and decompress responses by themselves.
+_session: Optional[Session] = None
+_session_lock = Lock()
+
+def create_session(pool_size: int = 10, retries: int = 3, backoff: float = 0.5) -> Session:
+    """
+    A session keeping up to pool_size connections per host, which retries
+    connection errors and 429/5xx responses with exponential backoff.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def get_session() -> Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session(
+                pool_size=int(getenv("HTTP_POOL_SIZE") or 10),
+                retries=int(getenv("HTTP_RETRIES") or 3),
+                backoff=float(getenv("HTTP_BACKOFF") or 0.5),
+            )
+        return _session
+
+def http_get(url: str, session: Optional[Session] = None, **kwargs: Any) -> Response:
+    """
+    GET through the shared session (or the given one) with a timeout,
+    raising for 4xx/5xx responses like urlopen() did.
+    """
+    kwargs.setdefault("timeout", float(getenv("HTTP_TIMEOUT") or 10))
+    response = (session or get_session()).get(url, **kwargs)
+    response.raise_for_status()
+    return response
+
+def parse_feed_content(content: bytes, response_headers: Optional[Dict[str, str]] = None) -> Any:
+    """
+    Parse a downloaded feed with parse_youtube_feed(), unless disabled by
+    setting FAST_FEED_PARSER to 0, falling back to feedparser for anything
+    it does not expect.
+    """
+    if getenv("FAST_FEED_PARSER", "1") != "0":
+        try:
+            return parse_youtube_feed(content)
+        except Exception as e:
+            print("Falling back to feedparser:", repr(e), file=stderr)
+    return parse(content, response_headers=response_headers or {})
+
+def parse_feed(url: str, etag: str = '', modified: str = '') -> Any:
+    """
+    Download and parse a feed, sending the validators of the previous
+    download if there are any. Returns the parser's result, with status,
+    etag and modified filled in like feedparser does for URLs it fetches
+    itself. A 304 response comes back with no entries. Local files are
+    parsed the same way, while anything else which is not an http(s) URL
+    is handed to feedparser as is.
+    """
+    if not url.startswith(("http://", "https://")):
+        if not isfile(url):
+            return parse(url)
+        with open(url, "rb") as file:
+            return parse_feed_content(file.read())
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if modified:
+        headers["If-Modified-Since"] = modified
+    response = http_get(url, headers=headers)
+    if response.status_code == 304:
+        rss = FeedParserDict(feed=FeedParserDict(), entries=[])
+    else:
+        rss = parse_feed_content(response.content, response_headers={
+            key.lower(): value for key, value in response.headers.items()
+        })
+    rss["status"] = response.status_code
+    rss["href"] = response.url
+    if "ETag" in response.headers:
+        rss["etag"] = response.headers["ETag"]
+    if "Last-Modified" in response.headers:
+        rss["modified"] = response.headers["Last-Modified"]
+    return rss
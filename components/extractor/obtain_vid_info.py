@@ -1,15 +1,25 @@
+from os import getenv
 from sys import stderr
 from traceback import print_exc
-from urllib.request import urlopen
+from typing import Dict, Iterable, List, Optional
 
 from bs4 import BeautifulSoup
 from isodate import parse_duration # type: ignore
-from requests import get
+from requests import Session
+
+from .fast_html import find_tag_attribute
+from .http_client import http_get
+
+# The YouTube Data API accepts at most this many comma-separated ids.
+MAX_IDS_PER_REQUEST = 50
+
+# Overridable to point at a stub of the API.
+VIDEOS_API_URL = getenv("YOUTUBE_API_URL") or "https://www.googleapis.com/youtube/v3/videos"
 
 def obtain_vid_duration(url: str, vid_id: str, html: str='', api_key: str='') -> int:
     if api_key:
         try:
-            data = get("https://www.googleapis.com/youtube/v3/videos", params={
+            data = http_get(VIDEOS_API_URL, params={
                 'part': "contentDetails",
                 'id': vid_id[9:],
                 'key': api_key,
@@ -20,10 +30,38 @@ def obtain_vid_duration(url: str, vid_id: str, html: str='', api_key: str='') ->
         except:
             print("Web scraping will be used due to an error with the following id:", vid_id, file=stderr)
             print_exc()
-    html = html or urlopen(url).read().decode('utf-8')
-    soup = BeautifulSoup(html, 'html.parser')
-
-    duration_meta = soup.find('meta', itemprop='duration')
-    assert duration_meta
-    duration = parse_duration(duration_meta['content'])
+    html = html or http_get(url).text
+    duration_str = find_tag_attribute(html, 'meta', {'itemprop': 'duration'}, 'content')
+    if duration_str is None:
+        soup = BeautifulSoup(html, 'html.parser')
+        duration_meta = soup.find('meta', itemprop='duration')
+        assert duration_meta
+        duration_str = duration_meta['content']
+    duration = parse_duration(duration_str)
     return int(duration.total_seconds())
+
+def obtain_vid_durations(vid_ids: Iterable[str], api_key: str,
+                         session: Optional[Session] = None) -> Dict[str, int]:
+    """
+    Look up the durations of many videos using the YouTube Data API, with
+    up to MAX_IDS_PER_REQUEST ids per request. The ids are in the feed's
+    "yt:video:..." form. Videos which could not be looked up are left out
+    of the result, so the caller can fall back to obtain_vid_duration().
+    """
+    ids: List[str] = list(vid_ids)
+    durations: Dict[str, int] = {}
+    for start in range(0, len(ids), MAX_IDS_PER_REQUEST):
+        chunk = {vid_id[9:]: vid_id for vid_id in ids[start:start + MAX_IDS_PER_REQUEST]}
+        try:
+            data = http_get(VIDEOS_API_URL, session=session, params={
+                'part': "contentDetails",
+                'id': ",".join(chunk),
+                'key': api_key,
+            }).json()
+            for item in data['items']:
+                duration_str = item['contentDetails']['duration']
+                durations[chunk[item['id']]] = int(parse_duration(duration_str).total_seconds())
+        except:
+            print("Could not look up the durations of", len(chunk), "videos:", file=stderr)
+            print_exc()
+    return durations
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, UTC
+from threading import Lock
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import urlparse, parse_qs
+
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+from requests import HTTPError, RequestException
+
+from .check_url import is_youtube, is_playlist, is_feed
+from .extract_sub_info import get_sub_info_from_yt_url
+from .typing import ResolutionDict
+
+def channel_key(channel_id: str) -> str:
+    # Channel ids are UC followed by the id used in the feed's.
+    return "yt:channel:" + channel_id.removeprefix("UC")
+
+def resolution_key(url: str) -> Optional[str]:
+    """
+    The key under which the subscription a URL points at is cached. It is
+    the subscription id when the URL contains it, or else the @handle or
+    the /c/ or /user/ path, so equivalent URLs share it. None if the URL
+    cannot point at a subscription.
+    """
+    if not is_youtube(url):
+        return None
+    parsed_url = urlparse(url if "://" in url else "https:" + url)
+    query_params = parse_qs(parsed_url.query)
+    if is_feed(url):
+        if "playlist_id" in query_params:
+            return "yt:playlist:" + query_params["playlist_id"][0]
+        return channel_key(query_params["channel_id"][0])
+    if is_playlist(url):
+        return "yt:playlist:" + query_params["list"][0]
+    parts = parsed_url.path.split("/")
+    if parsed_url.path.startswith("/channel/"):
+        return channel_key(parts[2])
+    if parsed_url.path.startswith("/@"):
+        return parts[1].lower()
+    if parsed_url.path.startswith(("/c/", "/user/")):
+        return "/".join(parts[1:3]).lower()
+    return None
+
+def is_permanent_failure(e: Exception) -> bool:
+    """
+    Whether resolving the URL again would fail the same way. Network errors,
+    rate limiting and server errors are worth retrying.
+    """
+    if isinstance(e, HTTPError) and e.response is not None:
+        return 400 <= e.response.status_code < 500 and e.response.status_code != 429
+    return not isinstance(e, RequestException)
+
+class ResolutionCache:
+    """
+    Remembers what get_sub_info_from_yt_url() returned for a URL, so that
+    resolving it (or an equivalent URL) again needs neither the network nor
+    any HTML parsing. URLs which cannot be resolved are remembered as well,
+    for a shorter time.
+    """
+    def __init__(self, collection: Collection[ResolutionDict],
+                 ttl: timedelta = timedelta(days=30),
+                 negative_ttl: timedelta = timedelta(days=1)) -> None:
+        self.collection = collection
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    def get_sub_info(self, url: str) -> Dict[str, Any]:
+        key = resolution_key(url)
+        if key is None:
+            return get_sub_info_from_yt_url(url)
+        now = datetime.now(tz=UTC)
+        # MongoDB only deletes expired documents once a minute.
+        resolution = self.collection.find_one({"_id": key, "expires_at": {"$gt": now}})
+        if resolution:
+            if resolution["info"] is None:
+                self._count("negative_hits")
+                raise Exception(resolution["error"])
+            self._count("hits")
+            return resolution["info"]
+        self._count("misses")
+        try:
+            info = get_sub_info_from_yt_url(url)
+        except Exception as e:
+            if is_permanent_failure(e):
+                self._store([key], None, str(e) or type(e).__name__, now + self.negative_ttl)
+            raise
+        # Also found under its id from now on, e.g. through its feed URL.
+        self._store({key, info["id"]}, info, '', now + self.ttl)
+        return info
+
+    def _store(self, keys: Iterable[str], info: Optional[Dict[str, Any]],
+               error: str, expires_at: datetime) -> None:
+        self.collection.bulk_write([
+            UpdateOne(
+                {"_id": key},
+                {"$set": {"info": info, "error": error, "expires_at": expires_at}},
+                upsert=True,
+            )
+            for key in keys
+        ], ordered=False)
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+        }
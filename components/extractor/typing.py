@@ -0,0 +1,8 @@
+from datetime import datetime
+from typing import Any, Dict, Optional, TypedDict
+
+class ResolutionDict(TypedDict):
+    _id: str # A subscription id, @handle or normalised channel path.
+    info: Optional[Dict[str, Any]] # None if the URL could not be resolved.
+    error: str
+    expires_at: datetime
@@ -0,0 +1,174 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, UTC
+from sys import stderr
+from threading import Thread
+from traceback import print_exc
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+from uuid import uuid4
+from xml.etree.ElementTree import ParseError, fromstring
+
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError
+
+from components.extractor.extract_sub_info import get_sub_info_from_yt_url
+from components.extractor.resolution_cache import is_permanent_failure
+from components.subscriptions.main import Subscription
+from components.subscriptions.typing import ImportJobDict, SubsDict
+
+class ImportResult(NamedTuple):
+    url: str
+    # added, exists, duplicate, invalid, retry (the URL could not be
+    # resolved for now, e.g. because of a network error) or error.
+    status: str
+    id: str = ''
+    error: str = ''
+
+def parse_opml(text: str) -> List[str]:
+    """
+    The feed (or, failing that, page) links of the outlines of an OPML
+    document, such as YouTube's export of one's subscriptions.
+    """
+    try:
+        root = fromstring(text)
+    except ParseError as e:
+        raise ValueError("Invalid OPML: %s" % e) from e
+    urls = []
+    for outline in root.iter("outline"):
+        url = outline.get("xmlUrl") or outline.get("htmlUrl")
+        if url:
+            urls.append(url.strip())
+    return urls
+
+def parse_url_list(text: str) -> List[str]:
+    """
+    One URL per line; blank lines and lines starting with # are skipped.
+    """
+    return [
+        line.strip() for line in text.splitlines()
+        if line.strip() and not line.strip().startswith("#")
+    ]
+
+def parse_import(text: str) -> List[str]:
+    if text.lstrip().startswith("<"):
+        return parse_opml(text)
+    return parse_url_list(text)
+
+def resolve_urls(urls: Iterable[str], max_workers: int = 8,
+                 get_sub_info: Optional[Callable[[str], Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Look up the subscription info of every URL with get_sub_info (by default
+    get_sub_info_from_yt_url), at most max_workers at a time. Each URL maps
+    to its info, or to the exception raised for it.
+    """
+    get_info = get_sub_info or get_sub_info_from_yt_url
+    def resolve(url: str) -> Any:
+        try:
+            return get_info(url)
+        except Exception as e:
+            return e
+    urls = list(urls)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        return dict(zip(urls, executor.map(resolve, urls)))
+
+def import_subscriptions(urls: Iterable[str], time_between_fetches: int,
+                         subs_collection: Collection[SubsDict],
+                         max_workers: int = 8,
+                         get_sub_info: Optional[Callable[[str], Dict[str, Any]]] = None) -> List[ImportResult]:
+    """
+    Add a subscription for each URL, skipping those already subscribed to,
+    with a single insert. Returns one result per distinct URL, in order.
+    """
+    urls = list(dict.fromkeys(urls))
+    resolved = resolve_urls(urls, max_workers, get_sub_info)
+    results: Dict[str, ImportResult] = {}
+    new_subs: Dict[str, Subscription] = {}
+    for url in urls:
+        info = resolved[url]
+        if isinstance(info, Exception):
+            status = "invalid" if is_permanent_failure(info) else "retry"
+            results[url] = ImportResult(url, status, error=str(info) or type(info).__name__)
+        elif info["id"] in new_subs:
+            # Another URL of the same channel or playlist.
+            results[url] = ImportResult(url, "duplicate", info["id"])
+        else:
+            new_subs[info["id"]] = Subscription(
+                _id=info["id"],
+                link=info["link"],
+                title=info["title"],
+                time_between_fetches=time_between_fetches,
+            )
+            results[url] = ImportResult(url, "added", info["id"])
+    existing: Set[str] = {
+        sub_dict["_id"] for sub_dict in
+        subs_collection.find({"_id": {"$in": list(new_subs)}}, {"_id": 1})
+    }
+    failed: Dict[str, str] = {}
+    to_insert = [sub.asdict() for sub_id, sub in new_subs.items() if sub_id not in existing]
+    if to_insert:
+        try:
+            subs_collection.insert_many(to_insert, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details["writeErrors"]:
+                sub_id = to_insert[error["index"]]["_id"]
+                if error["code"] == 11000: # Added by someone else in the meantime.
+                    existing.add(sub_id)
+                else:
+                    print("Could not insert", sub_id + ":", error["errmsg"], file=stderr)
+                    failed[sub_id] = error["errmsg"]
+    for url, result in results.items():
+        if result.status != "added":
+            continue
+        if result.id in existing:
+            results[url] = result._replace(status="exists")
+        elif result.id in failed:
+            results[url] = result._replace(status="error", error=failed[result.id])
+    return list(results.values())
+
+def start_import_job(urls: Iterable[str], time_between_fetches: int,
+                     subs_collection: Collection[SubsDict],
+                     jobs_collection: Collection[ImportJobDict],
+                     max_workers: int = 8,
+                     get_sub_info: Optional[Callable[[str], Dict[str, Any]]] = None,
+                     on_done: Optional[Callable[[List[ImportResult]], None]] = None,
+                     ttl: timedelta = timedelta(days=1)) -> str:
+    """
+    Run import_subscriptions() in a background thread, so that a request
+    does not have to wait for thousands of URLs to be resolved. The job's
+    status and results are kept in jobs_collection under the returned id,
+    so that any API process can report them, until they expire after ttl.
+    A job whose process exits before it is done stays running until then.
+    """
+    urls = list(dict.fromkeys(urls))
+    now = datetime.now(tz=UTC)
+    job_id = uuid4().hex
+    jobs_collection.insert_one({
+        "_id": job_id,
+        "status": "running",
+        "total": len(urls),
+        "results": [],
+        "error": '',
+        "created_at": now,
+        "finished_at": None,
+        "expires_at": now + ttl,
+    })
+    def run() -> None:
+        try:
+            results = import_subscriptions(urls, time_between_fetches, subs_collection,
+                                           max_workers, get_sub_info)
+        except Exception as e:
+            print_exc()
+            jobs_collection.update_one({"_id": job_id}, {"$set": {
+                "status": "failed",
+                "error": str(e) or type(e).__name__,
+                "finished_at": datetime.now(tz=UTC),
+            }})
+            return
+        if on_done:
+            on_done(results)
+        jobs_collection.update_one({"_id": job_id}, {"$set": {
+            "status": "done",
+            "results": [result._asdict() for result in results],
+            "finished_at": datetime.now(tz=UTC),
+        }})
+    Thread(target=run, daemon=True).start()
+    return job_id
@@ -1,14 +1,17 @@
-from dataclasses import dataclass, field, asdict
-from datetime import datetime, UTC
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timedelta, UTC
 from sys import stderr
-from typing import TypedDict, List, cast, Dict, Any
+from typing import TypedDict, List, Optional, cast, Dict, Any
 from bson.objectid import ObjectId
-from feedparser import parse # type: ignore
+from pymongo import UpdateOne
 from pymongo.collection import Collection
-from pymongo.results import InsertOneResult, UpdateResult
-from components.database import subscriptions
+from pymongo.results import BulkWriteResult, InsertOneResult, UpdateResult
+from components.database import SubscriptionsWriter, subscriptions, get_videos_collection
+from components.extractor.fast_feed import feed_videos
+from components.extractor.http_client import parse_feed
+from components.subscriptions.polling import MIN_TIME_BETWEEN_FETCHES, adaptive_interval, merge_upload_history
 from components.subscriptions.typing import SubsDict
-from components.videos import VideoTuple
+from components.videos import VIDEO_KEYS, VideoDict, VideoTuple
 
 @dataclass
 class Subscription:
@@ -19,60 +22,209 @@ class Subscription:
     last_fetch: datetime = datetime.min.replace(tzinfo=UTC)
     last_video_update: datetime = datetime.min.replace(tzinfo=UTC)
     last_viewed: datetime = datetime.min.replace(tzinfo=UTC)
-    videos: List[VideoTuple] = field(default_factory=list)
+    next_fetch_at: datetime = datetime.min.replace(tzinfo=UTC)
+    etag: str = ''
+    modified: str = ''
+    # Number of documents in the videos collection, kept up to date by
+    # flush_videos() so that it can be reported without counting them.
+    video_count: int = 0
+    # Increased on every write, so that the API can tell whether anything
+    # it served about the subscription or its videos has changed.
+    version: int = 0
+    # When max_time_between_fetches is set, time_between_fetches is worked
+    # out after every fetch from the recent uploads, within these bounds.
+    min_time_between_fetches: int = 0
+    max_time_between_fetches: int = 0
+    # The latest upload times seen in the feed (in adaptive mode only).
+    upload_history: List[datetime] = field(default_factory=list)
+    # Only the videos loaded or fetched in this session; they are stored in
+    # the videos collection rather than in the subscription document.
+    videos: List[VideoTuple] = field(default_factory=list, repr=False)
     subscribers: List[ObjectId] = field(default_factory=list)
 
     def __post_init__(self) -> None:
         self._collection: Collection[SubsDict] = subscriptions
+        # When set, writes are queued there instead of being done at once.
+        self._writer: Optional[SubscriptionsWriter] = None
+        # Videos added or modified since they were loaded, keyed by id.
+        self._dirty: Dict[str, VideoTuple] = {}
         if len(self.videos) and type(self.videos[0]) != VideoTuple:
             self.videos = [VideoTuple._make(vid) for vid in self.videos]
+        self._index_videos()
+
+    def _index_videos(self) -> None:
+        # Position of each video in self.videos, so that fetching does not
+        # need to scan the history. Kept up to date by add/replace_video().
+        self._video_index: Dict[str, int] = {
+            vid.id: i for i, vid in enumerate(self.videos)
+        }
+
+    @property
+    def _videos_collection(self) -> Collection[VideoDict]:
+        return get_videos_collection(self._collection)
+
+    def load_videos(self) -> None:
+        self.videos = [
+            VideoTuple.from_document(doc) for doc in
+            self._videos_collection.find({VIDEO_KEYS["sub_id"]: self._id})
+                                   .sort(VIDEO_KEYS["published"], 1)
+        ]
+        self._index_videos()
+        self._dirty.clear()
+
+    def add_video(self, vid: VideoTuple) -> None:
+        self._video_index[vid.id] = len(self.videos)
+        self.videos.append(vid)
+        self._dirty[vid.id] = vid
+
+    def replace_video(self, i: int, vid: VideoTuple) -> None:
+        self.videos[i] = vid
+        self._dirty[vid.id] = vid
 
     def get_new_vids(self) -> List[VideoTuple]:
         return [vid for vid in self.videos if vid.published > self.last_viewed]
 
     def fetch(self) -> None:
         try:
-            rss = parse(self.link)
+            rss = self.download_feed()
         except Exception as e:
-            print("Ran into an exception while fetching", self._id + ":", e, file=stderr)
+            self.fetch_failed(e)
+            return
+        self.process_feed(rss)
+
+    def download_feed(self) -> Any:
+        """
+        Only does network I/O and parsing, so it is safe to call from worker
+        threads. The result is handed to process_feed() for the database writes.
+        The validators from the previous fetch are sent along, so an unchanged
+        feed comes back as an empty 304 response.
+        """
+        return parse_feed(self.link, self.etag, self.modified)
+
+    @property
+    def adaptive(self) -> bool:
+        return self.max_time_between_fetches > 0
+
+    def fetch_failed(self, e: Exception) -> None:
+        print("Ran into an exception while fetching", self._id + ":", e, file=stderr)
+        self.schedule_next_fetch(datetime.now(tz=UTC))
+        self._update({"$set": {
+            "next_fetch_at": self.next_fetch_at,
+            "time_between_fetches": self.time_between_fetches,
+        }, "$inc": {"version": 1}})
+
+    def process_feed(self, rss: Any) -> None:
+        self.etag = rss.get("etag", self.etag)
+        self.modified = rss.get("modified", self.modified)
+        if rss.get("status") == 304:
+            self.last_fetch = datetime.now(tz=UTC)
+            self.schedule_next_fetch(self.last_fetch)
+            self.update_fetch()
+            print("Not modified", self._id, "at", self.last_fetch)
             return
-        for vid in map(VideoTuple.from_rss_entry, rss.entries):
+        # Only videos newer than last_video_update can raise it, so it is
+        # enough to keep a running maximum of those.
+        last_video_update = self.last_video_update
+        published = []
+        for vid in feed_videos(rss):
+            published.append(vid.published)
             if vid.published > self.last_video_update:
-                self.videos.append(vid)
+                self.add_video(vid)
             elif vid.updated > self.last_video_update:
-                for i, old_vid in enumerate(self.videos):
-                    if vid.id == old_vid.id:
-                        self.videos[i] = vid
-                        break
-        last_video_update = max((vid.updated for vid in self.videos))
+                i = self._video_index.get(vid.id)
+                if i is not None:
+                    self.replace_video(i, vid)
+                else:
+                    # Not loaded; the upsert replaces the stored version anyway.
+                    self._dirty[vid.id] = vid
+            else:
+                continue
+            last_video_update = max(last_video_update, vid.updated)
+        if self.adaptive:
+            self.upload_history = merge_upload_history(self.upload_history, published)
         self.last_fetch = datetime.now(tz=UTC)
+        self.schedule_next_fetch(self.last_fetch)
         if last_video_update > self.last_video_update:
             print("Updating", self._id, end=", ")
-            print("Video count now:", len(self.videos))
+            print("New or updated videos:", len(self._dirty))
             self.last_video_update = last_video_update
+            self.flush_videos()
             self.update_fetch(videos=True)
         else:
             self.update_fetch()
         print("Fetched", self._id, "at", self.last_fetch)
 
+    def schedule_next_fetch(self, after: datetime) -> None:
+        if self.adaptive:
+            self.time_between_fetches = adaptive_interval(
+                self.upload_history, after,
+                self.min_time_between_fetches, self.max_time_between_fetches,
+            )
+        interval = max(self.time_between_fetches, MIN_TIME_BETWEEN_FETCHES)
+        self.next_fetch_at = after + timedelta(seconds=interval)
+
     def asdict(self) -> SubsDict:
-        return cast(SubsDict, asdict(self))
+        return cast(SubsDict, {
+            f.name: getattr(self, f.name) for f in fields(self) if f.name != "videos"
+        })
 
     def insert(self) -> InsertOneResult:
         return self._collection.insert_one(self.asdict())
 
-    def update_fetch(self, videos: bool=False) -> UpdateResult:
-        updated_values: Dict[str, Any] = { "last_fetch": self.last_fetch, }
+    def _update(self, update: Dict[str, Any]) -> Optional[UpdateResult]:
+        if self._writer:
+            self._writer.subs.update({"_id": self._id}, update)
+            return None
+        return self._collection.update_one({"_id": self._id}, update)
+
+    def update_fetch(self, videos: bool=False) -> Optional[UpdateResult]:
+        updated_values: Dict[str, Any] = {
+            "last_fetch": self.last_fetch,
+            "next_fetch_at": self.next_fetch_at,
+            "etag": self.etag,
+            "modified": self.modified,
+        }
         if videos:
-            updated_values["videos"] = self.videos
             updated_values["last_video_update"] = self.last_video_update
-        return self._collection.update_one(
-            {"_id": self._id},
-            {"$set": updated_values},
-        )
+        if self.adaptive:
+            updated_values["time_between_fetches"] = self.time_between_fetches
+            updated_values["upload_history"] = self.upload_history
+        return self._update({"$set": updated_values, "$inc": {"version": 1}})
 
-    def update_videos(self) -> UpdateResult:
-        return self._collection.update_one(
+    def flush_videos(self) -> Optional[BulkWriteResult]:
+        """
+        Upsert only the videos added or modified since they were loaded, in a
+        single bulk write, so the cost does not grow with the video history.
+        With a writer, they are queued instead, and the writer keeps
+        video_count up to date in the database (but not in this object).
+        """
+        if not self._dirty:
+            return None
+        if self._writer:
+            for vid in self._dirty.values():
+                self._writer.videos.update(
+                    {VIDEO_KEYS["sub_id"]: self._id, VIDEO_KEYS["id"]: vid.id},
+                    {"$set": vid.to_document(self._id)},
+                    upsert=True,
+                )
+            self._dirty.clear()
+            self._update({"$inc": {"version": 1}})
+            return None
+        result = self._videos_collection.bulk_write([
+            UpdateOne(
+                {VIDEO_KEYS["sub_id"]: self._id, VIDEO_KEYS["id"]: vid.id},
+                {"$set": vid.to_document(self._id)},
+                upsert=True,
+            )
+            for vid in self._dirty.values()
+        ], ordered=False)
+        self._dirty.clear()
+        self.video_count += result.upserted_count
+        self._collection.update_one(
             {"_id": self._id},
-            {"$set": {"videos": self.videos}}
+            {"$inc": {"video_count": result.upserted_count, "version": 1}},
         )
+        return result
+
+    def update_videos(self) -> Optional[BulkWriteResult]:
+        return self.flush_videos()
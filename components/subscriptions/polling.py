@@ -0,0 +1,40 @@
+from datetime import datetime
+from statistics import median
+from typing import Iterable, List, Sequence
+
+# As many uploads as a feed lists.
+HISTORY_SIZE = 15
+
+# The share of the expected time between uploads to wait between fetches,
+# i.e. roughly how late a new upload is noticed relative to that time.
+DETECTION_FRACTION = 0.25
+
+# The shortest wait between two fetches of a subscription, as often as the
+# collector used to check every subscription, so that a stored interval of
+# zero or less does not refetch it in a loop.
+MIN_TIME_BETWEEN_FETCHES = 60
+
+def merge_upload_history(history: Iterable[datetime], published: Iterable[datetime]) -> List[datetime]:
+    """
+    The HISTORY_SIZE latest distinct upload times of both, oldest first.
+    """
+    return sorted(set(history) | set(published))[-HISTORY_SIZE:]
+
+def adaptive_interval(uploads: Sequence[datetime], now: datetime,
+                      min_interval: int, max_interval: int) -> int:
+    """
+    The number of seconds to wait before the next fetch of a subscription
+    with the given recent upload times. It is DETECTION_FRACTION of the
+    typical (median) time between uploads, so that it tightens right after
+    an upload, or of the time since the last upload when that is longer, so
+    that it backs off while the channel is silent. It is kept between
+    min_interval and max_interval, and is max_interval without uploads.
+    """
+    if not uploads:
+        return max_interval
+    uploads = sorted(uploads)
+    since_last = (now - uploads[-1]).total_seconds()
+    gaps = [(later - earlier).total_seconds() for earlier, later in zip(uploads, uploads[1:])]
+    expected = median(gaps) if gaps else since_last
+    interval = max(expected, since_last, 0) * DETECTION_FRACTION
+    return int(min(max(interval, min_interval), max_interval))
@@ -1,7 +1,6 @@
 from datetime import datetime
-from typing import TypedDict, List
+from typing import Any, Dict, List, Optional, TypedDict
 from bson.objectid import ObjectId
-from components.videos import VideoTuple
 
 class SubsDict(TypedDict):
     _id: str
@@ -11,5 +10,22 @@ class SubsDict(TypedDict):
     last_fetch: datetime
     last_video_update: datetime
     last_viewed: datetime
-    videos: List[VideoTuple]
+    next_fetch_at: datetime
+    etag: str # HTTP validators from the last fetch.
+    modified: str
+    video_count: int
+    version: int # Increased on every write.
+    min_time_between_fetches: int # Bounds of the adaptive mode, in seconds;
+    max_time_between_fetches: int # it is off when the maximum is 0.
+    upload_history: List[datetime]
     subscribers: List[ObjectId]
+
+class ImportJobDict(TypedDict):
+    _id: str
+    status: str # running, done or failed.
+    total: int # The number of distinct URLs.
+    results: List[Dict[str, Any]] # One ImportResult per URL, once done.
+    error: str
+    created_at: datetime
+    finished_at: Optional[datetime]
+    expires_at: datetime
@@ -1,6 +1,58 @@
-from typing import NamedTuple, Any, Self
+from typing import NamedTuple, Any, Dict, Iterable, NotRequired, Self, TypedDict, cast
 from datetime import datetime
 
+# Version of the layout of documents in the videos collection:
+#   0 - the VideoTuple field names as keys (or a positional array when
+#       videos were embedded in the subscription document).
+#   1 - the short keys in VIDEO_KEYS, plus "_v".
+VIDEO_SCHEMA_VERSION = 1
+
+# Short keys under which each field is stored, to keep documents and
+# indexes small. Queries on the videos collection must go through these.
+VIDEO_KEYS: Dict[str, str] = {
+    "sub_id": "sid",
+    "id": "i",
+    "link": "l",
+    "title": "t",
+    "author": "a",
+    "author_channel": "ac",
+    "published": "p",
+    "updated": "u",
+    "thumbnail": "th",
+    "summary": "sm",
+    "analysed": "an",
+    "duration": "d",
+}
+
+# Keys of the retry state of videos whose analysis failed. It is not part
+# of VideoTuple, and is removed once the video is analysed.
+RETRY_KEYS: Dict[str, str] = {
+    "attempts": "ra",
+    "retry_at": "rt",
+    "error": "re",
+}
+
+# The duration of videos whose analysis was given up on.
+FAILED_DURATION = -2
+
+class VideoDict(TypedDict):
+    _v: int # VIDEO_SCHEMA_VERSION
+    sid: str # sub_id
+    i: str # id
+    l: str # link
+    t: str # title
+    a: str # author
+    ac: str # author_channel
+    p: datetime # published
+    u: datetime # updated
+    th: str # thumbnail
+    sm: str # summary
+    an: bool # analysed
+    d: int # duration
+    ra: NotRequired[int] # Failed analysis attempts.
+    rt: NotRequired[datetime] # When to retry the analysis.
+    re: NotRequired[str] # The class of the last analysis error.
+
 class VideoTuple(NamedTuple):
     id: str
     link: str
@@ -27,3 +79,35 @@ class VideoTuple(NamedTuple):
             thumbnail = entry.media_thumbnail[0]["url"],
             summary = entry.summary,
         )
+
+    @classmethod
+    def from_document(cls, doc: Any) -> Self:
+        if isinstance(doc, (list, tuple)):
+            return cls._make(doc)
+        fields = decode_video_fields(doc)
+        return cls(**{field: fields[field] for field in cls._fields if field in fields})
+
+    def to_document(self, sub_id: str) -> VideoDict:
+        return encode_video_fields({"sub_id": sub_id, **self._asdict()})
+
+def encode_video_fields(fields: Dict[str, Any]) -> VideoDict:
+    doc = {VIDEO_KEYS[field]: value for field, value in fields.items()}
+    doc["_v"] = VIDEO_SCHEMA_VERSION
+    return cast(VideoDict, doc)
+
+def decode_video_fields(doc: Any) -> Dict[str, Any]:
+    """
+    Turn a stored video (of any schema version) back into a dict keyed by
+    field name. Fields missing from the document, e.g. because they were
+    projected out, are left out.
+    """
+    if doc.get("_v", 0) == 0:
+        return {field: doc[field] for field in VIDEO_KEYS if field in doc}
+    return {field: doc[key] for field, key in VIDEO_KEYS.items() if key in doc}
+
+def video_projection(fields: Iterable[str]) -> Dict[str, int]:
+    """
+    A projection returning only the given fields (and the schema version,
+    which decode_video_fields() needs).
+    """
+    return {"_id": 0, "_v": 1, **{VIDEO_KEYS[field]: 1 for field in fields}}
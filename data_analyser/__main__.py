@@ -5,11 +5,23 @@ from time import sleep
 
 from dotenv import load_dotenv
 
-from components.database import subscriptions
-from .utils import analyse_collection
+from components.database import subscriptions, ensure_indexes
+from .pipeline import AnalyserPipeline
+from .retries import RetryPolicy
 
 load_dotenv('.env')
 
+ensure_indexes(subscriptions)
+
+pipeline = AnalyserPipeline(
+    subscriptions,
+    getenv("YOUTUBE_API_KEY") or '',
+    workers=int(getenv("ANALYSER_WORKERS") or 4),
+    rate=float(getenv("ANALYSER_RATE") or 5),
+    policy=RetryPolicy(max_attempts=int(getenv("ANALYSER_MAX_ATTEMPTS") or 5)),
+)
+
 while True:
-    analyse_collection(subscriptions, getenv("YOUTUBE_API_KEY") or '')
+    if pipeline.run():
+        print("Analysed:", pipeline.stats())
     sleep(30)
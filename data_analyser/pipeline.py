@@ -0,0 +1,210 @@
+from datetime import datetime, UTC
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+from time import monotonic, sleep
+from traceback import print_exc
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from pymongo.collection import Collection
+
+from components.database import SubscriptionsWriter
+from components.subscriptions.typing import SubsDict
+from components.extractor.obtain_vid_info import MAX_IDS_PER_REQUEST
+from .retries import RetryPolicy
+from .utils import Duration, due_videos, resolve_durations, write_durations
+
+Chunk = List[Dict[str, Any]]
+
+class TokenBucket:
+    """
+    Lets through rate acquisitions per second on average, and bursts of up
+    to capacity, blocking the callers which are over the limit. A rate of 0
+    means no limit.
+    """
+    def __init__(self, rate: float, capacity: float = 1,
+                 clock: Callable[[], float] = monotonic,
+                 sleep: Callable[[float], None] = sleep) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated = clock()
+        self._lock = Lock()
+
+    def acquire(self, tokens: float = 1) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            self.sleep(wait)
+
+class AnalyserPipeline:
+    """
+    Analyses the pending videos like analyse_collection(), but in stages
+    running at the same time: the pending videos are streamed from the
+    database in chunks of chunk_size (one API request each), up to workers
+    threads resolve the chunks' durations, no more than rate requests per
+    second, and the results are written back in bulk writes of up to
+    write_batch_size videos, within write_delay seconds of being resolved.
+    The queues between the stages are bounded, so only a few chunks are in
+    memory whatever the backlog. Failed videos are retried according to
+    policy.
+    """
+    def __init__(self, subs_collection: Collection[SubsDict], api_key: str = '',
+                 workers: int = 4, rate: float = 5, burst: float = 1,
+                 chunk_size: int = MAX_IDS_PER_REQUEST, write_batch_size: int = 500,
+                 write_delay: float = 1,
+                 queue_size: int = 0, policy: RetryPolicy = RetryPolicy(),
+                 resolve: Callable[[List[Tuple[str, str]], str], Sequence[Duration]] = resolve_durations) -> None:
+        self.subs_collection = subs_collection
+        self.api_key = api_key
+        self.workers = max(1, workers)
+        self.limiter = TokenBucket(rate, max(1, burst))
+        self.chunk_size = chunk_size
+        self.write_batch_size = write_batch_size
+        self.write_delay = write_delay
+        self.policy = policy
+        self.resolve = resolve
+        queue_size = queue_size or 2 * self.workers
+        self.pending: Queue[Optional[Chunk]] = Queue(maxsize=queue_size)
+        self.results: Queue[Optional[Tuple[Chunk, Sequence[Duration]]]] = Queue(maxsize=queue_size)
+        self._abort = Event()
+        self._lock = Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.read = 0
+        self.resolved = 0
+        self.written = 0
+        self.failed = 0
+        self.requests = 0
+        self.writes = 0
+        self.now = datetime.now(tz=UTC)
+        self.started = monotonic()
+        self.finished: Optional[float] = None
+        # The resolver threads which have not yet said they are done.
+        self._running = self.workers
+        self._abort.clear()
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def run(self) -> int:
+        """
+        Analyse all the videos pending now. Returns the number of
+        subscriptions which had videos analysed. Errors reading or writing
+        the database stop the pipeline and are raised once it is drained.
+        """
+        self._reset()
+        errors: List[Exception] = []
+        def produce() -> None:
+            try:
+                self._produce()
+            except Exception as e:
+                errors.append(e)
+                self._abort.set()
+            finally:
+                for _ in range(self.workers):
+                    self.pending.put(None)
+        threads = [Thread(target=produce, daemon=True)]
+        threads += [Thread(target=self._resolve_chunks, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            updated_subs = self._write_results()
+        except Exception as e:
+            errors.append(e)
+            self._abort.set()
+            updated_subs = set()
+            self._drain()
+        for thread in threads:
+            thread.join()
+        self.finished = monotonic()
+        if errors:
+            raise errors[0]
+        return len(updated_subs)
+
+    def _produce(self) -> None:
+        chunk: Chunk = []
+        for vid in due_videos(self.subs_collection, self.now, self.chunk_size):
+            if self._abort.is_set():
+                return
+            chunk.append(vid)
+            self._count("read")
+            if len(chunk) == self.chunk_size:
+                self.pending.put(chunk)
+                chunk = []
+        if chunk:
+            self.pending.put(chunk)
+
+    def _resolve_chunks(self) -> None:
+        try:
+            while (chunk := self.pending.get()) is not None:
+                if self._abort.is_set():
+                    continue
+                self.limiter.acquire()
+                self._count("requests")
+                try:
+                    durations = self.resolve([(vid["id"], vid["link"]) for vid in chunk], self.api_key)
+                except Exception:
+                    # Left pending for the next run.
+                    print_exc()
+                    continue
+                self._count("resolved", len(chunk))
+                self.results.put((chunk, durations))
+        finally:
+            self.results.put(None)
+
+    def _write_results(self) -> Set[str]:
+        updated_subs: Set[str] = set()
+        with SubscriptionsWriter(self.subs_collection, self.write_batch_size, self.write_delay) as writer:
+            while self._running:
+                try:
+                    # Queued results are written within write_delay, even
+                    # while the workers are slow to send more.
+                    result = self.results.get(timeout=writer.seconds_until_due())
+                except Empty:
+                    writer.flush()
+                    self.written = writer.videos.written
+                    continue
+                if result is None:
+                    self._running -= 1
+                    continue
+                vids, durations = result
+                updated_subs |= write_durations(writer, vids, durations, self.now, self.policy)
+                self.written = writer.videos.written
+                self._count("failed", sum(isinstance(duration, Exception) for duration in durations))
+        self.written = writer.videos.written
+        self.writes = writer.videos.flushes
+        return updated_subs
+
+    def _drain(self) -> None:
+        # Only the threads still running, as the writer may have failed
+        # after hearing from some (or all) of them.
+        while self._running:
+            if self.results.get() is None:
+                self._running -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = (self.finished or monotonic()) - self.started
+        return {
+            "read": self.read,
+            "resolved": self.resolved,
+            "written": self.written,
+            "failed": self.failed,
+            "requests": self.requests,
+            "writes": self.writes,
+            "pending_queue": self.pending.qsize(),
+            "results_queue": self.results.qsize(),
+            "elapsed": elapsed,
+            "videos_per_second": self.written / elapsed if elapsed > 0 else 0.0,
+        }
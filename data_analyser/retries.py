@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from random import uniform
+from typing import Any, Callable, Dict, NamedTuple
+
+from components.videos import FAILED_DURATION, RETRY_KEYS, VIDEO_KEYS
+
+class RetryPolicy(NamedTuple):
+    """
+    How failed analyses are retried: after base_delay seconds, doubling with
+    every further failure up to max_delay, and given up on after
+    max_attempts failures.
+    """
+    max_attempts: int = 5
+    base_delay: float = 60
+    max_delay: float = 24 * 60 * 60
+
+    def delay(self, attempts: int, jitter: Callable[[float, float], float] = uniform) -> timedelta:
+        """
+        The time to wait after the given number of failed attempts. It is
+        randomised between half and all of the exponential delay, so that
+        videos which failed together (e.g. during an outage) are not all
+        retried at the same time.
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return timedelta(seconds=jitter(delay / 2, delay))
+
+    def exhausted(self, attempts: int) -> bool:
+        return attempts >= self.max_attempts
+
+def due_query(now: datetime) -> Dict[str, Any]:
+    """
+    The pending videos which were never tried, or whose retry is due.
+    """
+    retry_at = RETRY_KEYS["retry_at"]
+    return {
+        VIDEO_KEYS["analysed"]: False,
+        "$or": [{retry_at: {"$exists": False}}, {retry_at: {"$lte": now}}],
+    }
+
+def success_update(duration: int) -> Dict[str, Any]:
+    return {
+        "$set": {VIDEO_KEYS["analysed"]: True, VIDEO_KEYS["duration"]: duration},
+        "$unset": {key: "" for key in RETRY_KEYS.values()},
+    }
+
+def failure_update(attempts: int, error: Exception, now: datetime,
+                   policy: RetryPolicy = RetryPolicy()) -> Dict[str, Any]:
+    """
+    The update recording one more failed attempt, after the given number of
+    earlier ones. The video is retried later, or marked as analysed with
+    FAILED_DURATION once policy.max_attempts is reached. The attempts and
+    error class are kept either way, for diagnosis.
+    """
+    attempts += 1
+    retry_state = {RETRY_KEYS["attempts"]: attempts, RETRY_KEYS["error"]: type(error).__name__}
+    if policy.exhausted(attempts):
+        return {
+            "$set": {
+                VIDEO_KEYS["analysed"]: True,
+                VIDEO_KEYS["duration"]: FAILED_DURATION,
+                **retry_state,
+            },
+            "$unset": {RETRY_KEYS["retry_at"]: ""},
+        }
+    return {"$set": {RETRY_KEYS["retry_at"]: now + policy.delay(attempts), **retry_state}}
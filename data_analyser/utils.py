@@ -1,34 +1,93 @@
+from datetime import datetime, UTC
 from traceback import print_exc
+from typing import Any, Dict, Iterator, List, Sequence, Set, Tuple, Union
 
 from pymongo.collection import Collection
 
-from components.subscriptions.main import Subscription
+from components.database import SubscriptionsWriter, get_videos_collection
 from components.subscriptions.typing import SubsDict
-from components.videos import VideoTuple
-from components.extractor.obtain_vid_info import obtain_vid_duration
+from components.videos import RETRY_KEYS, VIDEO_KEYS, decode_video_fields, video_projection
+from components.extractor.obtain_vid_info import (
+    MAX_IDS_PER_REQUEST, obtain_vid_duration, obtain_vid_durations,
+)
+from .retries import RetryPolicy, due_query, failure_update, success_update
 
-def analyse_video(vid_tuple: VideoTuple, api_key: str='') -> VideoTuple:
+# A duration, or the exception raised while looking it up.
+Duration = Union[int, Exception]
+
+def try_resolve_duration(link: str, vid_id: str, api_key: str='') -> Duration:
     try:
-        duration = obtain_vid_duration(vid_tuple.link, vid_tuple.id, api_key=api_key)
-    except:
+        return obtain_vid_duration(link, vid_id, api_key=api_key)
+    except Exception as e:
         print_exc()
-        duration = -2
-    return vid_tuple._replace(analysed=True, duration=duration)
-
-def analyse_subscription(sub: Subscription, api_key: str='') -> bool:
-    updated = False
-    for i, vid in enumerate(sub.videos):
-        if not vid.analysed:
-            sub.videos[i] = analyse_video(vid, api_key)
-            updated = True
-    return updated
-
-def analyse_collection(subs_collection: Collection[SubsDict], api_key: str='') -> int:
-    num_updated = 0
-    for sub_dict in subs_collection.find():
-        sub = Subscription(**sub_dict)
-        sub._collection = subs_collection
-        if analyse_subscription(sub, api_key):
-            sub.update_videos()
-            num_updated += 1
-    return num_updated
+        return e
+
+def resolve_durations(vids: List[Tuple[str, str]], api_key: str='') -> List[Duration]:
+    """
+    Resolve the durations of (id, link) pairs with batched API calls when an
+    api_key is given. Videos the API did not return are scraped one by one.
+    Videos which could not be resolved get the exception raised instead.
+    """
+    durations = obtain_vid_durations((vid_id for vid_id, _ in vids), api_key) if api_key else {}
+    return [
+        durations[vid_id] if vid_id in durations else try_resolve_duration(link, vid_id)
+        for vid_id, link in vids
+    ]
+
+def due_videos(subs_collection: Collection[SubsDict], now: datetime,
+               batch_size: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    The pending videos which are due for analysis (see due_query()), with
+    only the fields needed to analyse them and their number of failed
+    attempts so far.
+    """
+    for doc in get_videos_collection(subs_collection).find(
+        due_query(now),
+        {**video_projection(("sub_id", "id", "link")), RETRY_KEYS["attempts"]: 1},
+    ).batch_size(batch_size):
+        yield {**decode_video_fields(doc), "attempts": doc.get(RETRY_KEYS["attempts"], 0)}
+
+def analyse_collection(subs_collection: Collection[SubsDict], api_key: str='',
+                       policy: RetryPolicy = RetryPolicy()) -> int:
+    """
+    Analyse the pending videos of all the subscriptions together, so that
+    each API request is filled with MAX_IDS_PER_REQUEST ids. Returns the
+    number of subscriptions which had videos analysed.
+
+    Only pending videos are read (through the pending_analysis index), and
+    only the fields needed to analyse them, so subscriptions with nothing
+    to do cost nothing. Videos which failed before are only read once their
+    retry is due.
+    """
+    now = datetime.now(tz=UTC)
+    pending = list(due_videos(subs_collection, now))
+    updated_subs: Set[str] = set()
+    with SubscriptionsWriter(subs_collection) as writer:
+        for start in range(0, len(pending), MAX_IDS_PER_REQUEST):
+            chunk = pending[start:start + MAX_IDS_PER_REQUEST]
+            durations = resolve_durations([(vid["id"], vid["link"]) for vid in chunk], api_key)
+            updated_subs.update(write_durations(writer, chunk, durations, now, policy))
+    return len(updated_subs)
+
+def write_durations(writer: SubscriptionsWriter, vids: List[Dict[str, Any]],
+                    durations: Sequence[Duration], now: datetime,
+                    policy: RetryPolicy = RetryPolicy()) -> Set[str]:
+    """
+    Queue the updates marking the videos (dicts with sub_id, id and
+    attempts) as analysed with their durations, or scheduling a retry for
+    those which failed. Returns the ids of the subscriptions which had
+    videos analysed (or given up on), whose versions are increased so that
+    the API knows they changed.
+    """
+    sub_ids: Set[str] = set()
+    for vid, duration in zip(vids, durations):
+        writer.videos.update(
+            {VIDEO_KEYS["sub_id"]: vid["sub_id"], VIDEO_KEYS["id"]: vid["id"]},
+            failure_update(vid.get("attempts", 0), duration, now, policy)
+            if isinstance(duration, Exception) else success_update(duration),
+        )
+        if not isinstance(duration, Exception) or policy.exhausted(vid.get("attempts", 0) + 1):
+            sub_ids.add(vid["sub_id"])
+    for sub_id in sub_ids:
+        writer.subs.update({"_id": sub_id}, {"$inc": {"version": 1}})
+    return sub_ids
@@ -1,10 +1,25 @@
 #!/usr/bin/env python
 
+from os import getenv
 from time import sleep
+
+from dotenv import load_dotenv
+
 from components.database import subscriptions
+from .scheduler import FetchScheduler
+from .utils import collector_id
 
-from .utils import collect_data
+load_dotenv('.env')
 
+scheduler = FetchScheduler(
+    subscriptions,
+    max_workers=int(getenv("COLLECTOR_WORKERS") or 1),
+    max_per_host=int(getenv("COLLECTOR_WORKERS_PER_HOST") or 0),
+    # Set when several collectors share the database.
+    owner=collector_id() if getenv("COLLECTOR_LEASE_TIME") else '',
+    lease_time=float(getenv("COLLECTOR_LEASE_TIME") or 600),
+    claim_batch=int(getenv("COLLECTOR_CLAIM_BATCH") or 100),
+)
 while True:
-    collect_data(subscriptions)
-    sleep(60)
+    scheduler.run_pending()
+    sleep(scheduler.seconds_until_next())
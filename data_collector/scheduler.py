@@ -0,0 +1,78 @@
+from datetime import datetime, UTC
+from heapq import heapify, heappop, heappush
+from typing import List, Set, Tuple
+
+from pymongo.collection import Collection
+
+from components.database import SubscriptionsWriter, ensure_indexes
+from components.subscriptions.typing import SubsDict
+from components.subscriptions.main import Subscription
+from .utils import claim_due_subscriptions, due_subscriptions, fetch_subscriptions, release_leases
+
+class FetchScheduler:
+    """
+    Keep a min-heap of (next_fetch_at, _id) so that the collector sleeps
+    until the earliest deadline instead of scanning the whole collection.
+
+    The heap is only a hint for how long to sleep; the database decides what
+    is actually due. Subscriptions added or modified through the API are
+    picked up after at most max_sleep seconds.
+
+    With an owner, several collectors can share the database: each one
+    leases up to claim_batch due subscriptions at a time for lease_time
+    seconds, and only fetches those. The heap then only knows about the
+    subscriptions this collector fetched, so the others' are checked every
+    max_sleep seconds.
+    """
+    def __init__(self, subs_collection: Collection[SubsDict], max_sleep: float = 60,
+                 max_workers: int = 1, max_per_host: int = 0, owner: str = '',
+                 lease_time: float = 600, claim_batch: int = 100) -> None:
+        self._collection = subs_collection
+        self.max_sleep = max_sleep
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.owner = owner
+        self.lease_time = lease_time
+        self.claim_batch = claim_batch
+        self._heap: List[Tuple[datetime, str]] = []
+        ensure_indexes(self._collection)
+        self.reload()
+
+    def reload(self) -> None:
+        never = datetime.min.replace(tzinfo=UTC)
+        self._heap = [
+            (sub_dict.get("next_fetch_at", never), sub_dict["_id"])
+            for sub_dict in self._collection.find({}, {"next_fetch_at": 1})
+        ]
+        heapify(self._heap)
+
+    def run_pending(self) -> int:
+        now = datetime.now(tz=UTC)
+        # Everything up to now is either fetched below or stale.
+        while self._heap and self._heap[0][0] <= now:
+            heappop(self._heap)
+        if not self.owner:
+            return self._fetch(list(due_subscriptions(self._collection, now)))
+        num_fetched = 0
+        # Subscriptions are claimed once per cycle, even if writing their
+        # next_fetch_at failed and they are still due.
+        fetched: Set[str] = set()
+        while due := claim_due_subscriptions(self._collection, self.owner, self.lease_time,
+                                             self.claim_batch, now, fetched):
+            num_fetched += self._fetch(due)
+            fetched.update(sub._id for sub in due)
+            release_leases(self._collection, self.owner)
+        return num_fetched
+
+    def _fetch(self, due: List[Subscription]) -> int:
+        with SubscriptionsWriter(self._collection) as writer:
+            num_fetched = fetch_subscriptions(due, self.max_workers, self.max_per_host, writer)
+        for sub in due:
+            heappush(self._heap, (sub.next_fetch_at, sub._id))
+        return num_fetched
+
+    def seconds_until_next(self) -> float:
+        if not self._heap:
+            return self.max_sleep
+        delay = (self._heap[0][0] - datetime.now(tz=UTC)).total_seconds()
+        return min(max(delay, 0), self.max_sleep)
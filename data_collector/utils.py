@@ -1,13 +1,160 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime, timedelta, UTC
+from functools import partial
+from os import getpid
+from socket import gethostname
+from threading import BoundedSemaphore, Lock
+from typing import Any, Callable, DefaultDict, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlparse
+from uuid import uuid4
 
+from pymongo import ASCENDING
 from pymongo.collection import Collection
 
+from components.database import SubscriptionsWriter
 from components.subscriptions.main import Subscription
 from components.subscriptions.typing import SubsDict
 
-def collect_data(subs_collection: Collection[SubsDict]) -> None:
-    for sub_dict in subs_collection.find():
-        sub = Subscription(**sub_dict)
-        sub._collection = subs_collection
-        if datetime.now(tz=UTC) - sub.last_fetch > timedelta(seconds=sub.time_between_fetches):
+def due_filter(now: datetime) -> Dict[str, Any]:
+    """
+    Match subscriptions whose next fetch is due. Documents written before
+    next_fetch_at existed are always considered due.
+    """
+    return {"$or": [
+        {"next_fetch_at": {"$lte": now}},
+        {"next_fetch_at": {"$exists": False}},
+    ]}
+
+# The lease fields are only used by the collectors to share the work, and
+# are left out of the Subscription objects.
+SUB_PROJECTION = {"videos": 0, "lease_owner": 0, "lease_expires": 0}
+
+def subscription_from_dict(subs_collection: Collection[SubsDict], sub_dict: SubsDict) -> Subscription:
+    sub = Subscription(**sub_dict)
+    sub._collection = subs_collection
+    return sub
+
+def due_subscriptions(subs_collection: Collection[SubsDict],
+                      now: datetime) -> Iterator[Subscription]:
+    for sub_dict in subs_collection.find(due_filter(now), SUB_PROJECTION):
+        yield subscription_from_dict(subs_collection, sub_dict)
+
+def collector_id() -> str:
+    """
+    An owner for leases which no other collector process uses, even on
+    other hosts.
+    """
+    return "%s:%d:%s" % (gethostname(), getpid(), uuid4().hex[:8])
+
+def claim_due_subscriptions(subs_collection: Collection[SubsDict], owner: str,
+                            lease_time: float, limit: int = 0,
+                            now: Optional[datetime] = None, exclude: Iterable[str] = (),
+                            clock: Callable[[], datetime] = partial(datetime.now, UTC)) -> List[Subscription]:
+    """
+    Lease up to limit (0 for all) of the subscriptions due at now, other
+    than those in exclude, to owner for lease_time seconds, so that
+    collectors sharing the database fetch disjoint sets of them. Each one is
+    claimed by an atomic find_one_and_update(), which only matches it while
+    nobody else holds an unexpired lease on it, so the leases of crashed
+    collectors are taken over once they expire. Leases are checked and
+    granted at the time of each claim (from clock), however old now is.
+    They should outlast fetching the claimed subscriptions and writing the
+    results, after which the subscriptions are no longer due.
+    """
+    now = now or clock()
+    excluded = list(exclude)
+    subs: List[Subscription] = []
+    while not limit or len(subs) < limit:
+        claimed_at = clock()
+        conditions: List[Dict[str, Any]] = [due_filter(now), {"$or": [
+            {"lease_expires": {"$lte": claimed_at}},
+            {"lease_expires": {"$exists": False}},
+        ]}]
+        if excluded:
+            conditions.append({"_id": {"$nin": excluded}})
+        sub_dict = subs_collection.find_one_and_update(
+            {"$and": conditions},
+            {"$set": {"lease_owner": owner, "lease_expires": claimed_at + timedelta(seconds=lease_time)}},
+            SUB_PROJECTION, sort=[("next_fetch_at", ASCENDING)],
+        )
+        if sub_dict is None:
+            break
+        subs.append(subscription_from_dict(subs_collection, sub_dict))
+    return subs
+
+def release_leases(subs_collection: Collection[SubsDict], owner: str) -> int:
+    """
+    Only releases owner's own leases, so that a collector which overran
+    its leases cannot release those since claimed by another one.
+    """
+    return subs_collection.update_many(
+        {"lease_owner": owner},
+        {"$unset": {"lease_owner": "", "lease_expires": ""}},
+    ).modified_count
+
+class HostLimiter:
+    """
+    Cap the number of simultaneous downloads per host. A limit of 0 means
+    no per-host limit.
+    """
+    def __init__(self, max_per_host: int = 0) -> None:
+        self.max_per_host = max_per_host
+        self._lock = Lock()
+        self._semaphores: DefaultDict[str, BoundedSemaphore] = defaultdict(
+            lambda: BoundedSemaphore(max_per_host)
+        )
+
+    @contextmanager
+    def limit(self, url: str) -> Iterator[None]:
+        if self.max_per_host <= 0:
+            yield
+            return
+        with self._lock:
+            semaphore = self._semaphores[urlparse(url).netloc]
+        with semaphore:
+            yield
+
+def fetch_subscriptions(subs: Iterable[Subscription], max_workers: int = 1,
+                        max_per_host: int = 0,
+                        writer: Optional[SubscriptionsWriter] = None) -> int:
+    """
+    Fetch the given subscriptions, downloading up to max_workers feeds at
+    once. Database writes are done on the calling thread as downloads
+    complete, so each subscription is still updated by a single writer.
+    With a writer, they are queued there to be written in batches.
+    """
+    if max_workers <= 1:
+        num_fetched = 0
+        for sub in subs:
+            sub._writer = writer
             sub.fetch()
+            num_fetched += 1
+        return num_fetched
+    limiter = HostLimiter(max_per_host)
+    def download(sub: Subscription) -> Any:
+        with limiter.limit(sub.link):
+            return sub.download_feed()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(download, sub): sub for sub in subs}
+        for future in as_completed(futures):
+            sub = futures[future]
+            sub._writer = writer
+            try:
+                rss = future.result()
+            except Exception as e:
+                sub.fetch_failed(e)
+                continue
+            sub.process_feed(rss)
+    return len(futures)
+
+def collect_data(subs_collection: Collection[SubsDict], max_workers: int = 1,
+                 max_per_host: int = 0) -> int:
+    with SubscriptionsWriter(subs_collection) as writer:
+        return fetch_subscriptions(
+            due_subscriptions(subs_collection, datetime.now(tz=UTC)),
+            max_workers,
+            max_per_host,
+            writer,
+        )
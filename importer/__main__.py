@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+from argparse import ArgumentParser
+from os import getenv
+from sys import stdin
+
+from dotenv import load_dotenv
+
+from components.database import resolutions, subscriptions
+from components.extractor.resolution_cache import ResolutionCache
+from components.subscriptions.bulk_import import import_subscriptions, parse_import
+
+load_dotenv('.env')
+
+parser = ArgumentParser(
+    prog="python -m importer",
+    description="Subscribe to every channel or playlist of an OPML file or a list of URLs.",
+)
+parser.add_argument("file", help="the OPML file or URL list, or - for the standard input")
+parser.add_argument("--time-between-fetches", type=int, default=3600, help="in seconds")
+parser.add_argument("--workers", type=int, default=int(getenv("IMPORT_WORKERS") or 8),
+                    help="the number of URLs resolved at the same time")
+args = parser.parse_args()
+
+if args.file == "-":
+    text = stdin.read()
+else:
+    with open(args.file) as file:
+        text = file.read()
+results = import_subscriptions(
+    parse_import(text), args.time_between_fetches, subscriptions, args.workers,
+    get_sub_info=ResolutionCache(resolutions).get_sub_info,
+)
+for result in results:
+    print(result.status, result.url, result.id or result.error, sep="\t")
+print(sum(result.status == "added" for result in results), "of", len(results), "URLs added.")
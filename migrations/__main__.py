@@ -0,0 +1,11 @@
+#!/usr/bin/env python
+
+from components.database import subscriptions, ensure_indexes
+
+from .utils import count_videos, move_embedded_videos, requeue_failed_analyses, upgrade_video_documents
+
+print("Upgraded", upgrade_video_documents(subscriptions), "video documents.")
+print("Moved the embedded videos of", move_embedded_videos(subscriptions), "subscriptions.")
+print("Counted the videos of", count_videos(subscriptions), "subscriptions.")
+print("Requeued", requeue_failed_analyses(subscriptions), "failed video analyses.")
+ensure_indexes(subscriptions)
@@ -0,0 +1,106 @@
+from typing import Any, Dict, List, cast
+
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+
+from components.database import get_videos_collection
+from components.subscriptions.typing import SubsDict
+from components.videos import (FAILED_DURATION, RETRY_KEYS, VIDEO_KEYS, VideoTuple,
+                               decode_video_fields, encode_video_fields)
+
+def move_embedded_videos(subs_collection: Collection[SubsDict]) -> int:
+    """
+    Move the videos embedded in subscription documents (stored as positional
+    arrays) into the videos collection. Videos already in the videos
+    collection are left untouched, so it is safe to run more than once.
+    """
+    videos_collection = get_videos_collection(subs_collection)
+    num_migrated = 0
+    for sub_dict in subs_collection.find({"videos": {"$exists": True}}, {"videos": 1}):
+        sub_id = sub_dict["_id"]
+        requests = [
+            UpdateOne(
+                {VIDEO_KEYS["sub_id"]: sub_id, VIDEO_KEYS["id"]: vid.id},
+                {"$setOnInsert": vid.to_document(sub_id)},
+                upsert=True,
+            )
+            for vid in map(VideoTuple._make, sub_dict["videos"]) # type: ignore[typeddict-item]
+        ]
+        if requests:
+            videos_collection.bulk_write(requests, ordered=False)
+        subs_collection.update_one({"_id": sub_id}, {"$unset": {"videos": ""}})
+        num_migrated += 1
+    return num_migrated
+
+def upgrade_video_documents(subs_collection: Collection[SubsDict], batch_size: int = 1000) -> int:
+    """
+    Rewrite the videos stored with the field names as keys (schema version
+    0) using the short keys of the current version. The indexes on the old
+    keys are dropped; ensure_indexes() creates the new ones.
+    """
+    # The old documents do not match VideoDict.
+    videos_collection = cast(Collection[Dict[str, Any]], get_videos_collection(subs_collection))
+    if not videos_collection.find_one({"_v": {"$exists": False}}, {"_id": 1}):
+        return 0
+    for name, info in videos_collection.index_information().items():
+        if any(key in VIDEO_KEYS for key, _ in info["key"]):
+            videos_collection.drop_index(name)
+    num_upgraded = 0
+    requests: List[Any] = []
+    for doc in videos_collection.find({"_v": {"$exists": False}}):
+        requests.append(UpdateOne({"_id": doc["_id"]}, {
+            "$set": encode_video_fields(decode_video_fields(doc)),
+            "$unset": {field: "" for field in VIDEO_KEYS if field in doc},
+        }))
+        if len(requests) >= batch_size:
+            num_upgraded += videos_collection.bulk_write(requests, ordered=False).modified_count
+            requests = []
+    if requests:
+        num_upgraded += videos_collection.bulk_write(requests, ordered=False).modified_count
+    return num_upgraded
+
+def count_videos(subs_collection: Collection[SubsDict]) -> int:
+    """
+    Store the number of videos of every subscription, which is maintained
+    incrementally from then on. Returns the number of subscriptions updated.
+    """
+    # The grouped documents do not match VideoDict.
+    videos_collection = cast(Collection[Dict[str, Any]], get_videos_collection(subs_collection))
+    counts = {
+        group["_id"]: group["count"] for group in videos_collection.aggregate([
+            {"$group": {"_id": "$" + VIDEO_KEYS["sub_id"], "count": {"$sum": 1}}},
+        ])
+    }
+    requests = [
+        UpdateOne({"_id": sub_dict["_id"]}, {
+            "$set": {"video_count": counts.get(sub_dict["_id"], 0)},
+            "$inc": {"version": 1},
+        })
+        for sub_dict in subs_collection.find({"video_count": {"$exists": False}}, {"_id": 1})
+    ]
+    if not requests:
+        return 0
+    return subs_collection.bulk_write(requests, ordered=False).modified_count
+
+def requeue_failed_analyses(subs_collection: Collection[SubsDict]) -> int:
+    """
+    Make the videos whose analysis failed before failures were retried
+    (those with the failed duration but no retry state) pending again, so
+    that they get the retries they missed. Videos given up on since then
+    keep their retry state, so it is safe to run more than once. Returns
+    the number of videos requeued.
+    """
+    videos_collection = get_videos_collection(subs_collection)
+    query = {
+        VIDEO_KEYS["analysed"]: True,
+        VIDEO_KEYS["duration"]: FAILED_DURATION,
+        RETRY_KEYS["attempts"]: {"$exists": False},
+    }
+    sub_ids = videos_collection.distinct(VIDEO_KEYS["sub_id"], query)
+    if not sub_ids:
+        return 0
+    result = videos_collection.update_many(query, {
+        "$set": {VIDEO_KEYS["analysed"]: False, VIDEO_KEYS["duration"]: -1},
+    })
+    subs_collection.update_many({"_id": {"$in": sub_ids}}, {"$inc": {"version": 1}})
+    return result.modified_count
@@ -0,0 +1,4 @@
+from .utils.mongomock_compat import allow_update_one_in_bulk_write
+
+# The code writes UpdateOne operations in bulk, as it should against MongoDB.
+allow_update_one_in_bulk_write()
@@ -1,14 +1,17 @@
-from typing import Any, Dict
+from datetime import datetime, timedelta, UTC
+from typing import Any, Dict, cast
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
 from mongomock import MongoClient
 from pymongo.collection import Collection
 
+from components.database import get_videos_collection
 from components.subscriptions.main import Subscription
 from components.subscriptions.typing import SubsDict
-from components.videos import VideoTuple
-from data_analyser.utils import analyse_video, analyse_subscription, analyse_collection
+from components.videos import FAILED_DURATION, RETRY_KEYS, VIDEO_KEYS, VideoDict, VideoTuple
+from data_analyser.retries import RetryPolicy
+from data_analyser.utils import analyse_collection
 from .utils.vid_url_to_html import obtain_vid_duration
 from .utils.get_random_vid_info import get_random_vid_duration
 
@@ -16,6 +19,9 @@ class TestAnalyser(TestCase):
     def setUp(self) -> None:
         self.client: MongoClient[Any] = MongoClient(tz_aware=True)
         self.collection: Collection[SubsDict] = self.client.db.collection
+        self.videos: Collection[VideoDict] = get_videos_collection(self.collection)
+        # With the retry state, which VideoDict only partly describes.
+        self.video_docs = cast(Collection[Dict[str, Any]], self.videos)
 
         self.sub1 = Subscription(
             _id="yt:channel:hlgI3UHCOnwUGzWzbJ3H5w",
@@ -31,58 +37,17 @@ class TestAnalyser(TestCase):
         self.mock_vid_duration.side_effect = obtain_vid_duration
         self.addCleanup(patch.stopall)
 
-    def test_analyse_video(self) -> None:
-        modified_vid = analyse_video(self.sub1.videos[1])
-
-        expected_duration = get_random_vid_duration(self.sub1.videos[1].link)
-        self.assertIsInstance(modified_vid, VideoTuple)
-        self.assertEqual(modified_vid.duration, expected_duration)
-        self.assertTrue(modified_vid.analysed)
-
-    def test_analyse_video_with_exception(self) -> None:
-        self.mock_vid_duration.side_effect = Exception("Network error")
-
-        modified_vid = analyse_video(self.sub1.videos[0])
-        self.assertIsInstance(modified_vid, VideoTuple)
-        self.assertLess(modified_vid.duration, 0)
-        self.assertTrue(modified_vid.analysed)
-
-    def test_analyse_subscription(self) -> None:
-        self.assertTrue(analyse_subscription(self.sub1))
-        for vid in self.sub1.videos:
-            expected_duration = get_random_vid_duration(vid.link)
-            self.assertEqual(vid.duration, expected_duration)
-            self.assertTrue(vid.analysed)
-
-    def test_analyse_subscription_with_further_fetch(self) -> None:
-        self.assertTrue(analyse_subscription(self.sub1))
-        for vid in self.sub1.videos:
-            expected_duration = get_random_vid_duration(vid.link)
-            self.assertEqual(vid.duration, expected_duration)
-            self.assertTrue(vid.analysed)
-        self.sub1.link = r"tests/data/feed@ytnnews24@002.xml"
-        self.sub1.fetch()
-        self.assertTrue(analyse_subscription(self.sub1))
-        for vid in self.sub1.videos:
-            expected_duration = get_random_vid_duration(vid.link)
-            self.assertEqual(vid.duration, expected_duration)
-            self.assertTrue(vid.analysed)
-
-    def test_analyse_subscription_without_further_fetch(self) -> None:
-        self.assertTrue(analyse_subscription(self.sub1))
-        for vid in self.sub1.videos:
+    def test_analyse_collection(self) -> None:
+        version = self.sub1.version
+        self.assertEqual(analyse_collection(self.collection), 1)
+        # The API has to know that the videos changed.
+        sub_dict = self.collection.find_one({"_id": self.sub1._id})
+        assert sub_dict # To appease mypy.
+        self.assertGreater(sub_dict["version"], version)
+        for vid in map(VideoTuple.from_document, self.videos.find()):
             expected_duration = get_random_vid_duration(vid.link)
             self.assertEqual(vid.duration, expected_duration)
             self.assertTrue(vid.analysed)
-        self.assertFalse(analyse_subscription(self.sub1))
-
-    def test_analyse_collection(self) -> None:
-        self.assertEqual(analyse_collection(self.collection), 1)
-        for sub_dict in self.collection.find():
-            for vid in map(VideoTuple._make, sub_dict["videos"]):
-                expected_duration = get_random_vid_duration(vid.link)
-                self.assertEqual(vid.duration, expected_duration)
-                self.assertTrue(vid.analysed)
         self.sub2 = Subscription(
             _id="yt:channel:7YOGHUfC1Tb6E4pudI9STA",
             link="tests/data/feed@mentaloutlaw@001.xml",
@@ -93,12 +58,111 @@ class TestAnalyser(TestCase):
         self.sub2.insert()
         self.sub2.fetch()
         self.assertEqual(analyse_collection(self.collection), 1)
-        for sub_dict in self.collection.find():
-            sub = Subscription(**sub_dict)
-            for vid in map(VideoTuple._make, sub_dict["videos"]):
-                expected_duration = get_random_vid_duration(vid.link)
-                self.assertEqual(vid.duration, expected_duration)
-                self.assertTrue(vid.analysed)
+        for vid in map(VideoTuple.from_document, self.videos.find()):
+            expected_duration = get_random_vid_duration(vid.link)
+            self.assertEqual(vid.duration, expected_duration)
+            self.assertTrue(vid.analysed)
+        self.assertEqual(self.videos.count_documents({}), 30)
+
+    def test_analyse_collection_idle(self) -> None:
+        self.assertEqual(analyse_collection(self.collection), 1)
+        self.mock_vid_duration.reset_mock()
+        with patch.object(self.collection, "find") as subs_find:
+            self.assertEqual(analyse_collection(self.collection), 0)
+        # The subscriptions are not read at all, and nothing is looked up.
+        subs_find.assert_not_called()
+        self.mock_vid_duration.assert_not_called()
+
+    def test_analyse_collection_with_api(self) -> None:
+        mock_vid_durations = patch('data_analyser.utils.obtain_vid_durations').start()
+        # The API returns every video apart from the first one.
+        mock_vid_durations.side_effect = lambda ids, api_key: {
+            vid.id: get_random_vid_duration(vid.link) for vid in self.sub1.videos[1:]
+        }
+        self.assertEqual(analyse_collection(self.collection, "key"), 1)
+        mock_vid_durations.assert_called_once()
+        # Only the missing video is scraped, without the API key.
+        self.mock_vid_duration.assert_called_once_with(
+            self.sub1.videos[0].link, self.sub1.videos[0].id, api_key='')
+        for vid in map(VideoTuple.from_document, self.videos.find()):
+            self.assertEqual(vid.duration, get_random_vid_duration(vid.link))
+            self.assertTrue(vid.analysed)
+        # Nothing is left to analyse.
+        self.assertEqual(analyse_collection(self.collection, "key"), 0)
+        mock_vid_durations.assert_called_once()
+
+    def make_retries_due(self) -> None:
+        past = datetime.now(tz=UTC) - timedelta(seconds=1)
+        self.video_docs.update_many({RETRY_KEYS["retry_at"]: {"$exists": True}},
+                                {"$set": {RETRY_KEYS["retry_at"]: past}})
+
+    def test_analyse_collection_retries(self) -> None:
+        failing = self.sub1.videos[0]
+        def duration(link: str, vid_id: str, **kwargs: Any) -> int:
+            if vid_id == failing.id:
+                raise ConnectionError("Network error")
+            return obtain_vid_duration(link, vid_id)
+        self.mock_vid_duration.side_effect = duration
+        self.assertEqual(analyse_collection(self.collection), 1)
+        doc = self.video_docs.find_one({VIDEO_KEYS["id"]: failing.id})
+        assert doc # To appease mypy.
+        # Not analysed for good, but retried later.
+        self.assertFalse(doc[VIDEO_KEYS["analysed"]])
+        self.assertEqual(doc[RETRY_KEYS["attempts"]], 1)
+        self.assertEqual(doc[RETRY_KEYS["error"]], "ConnectionError")
+        self.assertGreater(doc[RETRY_KEYS["retry_at"]], datetime.now(tz=UTC))
+        # The retry is not due yet.
+        self.mock_vid_duration.reset_mock()
+        self.assertEqual(analyse_collection(self.collection), 0)
+        self.mock_vid_duration.assert_not_called()
+        self.make_retries_due()
+        self.assertEqual(analyse_collection(self.collection), 0)
+        self.mock_vid_duration.assert_called_once()
+        doc = self.video_docs.find_one({VIDEO_KEYS["id"]: failing.id})
+        assert doc # To appease mypy.
+        self.assertEqual(doc[RETRY_KEYS["attempts"]], 2)
+        # Until it works.
+        self.mock_vid_duration.side_effect = obtain_vid_duration
+        self.make_retries_due()
+        self.assertEqual(analyse_collection(self.collection), 1)
+        doc = self.video_docs.find_one({VIDEO_KEYS["id"]: failing.id})
+        assert doc # To appease mypy.
+        self.assertTrue(doc[VIDEO_KEYS["analysed"]])
+        self.assertEqual(doc[VIDEO_KEYS["duration"]], get_random_vid_duration(failing.link))
+        self.assertFalse(set(RETRY_KEYS.values()) & set(doc))
+
+    def test_analyse_collection_gives_up(self) -> None:
+        self.mock_vid_duration.side_effect = Exception("Gone")
+        policy = RetryPolicy(max_attempts=3)
+        for _ in range(3):
+            analyse_collection(self.collection, policy=policy)
+            self.make_retries_due()
+        for doc in self.video_docs.find():
+            self.assertTrue(doc[VIDEO_KEYS["analysed"]])
+            self.assertEqual(doc[VIDEO_KEYS["duration"]], FAILED_DURATION)
+            self.assertEqual(doc.get(RETRY_KEYS["attempts"]), 3)
+            self.assertNotIn(RETRY_KEYS["retry_at"], doc)
+        self.mock_vid_duration.reset_mock()
+        self.assertEqual(analyse_collection(self.collection, policy=policy), 0)
+        self.mock_vid_duration.assert_not_called()
 
     def tearDown(self) -> None:
         self.client.close()
+
+class TestRetryPolicy(TestCase):
+    def test_delay(self) -> None:
+        policy = RetryPolicy(base_delay=60, max_delay=3600)
+        highest = lambda low, high: high
+        self.assertListEqual(
+            [policy.delay(attempts, highest).total_seconds() for attempts in range(1, 9)],
+            [60, 120, 240, 480, 960, 1920, 3600, 3600],
+        )
+        for attempts in range(1, 9):
+            delay = policy.delay(attempts).total_seconds()
+            self.assertGreaterEqual(delay, policy.delay(attempts, highest).total_seconds() / 2)
+            self.assertLessEqual(delay, policy.delay(attempts, highest).total_seconds())
+
+    def test_exhausted(self) -> None:
+        policy = RetryPolicy(max_attempts=2)
+        self.assertFalse(policy.exhausted(1))
+        self.assertTrue(policy.exhausted(2))
@@ -0,0 +1,177 @@
+from threading import Event, Thread
+from time import sleep
+from typing import Any, List
+from unittest import TestCase
+from unittest.mock import patch
+
+from mongomock import MongoClient
+from mongomock.collection import Collection as MockCollection
+from pymongo.collection import Collection
+
+from components.database import get_videos_collection
+from components.subscriptions.main import Subscription
+from components.subscriptions.typing import SubsDict
+from components.videos import RETRY_KEYS, VIDEO_KEYS, VideoDict, VideoTuple
+from data_analyser.pipeline import AnalyserPipeline, TokenBucket
+from data_analyser.utils import Duration
+from .utils.fake_videos import fake_video
+from .utils.get_random_vid_info import get_random_vid_duration
+from .utils.stub_server import StubServer
+
+class TestTokenBucket(TestCase):
+    def test_rate(self) -> None:
+        now = [0.0]
+        waits: List[float] = []
+        def sleep(seconds: float) -> None:
+            waits.append(seconds)
+            now[0] += seconds
+        bucket = TokenBucket(rate=2, capacity=3, clock=lambda: now[0], sleep=sleep)
+        for _ in range(3): # The burst.
+            bucket.acquire()
+        self.assertListEqual(waits, [])
+        for _ in range(4):
+            bucket.acquire()
+        self.assertListEqual(waits, [0.5] * 4)
+        now[0] += 10 # Only capacity tokens are saved up.
+        for _ in range(4):
+            bucket.acquire()
+        self.assertListEqual(waits, [0.5] * 5)
+
+    def test_unlimited(self) -> None:
+        bucket = TokenBucket(rate=0, sleep=lambda seconds: self.fail("Slept"))
+        for _ in range(100):
+            bucket.acquire()
+
+class TestAnalyserPipeline(TestCase):
+    def setUp(self) -> None:
+        self.client: MongoClient[Any] = MongoClient(tz_aware=True)
+        self.collection: Collection[SubsDict] = self.client.db.collection
+        self.videos: Collection[VideoDict] = get_videos_collection(self.collection)
+        for i in range(3):
+            sub = Subscription(
+                _id="yt:channel:pipeline%d" % i,
+                link="tests/data/feed@ytnnews24@001.xml",
+                title="Pipeline %d" % i,
+                time_between_fetches=1,
+            )
+            sub._collection = self.collection
+            sub.insert()
+            self.videos.insert_many([
+                fake_video(j, analysed=j % 4 == 0).to_document(sub._id)
+                for j in range(i * 100, i * 100 + 120)
+            ])
+        self.server = StubServer(latency=0.05).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        patch("components.extractor.obtain_vid_info.VIDEOS_API_URL",
+              self.server.url("youtube/v3/videos")).start()
+        self.addCleanup(patch.stopall)
+
+    def assertAllAnalysed(self) -> None:
+        for vid in map(VideoTuple.from_document, self.videos.find()):
+            self.assertTrue(vid.analysed)
+            if vid.id.startswith("yt:video:fake"):
+                expected = int(vid.id[len("yt:video:fake"):])
+                if expected % 4: # Analysed by the pipeline.
+                    expected = get_random_vid_duration(vid.link)
+                self.assertEqual(vid.duration, expected)
+
+    def test_run(self) -> None:
+        pipeline = AnalyserPipeline(self.collection, "key", workers=3, rate=0)
+        self.assertEqual(pipeline.run(), 3)
+        self.assertAllAnalysed()
+        stats = pipeline.stats()
+        self.assertEqual(stats["read"], 270)
+        self.assertEqual(stats["written"], 270)
+        self.assertEqual(stats["requests"], 6)
+        self.assertEqual(self.server.requests, 6)
+        self.assertLessEqual(self.server.max_active, 3)
+        self.assertGreater(self.server.max_active, 1)
+        self.assertEqual(stats["pending_queue"], 0)
+        self.assertEqual(stats["results_queue"], 0)
+        self.assertGreater(stats["videos_per_second"], 0)
+        # Nothing is left to do.
+        self.assertEqual(pipeline.run(), 0)
+        self.assertEqual(self.server.requests, 6)
+
+    def test_versions(self) -> None:
+        AnalyserPipeline(self.collection, "key", rate=0).run()
+        for sub_dict in self.collection.find():
+            self.assertGreater(sub_dict["version"], 0)
+
+    def test_rate_limit(self) -> None:
+        pipeline = AnalyserPipeline(self.collection, "key", workers=6, rate=20, chunk_size=27)
+        pipeline.run()
+        self.assertAllAnalysed()
+        # 10 requests, of which all but the first wait for a token.
+        self.assertEqual(self.server.requests, 10)
+        self.assertGreaterEqual(pipeline.stats()["elapsed"], 9 / 20)
+
+    def test_resolve_errors(self) -> None:
+        calls = []
+        def resolve(vids: Any, api_key: str) -> List[int]:
+            calls.append(len(vids))
+            if len(calls) == 2:
+                raise Exception("Network error")
+            return [1] * len(vids)
+        pipeline = AnalyserPipeline(self.collection, workers=1, rate=0, resolve=resolve)
+        pipeline.run()
+        # The failed chunk is retried by the next run.
+        self.assertEqual(self.videos.count_documents({VIDEO_KEYS["analysed"]: False}), 50)
+        pipeline.run()
+        self.assertEqual(self.videos.count_documents({VIDEO_KEYS["analysed"]: False}), 0)
+
+    def test_write_delay(self) -> None:
+        release = Event()
+        calls: List[int] = []
+        def resolve(vids: Any, api_key: str) -> List[int]:
+            calls.append(len(vids))
+            if len(calls) > 1:
+                # Stuck until the first chunk is seen in the database.
+                release.wait(5)
+            return [12345] * len(vids)
+        pipeline = AnalyserPipeline(self.collection, workers=1, rate=0, chunk_size=50,
+                                    write_delay=0.05, resolve=resolve)
+        thread = Thread(target=pipeline.run)
+        thread.start()
+        for _ in range(100):
+            if pipeline.stats()["written"]:
+                break
+            sleep(0.01)
+        # Counted once written, rather than once queued.
+        self.assertEqual(pipeline.stats()["written"], 50)
+        self.assertEqual(self.videos.count_documents({VIDEO_KEYS["duration"]: 12345}), 50)
+        release.set()
+        thread.join()
+        self.assertEqual(pipeline.stats()["written"], 270)
+        self.assertGreater(pipeline.stats()["writes"], 1)
+
+    def test_failed_videos(self) -> None:
+        # The first video of every chunk fails.
+        def resolve(vids: Any, api_key: str) -> List[Duration]:
+            return [ConnectionError() if i == 0 else 1 for i, _ in enumerate(vids)]
+        pipeline = AnalyserPipeline(self.collection, rate=0, chunk_size=10, resolve=resolve)
+        pipeline.run()
+        self.assertEqual(pipeline.stats()["failed"], 27)
+        # Retried later, not by the next run.
+        self.assertEqual(self.videos.count_documents({VIDEO_KEYS["analysed"]: False}), 27)
+        self.assertEqual(self.videos.count_documents({RETRY_KEYS["attempts"]: 1}), 27)
+        self.assertEqual(pipeline.run(), 0)
+        self.assertEqual(pipeline.stats()["read"], 0)
+
+    def test_write_errors(self) -> None:
+        pipeline = AnalyserPipeline(self.collection, "key", workers=2, rate=0, queue_size=1)
+        with patch("data_analyser.pipeline.write_durations", side_effect=Exception("Down")):
+            with self.assertRaises(Exception):
+                pipeline.run()
+        self.assertEqual(self.videos.count_documents({VIDEO_KEYS["analysed"]: False}), 270)
+
+    def test_final_write_error(self) -> None:
+        pipeline = AnalyserPipeline(self.collection, "key", workers=2, rate=0, write_batch_size=1000)
+        # Everything is queued until every worker is done, and only then written.
+        with patch.object(MockCollection, "bulk_write", side_effect=Exception("Down")):
+            with self.assertRaises(Exception):
+                pipeline.run()
+        self.assertEqual(self.videos.count_documents({VIDEO_KEYS["analysed"]: False}), 270)
+
+    def tearDown(self) -> None:
+        self.client.close()
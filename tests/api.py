@@ -0,0 +1,362 @@
+from datetime import datetime, timedelta, UTC
+import json
+from io import BytesIO
+from time import sleep
+import tracemalloc
+from typing import Any, Dict, List, Tuple
+from unittest import TestCase
+from unittest.mock import patch
+
+from mongomock import MongoClient
+from pymongo.collection import Collection
+from requests import ConnectionError
+
+from api import app, cache, resolutions
+from api.utils import FEED_PAGE_SIZE, SUB_INFO_PROJECTION
+from components.database import get_imports_collection, get_resolutions_collection, get_videos_collection
+from components.subscriptions.main import Subscription
+from components.subscriptions.typing import SubsDict
+from components.videos import VIDEO_KEYS, VideoDict, VideoTuple, video_projection
+from .utils.fake_videos import fake_video
+
+SUB_ID = "yt:channel:fake"
+OTHER_ID = "yt:playlist:fake"
+
+class TestApi(TestCase):
+    def setUp(self) -> None:
+        self.client: MongoClient[Any] = MongoClient(tz_aware=True)
+        self.collection: Collection[SubsDict] = self.client.db.collection
+        self.videos: Collection[VideoDict] = get_videos_collection(self.collection)
+        patch('api.subscriptions', self.collection).start()
+        patch('api.videos', self.videos).start()
+        patch('api.imports', get_imports_collection(self.collection)).start()
+        patch.object(resolutions, 'collection', get_resolutions_collection(self.collection)).start()
+        self.addCleanup(patch.stopall)
+
+        sub = Subscription(_id=SUB_ID, link="", title="Fake", time_between_fetches=1)
+        sub._collection = self.collection
+        sub.insert()
+        self.insert_videos(range(25))
+        self.collection.update_one({"_id": SUB_ID}, {"$set": {"video_count": 25}})
+
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        # Responses cached by other tests come from other databases.
+        cache.clear()
+
+    def insert_videos(self, indices: range, sub_id: str = SUB_ID) -> None:
+        self.videos.insert_many([fake_video(i).to_document(sub_id) for i in indices])
+
+    def add_other_sub(self) -> None:
+        """
+        A second subscription whose videos interleave with the first, and
+        which shares some of them (as a playlist would).
+        """
+        sub = Subscription(_id=OTHER_ID, link="", title="Other", time_between_fetches=1,
+                           last_viewed=fake_video(30).published)
+        sub._collection = self.collection
+        sub.insert()
+        self.insert_videos(range(20, 40), OTHER_ID)
+
+    def get_json(self, path: str) -> Any:
+        response = self.app.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.json
+
+    def get_page(self, **params: Any) -> Any:
+        response = self.app.get("/vid-from-link/%s" % SUB_ID, query_string=params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_subs_info_counts(self) -> None:
+        self.collection.update_one({"_id": SUB_ID}, {"$set": {"last_viewed": fake_video(19).published}})
+        # Never viewed, so all of its videos are new.
+        self.add_other_sub()
+        self.collection.update_one({"_id": OTHER_ID}, {"$set": {
+            "video_count": 20,
+            "last_viewed": datetime.min.replace(tzinfo=UTC),
+        }})
+        with patch.object(self.videos, 'count_documents', wraps=self.videos.count_documents) as count, \
+             patch.object(self.videos, 'aggregate', wraps=self.videos.aggregate) as aggregate:
+            sub_infos = self.get_json("/subs-info")
+        # The totals come from the counters, and the new videos of every
+        # subscription are counted by one query.
+        count.assert_not_called()
+        aggregate.assert_called_once()
+        self.assertEqual([(sub_info["videos"], sub_info["new_vids"]) for sub_info in sub_infos],
+                         [(25, 5), (20, 20)])
+        sub_info = self.get_json("/sub-info/%s" % SUB_ID)
+        self.assertEqual((sub_info["videos"], sub_info["new_vids"]), (25, 5))
+        # Not counted yet by the migration.
+        self.collection.update_one({"_id": OTHER_ID}, {"$unset": {"video_count": ""}})
+        cache.clear()
+        sub_info = self.get_json("/sub-info/%s" % OTHER_ID)
+        self.assertEqual((sub_info["videos"], sub_info["new_vids"]), (20, 20))
+
+    def test_default_returns_everything(self) -> None:
+        vids: List[Dict[str, Any]] = self.get_page().json
+        self.assertEqual(len(vids), 25)
+        self.assertEqual(vids[0]["id"], "yt:video:fake24")
+        self.assertEqual(set(vids[0]), set(VideoTuple._fields))
+
+    def test_stable_paging_under_inserts(self) -> None:
+        seen: List[str] = []
+        response = self.get_page(limit=10)
+        new = 100
+        while True:
+            seen.extend(vid["id"] for vid in response.json)
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+            # Newer videos arriving between pages must not shift the pages.
+            self.insert_videos(range(new, new + 3))
+            new += 3
+            response = self.get_page(limit=10, cursor=cursor)
+        self.assertEqual(seen, ["yt:video:fake%d" % i for i in reversed(range(25))])
+
+    def test_cursor_exposed_to_browsers(self) -> None:
+        response = self.app.get("/vid-from-link/%s" % SUB_ID, query_string={"limit": 10},
+                                headers={"Origin": "http://example.com"})
+        self.assertIn("X-Next-Cursor", response.headers)
+        exposed = response.headers["Access-Control-Expose-Headers"].split(",")
+        self.assertIn("X-Next-Cursor", [header.strip() for header in exposed])
+
+    def test_fields_and_since(self) -> None:
+        since = fake_video(19).published
+        vids = self.get_page(fields="id,title", since=since.isoformat()).json
+        self.assertEqual(vids, [
+            {"id": "yt:video:fake%d" % i, "title": "Video %d" % i} for i in range(24, 19, -1)
+        ])
+        naive = (since - timedelta(hours=1)).replace(tzinfo=None)
+        self.assertEqual(len(self.get_page(since=naive.isoformat()).json), 6)
+
+    def test_invalid_parameters(self) -> None:
+        for params in ({"limit": "x"}, {"limit": -1}, {"cursor": "%%"}, {"fields": "id,nope"}):
+            response = self.app.get("/vid-from-link/%s" % SUB_ID, query_string=params)
+            self.assertEqual(response.status_code, 400)
+        response = self.app.get("/vid-from-link/yt:channel:missing")
+        self.assertEqual(response.status_code, 404)
+
+    def test_feed_merges_subscriptions(self) -> None:
+        self.add_other_sub()
+        expected = sorted(
+            [(fake_video(i).published, "yt:video:fake%d" % i, SUB_ID) for i in range(25)] +
+            [(fake_video(i).published, "yt:video:fake%d" % i, OTHER_ID) for i in range(20, 40)],
+            reverse=True,
+        )
+        seen: List[Tuple[str, str]] = []
+        response = self.app.get("/feed", query_string={"limit": 7, "fields": "id,title"})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            vids: Any = response.json
+            seen.extend((vid["id"], vid["sub_id"]) for vid in vids)
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+            self.insert_videos(range(len(seen) + 100, len(seen) + 102), OTHER_ID)
+            response = self.app.get("/feed", query_string={"limit": 7, "fields": "id,title", "cursor": cursor})
+        self.assertEqual(seen, [(vid_id, sub_id) for _, vid_id, sub_id in expected])
+        self.assertEqual(set(vids[0]), {"id", "title", "sub_id"})
+
+    def test_feed_subsets(self) -> None:
+        self.add_other_sub()
+        vids = self.get_json("/feed?subs=%s&limit=100" % SUB_ID)
+        self.assertEqual([vid["id"] for vid in vids], ["yt:video:fake%d" % i for i in range(24, -1, -1)])
+        self.insert_videos(range(40, 50), OTHER_ID)
+        response = self.app.get("/feed")
+        self.assertEqual(len(response.json or []), FEED_PAGE_SIZE)
+        self.assertIn("X-Next-Cursor", response.headers)
+        # Only the first subscription's own last_viewed is in the past.
+        self.collection.update_one({"_id": SUB_ID}, {"$set": {"last_viewed": fake_video(22).published}})
+        vids = self.get_json("/feed?only_new=1")
+        self.assertEqual([(vid["id"], vid["sub_id"]) for vid in vids], [
+            *(("yt:video:fake%d" % i, OTHER_ID) for i in range(49, 30, -1)),
+            ("yt:video:fake24", SUB_ID), ("yt:video:fake23", SUB_ID),
+        ])
+        response = self.app.get("/feed?subs=%s,yt:channel:missing" % SUB_ID)
+        self.assertEqual(response.status_code, 404)
+        response = self.app.get("/feed", query_string={"cursor": self.get_page(limit=1).headers["X-Next-Cursor"]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_conditional_requests(self) -> None:
+        for path in ("/vid-from-link/%s" % SUB_ID, "/vid-from-link/%s?limit=5" % SUB_ID,
+                     "/feed", "/sub-info/%s" % SUB_ID, "/subs-info"):
+            response = self.app.get(path)
+            etag = response.headers["ETag"]
+            self.assertEqual(response.headers["Cache-Control"], "no-cache")
+            # An unchanged subscription is answered without reading videos.
+            with patch.object(self.videos, 'find') as find, \
+                 patch.object(self.videos, 'count_documents') as count:
+                response = self.app.get(path, headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, 304, path)
+            self.assertEqual(response.data, b"")
+            find.assert_not_called()
+            count.assert_not_called()
+            # Any write to the subscription changes the ETag.
+            self.app.patch("/set-viewed/%s" % SUB_ID)
+            response = self.app.get(path, headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, 200, path)
+            self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertNotEqual(
+            self.app.get("/vid-from-link/%s" % SUB_ID).headers["ETag"],
+            self.app.get("/vid-from-link/%s?limit=5" % SUB_ID).headers["ETag"],
+        )
+
+    def test_cached_responses(self) -> None:
+        path = "/vid-from-link/%s?limit=5" % SUB_ID
+        vids = self.get_json(path)
+        hits = self.get_json("/cache-stats")["hits"]
+        with patch.object(self.collection, 'find_one') as find_one, \
+             patch.object(self.videos, 'find') as find:
+            self.assertEqual(self.get_json(path), vids)
+        find_one.assert_not_called()
+        find.assert_not_called()
+        self.assertEqual(self.get_json("/cache-stats")["hits"], hits + 1)
+        # Writes through the API drop the responses built from the subscription.
+        self.app.patch("/set-viewed/%s" % SUB_ID)
+        with patch.object(self.collection, 'find_one', wraps=self.collection.find_one) as find_one:
+            self.assertEqual(self.get_json(path), vids)
+        find_one.assert_called_once()
+        # Responses built from every subscription are dropped by any write.
+        vids = self.get_json("/feed")
+        with patch.object(self.videos, 'find') as find:
+            self.assertEqual(self.get_json("/feed"), vids)
+        find.assert_not_called()
+        self.add_other_sub()
+        cache.invalidate(OTHER_ID)
+        self.assertEqual(len(self.get_json("/feed")), 25 + 20)
+
+    def test_ndjson(self) -> None:
+        response = self.app.get("/vid-from-link/%s?format=ndjson&fields=id" % SUB_ID)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines],
+                         ["yt:video:fake%d" % i for i in range(24, -1, -1)])
+        response = self.app.get("/subs-info?format=ndjson")
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual(json.loads(response.get_data(as_text=True))["_id"], SUB_ID)
+        # Validated apart from the JSON array.
+        self.assertNotEqual(response.headers["ETag"], self.app.get("/subs-info").headers["ETag"])
+
+    def test_streaming_memory(self) -> None:
+        self.videos.insert_many([
+            fake_video(i)._replace(summary="x" * 1000).to_document(SUB_ID) for i in range(25, 10_000)
+        ])
+        # What mongomock itself needs to iterate over the videos.
+        tracemalloc.start()
+        for _ in self.videos.find(
+            {VIDEO_KEYS["sub_id"]: SUB_ID}, video_projection(VideoTuple._fields)
+        ).sort([(VIDEO_KEYS["published"], -1), (VIDEO_KEYS["id"], -1)]):
+            pass
+        baseline = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        response = self.app.get("/vid-from-link/%s" % SUB_ID)
+        size = sum(len(chunk) for chunk in response.iter_encoded())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        # The response is far bigger than what is held while sending it.
+        self.assertGreater(size, 10_000_000)
+        self.assertLess(peak, baseline + 2_000_000)
+
+    def test_subs_info_streaming_memory(self) -> None:
+        self.collection.insert_many([
+            Subscription(_id="yt:channel:fake%d" % i, link="", title="x" * 2000,
+                         time_between_fetches=1).asdict()
+            for i in range(5_000)
+        ])
+        tracemalloc.start()
+        for _ in self.collection.find({}, SUB_INFO_PROJECTION).sort("_id"):
+            pass
+        baseline = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        response = self.app.get("/subs-info")
+        size = sum(len(chunk) for chunk in response.iter_encoded())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.assertGreater(size, 10_000_000)
+        self.assertLess(peak, baseline + 2_000_000)
+        self.assertTrue(response.headers["ETag"].startswith("W/"))
+
+    def wait_for_import(self, response: Any) -> Any:
+        self.assertEqual(response.status_code, 202)
+        for _ in range(100):
+            job = self.get_json(response.headers["Location"])
+            if job["status"] != "running":
+                return job
+            sleep(0.01)
+        self.fail("The import did not finish")
+
+    def test_import_subs(self) -> None:
+        infos = {
+            "https://www.youtube.com/@fake": {"id": SUB_ID, "link": "", "title": "Fake"},
+            "https://www.youtube.com/@other": {"id": OTHER_ID, "link": "", "title": "Other"},
+        }
+        def get_sub_info(url: str) -> Dict[str, Any]:
+            if url == "https://www.youtube.com/@offline":
+                raise ConnectionError("Connection refused")
+            return infos[url]
+        patch('components.extractor.resolution_cache.get_sub_info_from_yt_url', get_sub_info).start()
+        self.assertEqual(len(self.get_json("/subs-info")), 1)
+        response = self.app.post("/import-subs/", data={
+            "time_between_fetches": 600,
+            "file": (BytesIO("\n".join([
+                *infos, "https://www.youtube.com/@none", "https://www.youtube.com/@offline",
+            ]).encode()), "urls.txt"),
+        })
+        job = self.wait_for_import(response)
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["total"], 4)
+        self.assertEqual([result["status"] for result in job["results"]], ["exists", "added", "invalid", "retry"])
+        self.assertEqual(len(self.get_json("/subs-info")), 2)
+        response = self.app.post("/import-subs/", data={"urls": "https://www.youtube.com/@other"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.app.get("/import-subs/none").status_code, 404)
+
+    def test_set_time_between_fetches(self) -> None:
+        path = "/set-time-between-fetches/%s" % SUB_ID
+        response = self.app.patch(path, data={"time_between_fetches": 600})
+        self.assertEqual(response.status_code, 200)
+        response = self.app.patch(path, data={
+            "time_between_fetches": 600,
+            "min_time_between_fetches": 300,
+            "max_time_between_fetches": 86400,
+        })
+        self.assertEqual(response.status_code, 200)
+        sub_dict = self.collection.find_one({"_id": SUB_ID})
+        assert sub_dict # To appease mypy.
+        self.assertEqual(sub_dict["time_between_fetches"], 600)
+        self.assertEqual(sub_dict["min_time_between_fetches"], 300)
+        self.assertEqual(sub_dict["max_time_between_fetches"], 86400)
+        # Turning the adaptive mode on starts the history from the stored
+        # videos, as the feed may not change until the next upload.
+        self.assertEqual(sub_dict["upload_history"], [fake_video(i).published for i in range(10, 25)])
+        # The history is not sent to clients.
+        self.assertNotIn("upload_history", self.get_json("/sub-info/%s" % SUB_ID))
+        self.assertNotIn("upload_history", self.get_json("/subs-info")[0])
+        for bounds in [(0, 86400), (3600, 300), (-1, 300)]:
+            response = self.app.patch(path, data={
+                "time_between_fetches": 600,
+                "min_time_between_fetches": bounds[0],
+                "max_time_between_fetches": bounds[1],
+            })
+            self.assertEqual(response.status_code, 400)
+        for interval in (0, -600):
+            response = self.app.patch(path, data={"time_between_fetches": interval})
+            self.assertEqual(response.status_code, 400)
+            response = self.app.post("/add-sub/", data={"url": "https://www.youtube.com/@fake",
+                                                        "time_between_fetches": interval})
+            self.assertEqual(response.status_code, 400)
+            response = self.app.post("/import-subs/", data={"urls": "https://www.youtube.com/@fake",
+                                                            "time_between_fetches": interval})
+            self.assertEqual(response.status_code, 400)
+        response = self.app.patch("/set-time-between-fetches/none", data={"time_between_fetches": 600})
+        self.assertEqual(response.status_code, 404)
+
+    def test_leases_are_hidden(self) -> None:
+        self.collection.update_one({"_id": SUB_ID}, {"$set": {
+            "lease_owner": "host:1:abcdef12",
+            "lease_expires": datetime.now(tz=UTC),
+        }})
+        for sub_info in [self.get_json("/sub-info/%s" % SUB_ID), self.get_json("/subs-info")[0]]:
+            self.assertNotIn("lease_owner", sub_info)
+            self.assertNotIn("lease_expires", sub_info)
@@ -0,0 +1,142 @@
+from datetime import timedelta
+from typing import Any, Dict, List, Mapping
+from unittest import TestCase
+from unittest.mock import patch
+
+from mongomock import MongoClient
+from mongomock.collection import Collection as MockCollection
+from pymongo.collection import Collection
+
+from components.database import BatchWriter, SubscriptionsWriter, get_videos_collection, merge_updates
+from components.subscriptions.main import Subscription
+from components.subscriptions.typing import SubsDict
+from components.videos import VIDEO_KEYS
+from .utils.fake_videos import fake_video
+
+class TestBatchWriter(TestCase):
+    def setUp(self) -> None:
+        self.client: MongoClient[Any] = MongoClient(tz_aware=True)
+        self.collection: Collection[Dict[str, Any]] = self.client.db.collection
+        self.collection.insert_many([{"_id": i, "n": 0} for i in range(10)])
+        self.bulk_write = patch.object(MockCollection, "bulk_write", autospec=True,
+                                       side_effect=MockCollection.bulk_write).start()
+        self.addCleanup(patch.stopall)
+
+    def test_merge_updates(self) -> None:
+        self.assertDictEqual(
+            merge_updates({"$set": {"a": 1, "b": 1}, "$inc": {"n": 1}},
+                          {"$set": {"a": 2}, "$unset": {"b": ""}, "$inc": {"n": 2, "m": 1}}) or {},
+            {"$set": {"a": 2}, "$unset": {"b": ""}, "$inc": {"n": 3, "m": 1}},
+        )
+        self.assertDictEqual(merge_updates({"$unset": {"a": ""}}, {"$set": {"a": 1}}) or {},
+                             {"$set": {"a": 1}})
+        self.assertIsNone(merge_updates({"$set": {"a": 1}}, {"$inc": {"a": 1}}))
+        self.assertIsNone(merge_updates({"$set": {"a": 1}}, {"$push": {"b": 1}}))
+
+    def test_size_threshold(self) -> None:
+        writer = BatchWriter(self.collection, max_ops=4)
+        for i in range(10):
+            writer.update({"_id": i}, {"$inc": {"n": 1}})
+        self.assertEqual(self.bulk_write.call_count, 2)
+        self.assertEqual(self.collection.count_documents({"n": 1}), 8)
+        writer.flush()
+        self.assertEqual(self.bulk_write.call_count, 3)
+        self.assertEqual(self.collection.count_documents({"n": 1}), 10)
+        writer.flush() # Nothing left.
+        self.assertEqual(self.bulk_write.call_count, 3)
+        self.assertDictEqual(writer.stats(), {"queued": 10, "written": 10, "flushes": 3, "errors": 0, "pending": 0})
+
+    def test_time_threshold(self) -> None:
+        now = [0.0]
+        writer = BatchWriter(self.collection, max_delay=5, clock=lambda: now[0])
+        writer.update({"_id": 0}, {"$inc": {"n": 1}})
+        now[0] = 4
+        writer.update({"_id": 1}, {"$inc": {"n": 1}})
+        self.bulk_write.assert_not_called()
+        self.assertEqual(writer.seconds_until_due(), 1)
+        now[0] = 5
+        writer.update({"_id": 2}, {"$inc": {"n": 1}})
+        self.assertEqual(self.bulk_write.call_count, 1)
+        self.assertEqual(self.collection.count_documents({"n": 1}), 3)
+        self.assertIsNone(writer.seconds_until_due())
+        writer.update({"_id": 3}, {"$inc": {"n": 1}})
+        now[0] = 20
+        self.assertEqual(writer.seconds_until_due(), 0)
+
+    def test_coalescing(self) -> None:
+        with BatchWriter(self.collection) as writer:
+            for _ in range(3):
+                writer.update({"_id": 0}, {"$inc": {"n": 1}, "$set": {"s": "x"}})
+            # Cannot be merged, so the queued update is written first.
+            writer.update({"_id": 0}, {"$set": {"n": 10}})
+            self.assertEqual(self.bulk_write.call_count, 1)
+        self.assertEqual(self.bulk_write.call_count, 2)
+        self.assertDictEqual(self.collection.find_one({"_id": 0}) or {}, {"_id": 0, "n": 10, "s": "x"})
+        self.assertEqual(writer.stats()["written"], 2)
+
+    def test_errors(self) -> None:
+        self.collection.create_index("k", unique=True, sparse=True)
+        self.collection.update_one({"_id": 0}, {"$set": {"k": 0}})
+        errors: List[Mapping[str, Any]] = []
+        with BatchWriter(self.collection, on_error=lambda filter, error: errors.append(filter)) as writer:
+            for i in range(1, 4):
+                writer.update({"_id": i}, {"$set": {"k": 0 if i == 2 else i}})
+        # Only the duplicate failed.
+        self.assertListEqual(errors, [{"_id": 2}])
+        self.assertEqual(writer.stats()["errors"], 1)
+        self.assertEqual(writer.stats()["written"], 2)
+        self.assertEqual(self.collection.count_documents({"k": {"$exists": True}}), 3)
+
+    def tearDown(self) -> None:
+        self.client.close()
+
+class TestSubscriptionsWriter(TestCase):
+    def setUp(self) -> None:
+        self.client: MongoClient[Any] = MongoClient(tz_aware=True)
+        self.collection: Collection[SubsDict] = self.client.db.collection
+        self.sub = Subscription(
+            _id="yt:channel:hlgI3UHCOnwUGzWzbJ3H5w",
+            link="tests/data/feed@ytnnews24@001.xml",
+            title="YTN",
+            time_between_fetches=1,
+        )
+        self.sub._collection = self.collection
+        self.sub.insert()
+
+    def test_fetch(self) -> None:
+        with SubscriptionsWriter(self.collection) as writer:
+            self.sub._writer = writer
+            self.sub.fetch()
+            # Nothing is written yet.
+            self.assertEqual(get_videos_collection(self.collection).count_documents({}), 0)
+        sub_dict = self.collection.find_one({"_id": self.sub._id})
+        assert sub_dict # To appease mypy.
+        self.assertEqual(sub_dict["video_count"], 15)
+        self.assertAlmostEqual(sub_dict["last_fetch"], self.sub.last_fetch, delta=timedelta(milliseconds=1))
+        self.assertGreater(sub_dict["version"], 0)
+        self.assertEqual(get_videos_collection(self.collection).count_documents({}), 15)
+        # One write for each collection, the fetch's updates and the
+        # video_count increments being merged.
+        self.assertDictEqual(writer.stats()["subscriptions"],
+                             {"queued": 17, "written": 1, "flushes": 1, "errors": 0, "pending": 0})
+        self.assertEqual(writer.stats()["videos"]["flushes"], 1)
+
+    def test_videos_first(self) -> None:
+        order: List[str] = []
+        original: Any = MockCollection.bulk_write
+        def bulk_write(collection: Any, *args: Any, **kwargs: Any) -> Any:
+            order.append(collection.name)
+            return original(collection, *args, **kwargs)
+        with patch.object(MockCollection, "bulk_write", autospec=True, side_effect=bulk_write):
+            writer = SubscriptionsWriter(self.collection, max_ops=2)
+            writer.subs.update({"_id": self.sub._id}, {"$inc": {"version": 1}})
+            writer.videos.update({VIDEO_KEYS["sub_id"]: self.sub._id, VIDEO_KEYS["id"]: "yt:video:fake0"},
+                                 {"$set": fake_video(0).to_document(self.sub._id)}, upsert=True)
+            writer.subs.update({"_id": "yt:channel:other"}, {"$inc": {"version": 1}})
+        self.assertListEqual(order, ["videos", "collection"])
+        sub_dict = self.collection.find_one({"_id": self.sub._id})
+        assert sub_dict # To appease mypy.
+        self.assertEqual(sub_dict["video_count"], 1)
+
+    def tearDown(self) -> None:
+        self.client.close()
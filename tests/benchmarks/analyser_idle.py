@@ -0,0 +1,75 @@
+"""
+Time an analyser cycle over fully analysed subscriptions, where there is
+nothing to do. Run with:
+
+    python -m tests.benchmarks.analyser_idle [--subs N] [--videos N] [--compare]
+
+--compare also times the old full scan, which is quadratic under mongomock;
+set BENCH_MONGO_URI to use a real mongod (its "bench" database is dropped).
+"""
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import Callable, List, Tuple
+
+from pymongo.collection import Collection
+
+from components.database import ensure_indexes, get_videos_collection
+from components.subscriptions.main import Subscription
+from components.subscriptions.typing import SubsDict
+from components.videos import VideoDict
+from data_analyser.utils import analyse_collection
+from ..utils.bench_db import bench_client
+from ..utils.fake_videos import fake_video
+
+REPEATS = 5
+
+def full_scan(subs_collection: Collection[SubsDict]) -> int:
+    """
+    The analyser's old approach: load every subscription with all of its
+    videos and look for unanalysed ones in Python.
+    """
+    pending = 0
+    for sub_dict in subs_collection.find():
+        sub = Subscription(**sub_dict)
+        sub._collection = subs_collection
+        sub.load_videos()
+        pending += sum(not vid.analysed for vid in sub.videos)
+    return pending
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("--subs", type=int, default=10_000)
+    parser.add_argument("--videos", type=int, default=15)
+    parser.add_argument("--compare", action="store_true")
+    args = parser.parse_args()
+    client = bench_client()
+    client.drop_database("bench")
+    collection: Collection[SubsDict] = client.bench.subscriptions
+    videos: Collection[VideoDict] = get_videos_collection(collection)
+    for i in range(args.subs):
+        sub = Subscription(
+            _id="yt:channel:bench%d" % i,
+            link="tests/data/feed@ytnnews24@001.xml",
+            title="Benchmark %d" % i,
+            time_between_fetches=3600,
+        )
+        sub._collection = collection
+        sub.insert()
+        videos.insert_many([fake_video(j, analysed=True).to_document(sub._id) for j in range(args.videos)])
+    ensure_indexes(collection)
+    print("%d fully analysed subscriptions, %d videos each" % (args.subs, args.videos))
+    cycles: List[Tuple[str, Callable[[], int]]] = [
+        ("pending query", lambda: analyse_collection(collection)),
+    ]
+    if args.compare:
+        cycles.insert(0, ("full scan", lambda: full_scan(collection)))
+    for name, cycle in cycles:
+        start = perf_counter()
+        for _ in range(REPEATS):
+            cycle()
+        print("%14s %10.1f ms per cycle" % (name, (perf_counter() - start) / REPEATS * 1000))
+    client.drop_database("bench")
+    client.close()
+
+if __name__ == "__main__":
+    main()
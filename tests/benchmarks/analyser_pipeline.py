@@ -0,0 +1,64 @@
+"""
+Time draining a backlog of pending videos with analyse_collection() and
+with the pipeline, against a local stub of the YouTube Data API with an
+artificial latency. Run with:
+
+    python -m tests.benchmarks.analyser_pipeline [--videos N] [--latency S] [--workers N...]
+
+Writes under mongomock get slower with the size of the collection, so large
+backlogs are better timed against a real mongod with BENCH_MONGO_URI (its
+"bench" database is dropped).
+"""
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import Any
+from unittest.mock import patch
+
+from pymongo.collection import Collection
+
+from components.database import ensure_indexes, get_videos_collection
+from components.subscriptions.typing import SubsDict
+from components.videos import VideoDict
+from data_analyser.pipeline import AnalyserPipeline
+from data_analyser.utils import analyse_collection
+from ..utils.bench_db import bench_client
+from ..utils.fake_videos import fake_video
+from ..utils.stub_server import StubServer
+
+def fill(client: Any, count: int) -> Collection[SubsDict]:
+    client.drop_database("bench")
+    collection: Collection[SubsDict] = client.bench.subscriptions
+    videos: Collection[VideoDict] = get_videos_collection(collection)
+    collection.insert_many([{"_id": "yt:channel:bench%d" % i, "version": 0} for i in range(10)]) # type: ignore
+    videos.insert_many([fake_video(i).to_document("yt:channel:bench%d" % (i % 10)) for i in range(count)])
+    ensure_indexes(collection)
+    return collection
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("--videos", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 4, 8])
+    args = parser.parse_args()
+    client = bench_client()
+    print("%d pending videos, %.0f ms per API request" % (args.videos, args.latency * 1000))
+    print("%-24s %10s %14s" % ("", "seconds", "videos/second"))
+    with StubServer(latency=args.latency) as server, \
+         patch("components.extractor.obtain_vid_info.VIDEOS_API_URL", server.url("youtube/v3/videos")):
+        collection = fill(client, args.videos)
+        start = perf_counter()
+        analyse_collection(collection, "key")
+        elapsed = perf_counter() - start
+        print("%-24s %10.2f %14.0f" % ("analyse_collection", elapsed, args.videos / elapsed))
+        for workers in args.workers:
+            collection = fill(client, args.videos)
+            pipeline = AnalyserPipeline(collection, "key", workers=workers, rate=0)
+            pipeline.run()
+            stats = pipeline.stats()
+            print("%-24s %10.2f %14.0f" % ("pipeline, %d workers" % workers,
+                                          stats["elapsed"], stats["videos_per_second"]))
+    client.drop_database("bench")
+    client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Read latency of hot subscriptions with and without the API's response
+cache. Run with:
+
+    python -m tests.benchmarks.api_cache [--subs N] [--videos N] [--requests N]
+
+Set BENCH_MONGO_URI to use a real mongod (its "bench" database is dropped),
+which is where the saved round trips show.
+"""
+from argparse import ArgumentParser
+from statistics import quantiles
+from time import perf_counter
+from unittest.mock import patch
+
+from pymongo.collection import Collection
+
+from api import app, cache
+from components.database import ensure_indexes, get_videos_collection
+from components.subscriptions.main import Subscription
+from components.subscriptions.typing import SubsDict
+from components.videos import VideoDict
+from ..utils.bench_db import bench_client
+from ..utils.fake_videos import fake_video
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("--subs", type=int, default=100)
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    client = bench_client()
+    client.drop_database("bench")
+    collection: Collection[SubsDict] = client.bench.subscriptions
+    videos: Collection[VideoDict] = get_videos_collection(collection)
+    for i in range(args.subs):
+        sub = Subscription(
+            _id="yt:channel:bench%d" % i,
+            link="tests/data/feed@ytnnews24@001.xml",
+            title="Benchmark %d" % i,
+            time_between_fetches=3600,
+            video_count=args.videos,
+        )
+        sub._collection = collection
+        sub.insert()
+        videos.insert_many([fake_video(j).to_document(sub._id) for j in range(args.videos)])
+    ensure_indexes(collection)
+    print("%d subscriptions, %d videos each" % (args.subs, args.videos))
+    test_client = app.test_client()
+    maxsize = cache.maxsize
+    with patch('api.subscriptions', collection), patch('api.videos', videos):
+        for path in ("/sub-info/yt:channel:bench0", "/vid-from-link/yt:channel:bench0?limit=20"):
+            for name, size in (("no cache", 0), ("cache", maxsize)):
+                cache.clear()
+                cache.maxsize = size
+                latencies = []
+                for _ in range(args.requests):
+                    start = perf_counter()
+                    test_client.get(path)
+                    latencies.append((perf_counter() - start) * 1000)
+                percentiles = quantiles(latencies, n=100)
+                print("%-42s %8s p50 %7.3f ms p99 %7.3f ms" % (path, name, percentiles[49], percentiles[98]))
+    cache.maxsize = maxsize
+    print("Cache counters:", cache.stats())
+    client.drop_database("bench")
+    client.close()
+
+if __name__ == "__main__":
+    main()
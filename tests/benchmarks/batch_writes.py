@@ -0,0 +1,87 @@
+"""
+Count the database round trips (and time) of a collector cycle fetching
+every subscription, with writes done one by one and through a
+SubscriptionsWriter, and of an analyser cycle. Run with:
+
+    python -m tests.benchmarks.batch_writes [--subs N]
+
+Set BENCH_MONGO_URI to run against a real mongod, where round trips cost
+the most (its "bench" database is dropped).
+"""
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from datetime import datetime, UTC
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator
+from unittest.mock import patch
+
+from pymongo.collection import Collection
+
+from components.database import SubscriptionsWriter
+from components.subscriptions.main import Subscription
+from components.subscriptions.typing import SubsDict
+from data_analyser.utils import analyse_collection
+from data_collector.utils import due_subscriptions, fetch_subscriptions
+from ..utils.bench_db import bench_client
+
+WRITE_METHODS = ("bulk_write", "update_one", "update_many")
+
+@contextmanager
+def count_writes(collection: Collection[Any]) -> Iterator[Dict[str, int]]:
+    counts = {method: 0 for method in WRITE_METHODS}
+    cls = type(collection)
+    originals = {method: getattr(cls, method) for method in WRITE_METHODS}
+    def counted(method: str) -> Callable[..., Any]:
+        def call(self: Any, *args: Any, **kwargs: Any) -> Any:
+            counts[method] += 1
+            return originals[method](self, *args, **kwargs)
+        return call
+    patches: Dict[str, Any] = {method: counted(method) for method in WRITE_METHODS}
+    with patch.multiple(cls, **patches):
+        yield counts
+
+def fill(client: Any, count: int) -> Collection[SubsDict]:
+    client.drop_database("bench")
+    collection: Collection[SubsDict] = client.bench.subscriptions
+    for i in range(count):
+        sub = Subscription(
+            _id="yt:channel:bench%d" % i,
+            link="tests/data/feed@ytnnews24@001.xml",
+            title="Benchmark %d" % i,
+            time_between_fetches=3600,
+        )
+        sub._collection = collection
+        sub.insert()
+    return collection
+
+def report(name: str, cycle: Callable[[], Any], collection: Collection[Any]) -> None:
+    with count_writes(collection) as counts:
+        start = perf_counter()
+        cycle()
+        elapsed = perf_counter() - start
+    print("%-32s %8d %10.2f" % (name, sum(counts.values()), elapsed))
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("--subs", type=int, default=200)
+    args = parser.parse_args()
+    client = bench_client()
+    print("%d subscriptions of 15 new videos each" % args.subs)
+    print("%-32s %8s %10s" % ("", "writes", "seconds"))
+    for writer in (None, "batched"):
+        collection = fill(client, args.subs)
+        def collect() -> None:
+            subs = list(due_subscriptions(collection, datetime.now(tz=UTC)))
+            if writer:
+                with SubscriptionsWriter(collection) as batch_writer:
+                    fetch_subscriptions(subs, writer=batch_writer)
+            else:
+                fetch_subscriptions(subs)
+        report("collector, %s" % (writer or "one by one"), collect, collection)
+    with patch("data_analyser.utils.resolve_durations", lambda vids, api_key: [1] * len(vids)):
+        report("analyser, batched", lambda: analyse_collection(collection), collection)
+    client.drop_database("bench")
+    client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare polling the read endpoints with and without If-None-Match, in
+bytes sent and CPU time spent by the API. Run with:
+
+    python -m tests.benchmarks.etag [--subs N] [--videos N]
+
+Set BENCH_MONGO_URI to use a real mongod (its "bench" database is dropped).
+"""
+from argparse import ArgumentParser
+from time import process_time
+from unittest.mock import patch
+
+from pymongo.collection import Collection
+
+from api import app
+from components.database import ensure_indexes, get_videos_collection
+from components.subscriptions.main import Subscription
+from components.subscriptions.typing import SubsDict
+from components.videos import VideoDict
+from ..utils.bench_db import bench_client
+from ..utils.fake_videos import fake_video
+
+REPEATS = 20
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("--subs", type=int, default=100)
+    parser.add_argument("--videos", type=int, default=200)
+    args = parser.parse_args()
+    client = bench_client()
+    client.drop_database("bench")
+    collection: Collection[SubsDict] = client.bench.subscriptions
+    videos: Collection[VideoDict] = get_videos_collection(collection)
+    for i in range(args.subs):
+        sub = Subscription(
+            _id="yt:channel:bench%d" % i,
+            link="tests/data/feed@ytnnews24@001.xml",
+            title="Benchmark %d" % i,
+            time_between_fetches=3600,
+            video_count=args.videos,
+        )
+        sub._collection = collection
+        sub.insert()
+        videos.insert_many([fake_video(j).to_document(sub._id) for j in range(args.videos)])
+    ensure_indexes(collection)
+    print("%d subscriptions, %d videos each" % (args.subs, args.videos))
+    test_client = app.test_client()
+    with patch('api.subscriptions', collection), patch('api.videos', videos):
+        for path in ("/subs-info", "/vid-from-link/yt:channel:bench0"):
+            etag = test_client.get(path).headers["ETag"]
+            for name, headers in (("unconditional", {}), ("If-None-Match", {"If-None-Match": etag})):
+                sent = 0
+                start = process_time()
+                for _ in range(REPEATS):
+                    sent += len(test_client.get(path, headers=headers).data)
+                elapsed = process_time() - start
+                print("%-34s %14s %10d bytes %8.1f ms CPU per request" % (
+                    path, name, sent // REPEATS, elapsed / REPEATS * 1000))
+    client.drop_database("bench")
+    client.close()
+
+if __name__ == "__main__":
+    main()
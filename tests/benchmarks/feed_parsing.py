@@ -0,0 +1,45 @@
+"""
+Time and peak memory of turning the feed fixtures into VideoTuples, with
+feedparser and with the fast parser. Run with:
+
+    python -m tests.benchmarks.feed_parsing
+"""
+from glob import glob
+from time import perf_counter
+from tracemalloc import get_traced_memory, start, stop
+from typing import Any, Callable, List
+
+from feedparser import parse # type: ignore
+
+from components.extractor.fast_feed import parse_youtube_feed
+from components.videos import VideoTuple
+
+REPEATS = 20
+
+def with_feedparser(content: bytes) -> List[VideoTuple]:
+    return [VideoTuple.from_rss_entry(entry) for entry in parse(content).entries]
+
+def with_fast_parser(content: bytes) -> List[VideoTuple]:
+    return list(parse_youtube_feed(content)["videos"])
+
+def measure(extract: Callable[[bytes], Any], content: bytes) -> str:
+    start_time = perf_counter()
+    for _ in range(REPEATS):
+        extract(content)
+    elapsed = (perf_counter() - start_time) / REPEATS
+    start()
+    extract(content)
+    peak = get_traced_memory()[1]
+    stop()
+    return "%8.2f ms %8d kB" % (elapsed * 1000, peak // 1000)
+
+def main() -> None:
+    print("%-52s %20s %20s" % ("fixture", "feedparser", "fast parser"))
+    for path in sorted(glob("tests/data/feed@*.xml")):
+        with open(path, "rb") as file:
+            content = file.read()
+        print("%-52s %20s %20s" % (path[len("tests/data/"):], measure(with_feedparser, content),
+                                   measure(with_fast_parser, content)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Measure collector throughput against a local stub server serving the feed
+fixtures with artificial latency. Run with:
+
+    python -m tests.benchmarks.fetch_concurrency [subscriptions] [latency]
+"""
+from glob import glob
+from os.path import basename
+from sys import argv
+from time import perf_counter
+from typing import Any
+
+from mongomock import MongoClient
+from pymongo.collection import Collection
+
+from components.subscriptions.main import Subscription
+from components.subscriptions.typing import SubsDict
+from data_collector.utils import collect_data
+from ..utils.stub_server import StubServer
+
+def populate(collection: Collection[SubsDict], server: StubServer, count: int) -> None:
+    feeds = sorted(basename(path) for path in glob("tests/data/feed@*.xml"))
+    collection.delete_many({})
+    for i in range(count):
+        sub = Subscription(
+            _id="yt:channel:bench%d" % i,
+            link=server.url(feeds[i % len(feeds)]),
+            title="Benchmark %d" % i,
+            time_between_fetches=3600,
+        )
+        sub._collection = collection
+        sub.insert()
+
+def main() -> None:
+    count = int(argv[1]) if len(argv) > 1 else 64
+    latency = float(argv[2]) if len(argv) > 2 else 0.1
+    client: MongoClient[Any] = MongoClient(tz_aware=True)
+    collection: Collection[SubsDict] = client.db.collection
+    print("%d subscriptions, %.0fms latency per request" % (count, latency * 1000))
+    print("%8s %10s %12s" % ("workers", "seconds", "feeds/sec"))
+    with StubServer(latency) as server:
+        for workers in (1, 2, 4, 8, 16, 32):
+            populate(collection, server, count)
+            start = perf_counter()
+            fetched = collect_data(collection, max_workers=workers)
+            elapsed = perf_counter() - start
+            print("%8d %10.2f %12.1f" % (workers, elapsed, fetched / elapsed))
+    client.close()
+
+if __name__ == "__main__":
+    main()
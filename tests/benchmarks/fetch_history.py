@@ -0,0 +1,53 @@
+"""
+Time Subscription.fetch() for subscriptions preloaded with long video
+histories. Run with:
+
+    python -m tests.benchmarks.fetch_history [history sizes...]
+"""
+from sys import argv
+from time import perf_counter
+from typing import Any
+
+from feedparser import parse # type: ignore
+from mongomock import MongoClient
+from pymongo.collection import Collection
+
+from components.subscriptions.main import Subscription
+from components.subscriptions.typing import SubsDict
+from components.videos import VideoTuple
+from ..utils.fake_videos import fake_video
+
+FEED = "tests/data/feed@ytnnews24@002.xml"
+REPEATS = 20
+
+def main() -> None:
+    sizes = [int(arg) for arg in argv[1:]] or [10_000, 100_000, 1_000_000]
+    client: MongoClient[Any] = MongoClient(tz_aware=True)
+    collection: Collection[SubsDict] = client.db.collection
+    rss = parse(FEED)
+    feed_vids = [VideoTuple.from_rss_entry(entry) for entry in rss.entries]
+    print("%10s %14s" % ("history", "ms per fetch"))
+    for size in sizes:
+        # The feed's videos are the newest of the history, in an outdated
+        # version, so every fetch has to find and replace them.
+        history = [fake_video(i) for i in range(size)]
+        history += [vid._replace(updated=vid.published) for vid in feed_vids]
+        elapsed = 0.0
+        for _ in range(REPEATS):
+            sub = Subscription(
+                _id="yt:channel:bench",
+                link=FEED,
+                title="Benchmark",
+                time_between_fetches=3600,
+                last_video_update=max(vid.published for vid in feed_vids),
+                videos=list(history),
+            )
+            sub._collection = collection
+            start = perf_counter()
+            sub.process_feed(rss)
+            elapsed += perf_counter() - start
+        print("%10d %14.3f" % (size, elapsed / REPEATS * 1000))
+    client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Time and peak memory of finding the RSS link of the channel fixtures and
+the duration of the video fixtures, with BeautifulSoup and with the fast
+path. Run with:
+
+    python -m tests.benchmarks.html_extraction
+"""
+from glob import glob
+from time import perf_counter
+from tracemalloc import get_traced_memory, reset_peak, start, stop
+from typing import Any, Callable, Dict
+
+from bs4 import BeautifulSoup
+
+from components.extractor.fast_html import find_tag_attribute
+
+REPEATS = 5
+
+def with_soup(html: str, tag: str, attrs: Dict[str, str], attribute: str) -> Any:
+    found = BeautifulSoup(html, 'html.parser').find(tag, dict[str, Any](attrs))
+    assert found
+    return found[attribute]
+
+def measure(extract: Callable[..., Any], *args: Any) -> str:
+    start_time = perf_counter()
+    for _ in range(REPEATS):
+        extract(*args)
+    elapsed = (perf_counter() - start_time) / REPEATS
+    start()
+    extract(*args)
+    peak = get_traced_memory()[1]
+    stop()
+    return "%8.1f ms %8d kB" % (elapsed * 1000, peak // 1000)
+
+def main() -> None:
+    cases = [
+        *((path, 'link', {'title': "RSS"}, 'href') for path in sorted(glob("tests/data/channel@*.html"))),
+        *((path, 'meta', {'itemprop': 'duration'}, 'content') for path in sorted(glob("tests/data/video@*.html"))),
+    ]
+    print("%-44s %20s %20s" % ("fixture", "BeautifulSoup", "fast path"))
+    for path, tag, attrs, attribute in cases:
+        with open(path) as file:
+            html = file.read()
+        args = (html, tag, attrs, attribute)
+        print("%-44s %20s %20s" % (path[len("tests/data/"):], measure(with_soup, *args),
+                                   measure(find_tag_attribute, *args)))
+
+if __name__ == "__main__":
+    main()
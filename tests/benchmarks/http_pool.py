@@ -0,0 +1,34 @@
+"""
+Compare fetching feeds with a fresh connection per request (as feedparser
+and urlopen did) against the shared, pooled session. Run with:
+
+    python -m tests.benchmarks.http_pool [requests]
+"""
+from sys import argv
+from time import perf_counter
+from typing import Callable
+
+from feedparser import parse # type: ignore
+
+from components.extractor.http_client import parse_feed
+from ..utils.stub_server import StubServer
+
+def time_per_request(fetch: Callable[[], object], count: int) -> float:
+    start = perf_counter()
+    for _ in range(count):
+        fetch()
+    return (perf_counter() - start) / count * 1000
+
+def main() -> None:
+    count = int(argv[1]) if len(argv) > 1 else 200
+    with StubServer() as server:
+        url = server.url("feed@ytnnews24@001.xml")
+        fresh = time_per_request(lambda: parse(url), count)
+        connections = server.connections
+        pooled = time_per_request(lambda: parse_feed(url), count)
+        print("%d requests to a local stub server" % count)
+        print("%22s %8.2f ms per fetch, %d connections" % ("feedparser's own fetch", fresh, connections))
+        print("%22s %8.2f ms per fetch, %d connections" % ("pooled session", pooled, server.connections - connections))
+
+if __name__ == "__main__":
+    main()
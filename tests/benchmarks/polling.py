@@ -0,0 +1,72 @@
+"""
+Replay upload timelines against a fixed polling interval and the adaptive
+one, reporting the requests made (and saved) against how late uploads were
+noticed. The timelines are those of the feed fixtures, a few synthetic ones,
+and any given feed files or files with one ISO 8601 upload time per line.
+Run with:
+
+    python -m tests.benchmarks.polling [--fixed S] [--min S] [--max S] [files...]
+
+Each recorded timeline is replayed from its fifth upload (the first ones
+being the history) until a week after its last one.
+"""
+from argparse import ArgumentParser
+from datetime import datetime, timedelta, UTC
+from glob import glob
+from typing import Dict, List
+
+from components.subscriptions.polling import adaptive_interval
+from ..utils.polling_simulation import SimulationResult, feed_timeline, regular_timeline, simulate
+
+def synthetic_timelines() -> Dict[str, List[datetime]]:
+    start = datetime(2024, 1, 1, tzinfo=UTC)
+    return {
+        "daily uploads": regular_timeline(start, 90, timedelta(days=1), timedelta(hours=6)),
+        "weekly uploads": regular_timeline(start, 26, timedelta(weeks=1), timedelta(days=1)),
+        # Uploads stop after a month, and the replay goes on for half a year.
+        "dead channel": regular_timeline(start, 30, timedelta(days=1), timedelta(hours=6))
+                        + [start + timedelta(days=210)],
+        "hourly bursts": [
+            upload for week in range(12) for upload in regular_timeline(
+                start + timedelta(weeks=week), 5, timedelta(hours=1), timedelta(minutes=30), week)
+        ],
+    }
+
+def load_timeline(path: str) -> List[datetime]:
+    if path.endswith(".xml"):
+        return feed_timeline(path)
+    with open(path) as file:
+        return sorted(datetime.fromisoformat(line.strip()) for line in file if line.strip())
+
+def describe(result: SimulationResult) -> str:
+    return "%8d %10s %10s" % (result.requests, str(result.mean_delay).split(".")[0],
+                              str(result.max_delay).split(".")[0])
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("--fixed", type=int, default=3600)
+    parser.add_argument("--min", type=int, default=900)
+    parser.add_argument("--max", type=int, default=86400)
+    parser.add_argument("files", nargs="*")
+    args = parser.parse_args()
+    timelines = synthetic_timelines()
+    for path in args.files or sorted(glob("tests/data/feed@*.xml")):
+        timelines[path.rsplit("/", 1)[-1]] = load_timeline(path)
+    print("fixed: every %ds, adaptive: %ds to %ds" % (args.fixed, args.min, args.max))
+    print("%-48s %30s %30s %8s" % ("", "fixed (requests, mean/max delay)",
+                                   "adaptive (requests, delays)", "saved"))
+    total_fixed = total_adaptive = 0
+    for name, uploads in timelines.items():
+        start, end = uploads[min(4, len(uploads) - 1)], uploads[-1] + timedelta(weeks=1)
+        fixed = simulate(uploads, lambda history, now: args.fixed, start, end)
+        adaptive = simulate(uploads, lambda history, now: adaptive_interval(history, now, args.min, args.max),
+                            start, end)
+        total_fixed += fixed.requests
+        total_adaptive += adaptive.requests
+        print("%-48s %30s %30s %7.0f%%" % (name, describe(fixed), describe(adaptive),
+                                          100 * (1 - adaptive.requests / fixed.requests)))
+    print("%-48s %30d %30d %7.0f%%" % ("total", total_fixed, total_adaptive,
+                                      100 * (1 - total_adaptive / total_fixed)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Time /subs-info for many subscriptions with long histories. Run with:
+
+    python -m tests.benchmarks.subs_info [--subs N] [--videos N] [--compare]
+
+It is timed with the last few videos of each subscription new, and with
+none of the subscriptions ever viewed, so that every video is new. --compare
+also times counting every subscription's videos on each request, as was
+done before the counts were stored. The default size (5M videos) is
+only practical with BENCH_MONGO_URI set to a real mongod (its "bench"
+database is dropped); use smaller sizes with mongomock.
+"""
+from argparse import ArgumentParser
+from datetime import datetime, UTC
+from time import perf_counter
+from typing import Any, Dict, List, Tuple
+from unittest.mock import patch
+
+from pymongo.collection import Collection
+
+from api import app
+from components.database import ensure_indexes, get_videos_collection
+from components.subscriptions.main import Subscription
+from components.subscriptions.typing import SubsDict
+from components.videos import VideoDict
+from ..utils.bench_db import bench_client
+from ..utils.fake_videos import fake_video
+
+REPEATS = 5
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("--subs", type=int, default=1000)
+    parser.add_argument("--videos", type=int, default=5000)
+    parser.add_argument("--compare", action="store_true")
+    args = parser.parse_args()
+    client = bench_client()
+    client.drop_database("bench")
+    collection: Collection[SubsDict] = client.bench.subscriptions
+    videos: Collection[VideoDict] = get_videos_collection(collection)
+    for i in range(args.subs):
+        sub = Subscription(
+            _id="yt:channel:bench%d" % i,
+            link="tests/data/feed@ytnnews24@001.xml",
+            title="Benchmark %d" % i,
+            time_between_fetches=3600,
+            # The last few videos are new.
+            last_viewed=fake_video(args.videos - 5).published,
+            video_count=args.videos,
+        )
+        sub._collection = collection
+        sub.insert()
+        videos.insert_many([fake_video(j).to_document(sub._id) for j in range(args.videos)])
+    ensure_indexes(collection)
+    print("%d subscriptions, %d videos each" % (args.subs, args.videos))
+    client_app = app.test_client()
+    modes: List[Tuple[str, Dict[str, Any]]] = [
+        ("stored count", {"$set": {"video_count": args.videos}}),
+        ("never viewed", {"$set": {"last_viewed": datetime.min.replace(tzinfo=UTC)}}),
+    ]
+    if args.compare:
+        # Documents without the counter fall back to counting.
+        modes.insert(0, ("counting", {"$unset": {"video_count": ""}}))
+    with patch('api.subscriptions', collection), patch('api.videos', videos):
+        for name, update in modes:
+            collection.update_many({}, update)
+            start = perf_counter()
+            for _ in range(REPEATS):
+                response = client_app.get("/subs-info")
+            assert len(response.json or []) == args.subs
+            print("%14s %10.1f ms per request" % (name, (perf_counter() - start) / REPEATS * 1000))
+    client.drop_database("bench")
+    client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+from threading import Lock
+from time import sleep
+from typing import Any, Dict, List
+from unittest import TestCase
+from unittest.mock import patch
+
+from mongomock import MongoClient
+from pymongo.collection import Collection
+from requests import ConnectionError
+
+from components.database import get_imports_collection
+from components.subscriptions.bulk_import import ImportResult, import_subscriptions, parse_import, parse_opml, start_import_job
+from components.subscriptions.main import Subscription
+from components.subscriptions.typing import ImportJobDict, SubsDict
+
+OPML = """<?xml version="1.0" encoding="UTF-8"?>
+<opml version="1.1">
+<body>
+<outline text="YouTube Subscriptions" title="YouTube Subscriptions">
+<outline text="YTN" title="YTN" type="rss" xmlUrl="https://www.youtube.com/feeds/videos.xml?channel_id=UChlgI3UHCOnwUGzWzbJ3H5w" />
+<outline text="Mental Outlaw" title="Mental Outlaw" type="rss" xmlUrl="https://www.youtube.com/feeds/videos.xml?channel_id=UC7YOGHUfC1Tb6E4pudI9STA" />
+</outline>
+</body>
+</opml>
+"""
+
+def sub_info(sub_id: str) -> Dict[str, Any]:
+    return {
+        "id": "yt:channel:" + sub_id,
+        "link": "https://www.youtube.com/channel/UC" + sub_id,
+        "title": sub_id,
+    }
+
+# What each URL resolves to; anything else is not a subscription.
+SUB_INFO = {
+    "https://www.youtube.com/@ytn": sub_info("hlgI3UHCOnwUGzWzbJ3H5w"),
+    "https://www.youtube.com/channel/UChlgI3UHCOnwUGzWzbJ3H5w": sub_info("hlgI3UHCOnwUGzWzbJ3H5w"),
+    "https://www.youtube.com/@MentalOutlaw": sub_info("7YOGHUfC1Tb6E4pudI9STA"),
+    "https://www.youtube.com/@3blue1brown": sub_info("YO_jab_esuFRV4b17AJtAw"),
+}
+
+class TestBulkImport(TestCase):
+    def setUp(self) -> None:
+        self.client: MongoClient[Any] = MongoClient(tz_aware=True)
+        self.collection: Collection[SubsDict] = self.client.db.collection
+        self.running = self.max_running = 0
+        self.lock = Lock()
+        patch('components.subscriptions.bulk_import.get_sub_info_from_yt_url', self.resolve).start()
+        self.addCleanup(patch.stopall)
+
+    def resolve(self, url: str) -> Dict[str, Any]:
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        sleep(0.01)
+        with self.lock:
+            self.running -= 1
+        if url == "https://www.youtube.com/@offline":
+            raise ConnectionError("Connection refused")
+        if url not in SUB_INFO:
+            raise Exception(url + " is not a subscription.")
+        return SUB_INFO[url]
+
+    def test_parse(self) -> None:
+        self.assertEqual(parse_import(OPML), [
+            "https://www.youtube.com/feeds/videos.xml?channel_id=UChlgI3UHCOnwUGzWzbJ3H5w",
+            "https://www.youtube.com/feeds/videos.xml?channel_id=UC7YOGHUfC1Tb6E4pudI9STA",
+        ])
+        self.assertEqual(parse_import("# My channels\n\n https://www.youtube.com/@ytn \nhttps://youtu.be/x\n"),
+                         ["https://www.youtube.com/@ytn", "https://youtu.be/x"])
+        with self.assertRaises(ValueError):
+            parse_opml("<opml><body>")
+
+    def test_import(self) -> None:
+        existing = Subscription(
+            _id="yt:channel:7YOGHUfC1Tb6E4pudI9STA",
+            link="https://www.youtube.com/channel/UC7YOGHUfC1Tb6E4pudI9STA",
+            title="Mental Outlaw",
+            time_between_fetches=60,
+        )
+        existing._collection = self.collection
+        existing.insert()
+        urls = [*SUB_INFO, "https://www.youtube.com/@ytn", "https://youtu.be/x", "https://www.youtube.com/@offline"]
+        with patch.object(self.collection, 'insert_many', wraps=self.collection.insert_many) as insert_many:
+            results = import_subscriptions(urls, 3600, self.collection, max_workers=2)
+        insert_many.assert_called_once()
+        self.assertEqual([(result.status, result.id) for result in results], [
+            ("added", "yt:channel:hlgI3UHCOnwUGzWzbJ3H5w"),
+            ("duplicate", "yt:channel:hlgI3UHCOnwUGzWzbJ3H5w"),
+            ("exists", "yt:channel:7YOGHUfC1Tb6E4pudI9STA"),
+            ("added", "yt:channel:YO_jab_esuFRV4b17AJtAw"),
+            ("invalid", ""),
+            # Worth trying again later.
+            ("retry", ""),
+        ])
+        self.assertTrue(results[-2].error)
+        self.assertLessEqual(self.max_running, 2)
+        self.assertEqual(self.collection.count_documents({}), 3)
+        sub_dict = self.collection.find_one({"_id": "yt:channel:YO_jab_esuFRV4b17AJtAw"})
+        assert sub_dict # To appease mypy.
+        self.assertEqual(sub_dict["time_between_fetches"], 3600)
+        # Importing again adds nothing.
+        results = import_subscriptions(urls, 3600, self.collection)
+        self.assertNotIn("added", [result.status for result in results])
+
+    def wait_for_job(self, jobs: Collection[ImportJobDict], job_id: str) -> ImportJobDict:
+        for _ in range(100):
+            job = jobs.find_one({"_id": job_id})
+            assert job # To appease mypy.
+            if job["status"] != "running":
+                return job
+            sleep(0.01)
+        self.fail("The import did not finish")
+
+    def test_import_job(self) -> None:
+        jobs = get_imports_collection(self.collection)
+        done: List[ImportResult] = []
+        job_id = start_import_job([*SUB_INFO, "https://youtu.be/x"], 3600, self.collection, jobs,
+                                  on_done=done.extend)
+        job = self.wait_for_job(jobs, job_id)
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["total"], 5)
+        self.assertEqual([result["status"] for result in job["results"]],
+                         ["added", "duplicate", "added", "added", "invalid"])
+        self.assertListEqual([result._asdict() for result in done], job["results"])
+        self.assertIsNotNone(job["finished_at"])
+        self.assertGreater(job["expires_at"], job["created_at"])
+        # Errors other than the URLs' are reported as the job's.
+        with patch.object(self.collection, 'find', side_effect=Exception("Disk full")):
+            job = self.wait_for_job(jobs, start_import_job(["https://www.youtube.com/@3blue1brown"], 3600,
+                                                           self.collection, jobs))
+        self.assertEqual(job["status"], "failed")
+        self.assertEqual(job["error"], "Disk full")
@@ -0,0 +1,83 @@
+from typing import Any, List
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from pymongo.errors import ConnectionFailure, OperationFailure
+
+from api.cache import ALL_SUBSCRIPTIONS, CachedResponse, ResponseCache
+
+def response(*tags: str) -> CachedResponse:
+    return CachedResponse("etag", [], {}, frozenset(tags))
+
+class TestResponseCache(TestCase):
+    def setUp(self) -> None:
+        self.now = 0.0
+        self.cache = ResponseCache(maxsize=3, ttl=10, clock=lambda: self.now)
+
+    def test_lru_and_ttl(self) -> None:
+        for key in "abc":
+            self.cache.put(key, response(key))
+        self.assertIsNotNone(self.cache.get("a"))
+        # "b" is now the least recently used.
+        self.cache.put("d", response("d"))
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("a"))
+        self.now = 10
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats()["hits"], 2)
+        self.assertEqual(self.cache.stats()["misses"], 2)
+
+    def test_invalidate(self) -> None:
+        self.cache.put("a", response("a"))
+        self.cache.put("b", response("b"))
+        self.cache.put("all", response(ALL_SUBSCRIPTIONS))
+        self.cache.invalidate("a")
+        self.assertIsNone(self.cache.get("a"))
+        self.assertIsNone(self.cache.get("all"))
+        self.assertIsNotNone(self.cache.get("b"))
+
+    def follow_changes(self, collection: MagicMock) -> None:
+        self.cache.watch(collection)
+        assert self.cache._watcher # To appease mypy.
+        self.cache._watcher.join()
+
+    def test_change_stream(self) -> None:
+        changes: List[Any] = [{"operationType": "update", "documentKey": {"_id": "a"}}]
+        collection = MagicMock()
+        collection.watch.return_value.__enter__.return_value = changes
+        self.cache.put("a", response("a"))
+        self.cache.put("b", response("b"))
+        self.follow_changes(collection)
+        self.assertIsNone(self.cache.get("a"))
+        # The stream ended, so nothing cached can be trusted beyond its TTL.
+        self.assertIsNone(self.cache.get("b"))
+        self.assertFalse(self.cache.watching)
+        # It is reopened after a while.
+        self.cache.watch(collection)
+        collection.watch.assert_called_once()
+        self.now = 1
+        self.follow_changes(collection)
+        self.assertEqual(collection.watch.call_count, 2)
+
+    def test_change_stream_failures(self) -> None:
+        collection = MagicMock()
+        collection.watch.side_effect = ConnectionFailure("Network error")
+        self.follow_changes(collection)
+        # Retried with an exponential backoff while the server is unreachable.
+        for now, calls in [(0.5, 1), (1, 2), (2, 2), (3, 3), (6, 3), (7, 4)]:
+            self.now = now
+            self.follow_changes(collection)
+            self.assertEqual(collection.watch.call_count, calls)
+        # Never retried without a replica set.
+        collection.watch.side_effect = OperationFailure(
+            "The $changeStream stage is only supported on replica sets", 40573)
+        self.now = 100
+        self.follow_changes(collection)
+        self.now = 1000
+        self.follow_changes(collection)
+        self.assertEqual(collection.watch.call_count, 5)
+
+    def test_disabled(self) -> None:
+        cache = ResponseCache(maxsize=0)
+        cache.put("a", response("a"))
+        self.assertIsNone(cache.get("a"))
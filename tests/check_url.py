@@ -1,6 +1,6 @@
 from unittest import TestCase
 
-from components.extractor.check_url import is_youtube, is_channel, is_playlist, is_video
+from components.extractor.check_url import is_youtube, is_channel, is_feed, is_playlist, is_video
 
 class Test_URL_Checker(TestCase):
     def test_youtube_detection(self) -> None:
@@ -38,3 +38,10 @@ class Test_URL_Checker(TestCase):
         self.assertTrue(is_video("https://youtu.be/jNQXAC9IVRw"))
         self.assertFalse(is_video("https://www.youtube.com/channel/UCBa659QWEk1AI4Tg--mrJ2A"))
         self.assertFalse(is_video("https://www.youtube.com/playlist?list=PLZHQObOWTQDMsr9K-rj53DwVRMYO3t5Yr"))
+
+    def test_feed_detection(self) -> None:
+        self.assertTrue(is_feed("https://www.youtube.com/feeds/videos.xml?channel_id=UCBa659QWEk1AI4Tg--mrJ2A"))
+        self.assertTrue(is_feed("https://www.youtube.com/feeds/videos.xml?playlist_id=PLZHQObOWTQDMsr9K-rj53DwVRMYO3t5Yr"))
+        self.assertFalse(is_feed("https://www.youtube.com/feeds/videos.xml"))
+        self.assertFalse(is_feed("https://www.youtube.com/channel/UCBa659QWEk1AI4Tg--mrJ2A"))
+        self.assertFalse(is_feed("https://example.com/feeds/videos.xml?channel_id=UCBa659QWEk1AI4Tg--mrJ2A"))
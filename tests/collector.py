@@ -0,0 +1,143 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, UTC
+from threading import Lock
+from time import sleep
+from typing import Any
+from unittest import TestCase
+from unittest.mock import patch
+
+from mongomock import MongoClient
+from mongomock.collection import Collection as MockCollection
+from pymongo.collection import Collection
+
+from components.database import get_videos_collection
+from components.subscriptions.main import Subscription
+from components.subscriptions.polling import MIN_TIME_BETWEEN_FETCHES
+from components.subscriptions.typing import SubsDict
+from components.videos import VIDEO_KEYS, VideoDict
+from data_collector.scheduler import FetchScheduler
+from data_collector.utils import HostLimiter, collect_data
+from .utils.stub_server import StubServer
+
+class TestCollector(TestCase):
+    def setUp(self) -> None:
+        self.client: MongoClient[Any] = MongoClient(tz_aware=True)
+        self.collection: Collection[SubsDict] = self.client.db.collection
+        self.videos: Collection[VideoDict] = get_videos_collection(self.collection)
+
+        self.sub1 = Subscription(
+            _id="yt:channel:hlgI3UHCOnwUGzWzbJ3H5w",
+            link="tests/data/feed@ytnnews24@001.xml",
+            title="YTN",
+            time_between_fetches=3600,
+        )
+        self.sub1._collection = self.collection
+        self.sub1.insert()
+        self.sub2 = Subscription(
+            _id="yt:channel:7YOGHUfC1Tb6E4pudI9STA",
+            link="tests/data/feed@mentaloutlaw@001.xml",
+            title="Mental Outlaw",
+            time_between_fetches=60,
+        )
+        self.sub2._collection = self.collection
+        self.sub2.insert()
+
+    def test_fetch_sets_next_fetch_at(self) -> None:
+        self.sub1.fetch()
+        sub_dict = self.collection.find_one({"_id": self.sub1._id})
+        assert sub_dict # To appease mypy.
+        self.assertEqual(sub_dict["next_fetch_at"],
+                         sub_dict["last_fetch"] + timedelta(seconds=3600))
+
+    def test_collect_data_only_fetches_due(self) -> None:
+        self.assertEqual(collect_data(self.collection), 2)
+        # Nothing is due straight after a fetch.
+        self.assertEqual(collect_data(self.collection), 0)
+        self.collection.update_one(
+            {"_id": self.sub2._id},
+            {"$set": {"next_fetch_at": datetime.now(tz=UTC) - timedelta(seconds=1)}},
+        )
+        self.assertEqual(collect_data(self.collection), 1)
+
+    def test_collect_data_legacy_documents(self) -> None:
+        # Documents stored before next_fetch_at existed are always due.
+        self.collection.update_many({}, {"$unset": {"next_fetch_at": ""}})
+        self.assertEqual(collect_data(self.collection), 2)
+
+    def test_scheduler(self) -> None:
+        scheduler = FetchScheduler(self.collection, max_sleep=30)
+        # Both subscriptions have never been fetched.
+        self.assertEqual(scheduler.seconds_until_next(), 0)
+        self.assertEqual(scheduler.run_pending(), 2)
+        self.assertEqual(scheduler.run_pending(), 0)
+        # The earliest deadline is sub2's, clamped to max_sleep.
+        self.assertEqual(scheduler.seconds_until_next(), 30)
+        scheduler.max_sleep = 3600
+        self.assertAlmostEqual(scheduler.seconds_until_next(), 60, delta=5)
+
+    def test_non_positive_interval(self) -> None:
+        # Stored before the API rejected such intervals.
+        self.collection.update_many({}, {"$set": {"time_between_fetches": 0}})
+        scheduler = FetchScheduler(self.collection)
+        self.assertEqual(scheduler.run_pending(), 2)
+        self.assertEqual(scheduler.run_pending(), 0)
+        self.assertAlmostEqual(scheduler.seconds_until_next(), MIN_TIME_BETWEEN_FETCHES, delta=5)
+
+    def test_collect_data_concurrently(self) -> None:
+        with StubServer(latency=0.05) as server:
+            self.collection.update_one({"_id": self.sub1._id},
+                                       {"$set": {"link": server.url("feed@ytnnews24@001.xml")}})
+            self.collection.update_one({"_id": self.sub2._id},
+                                       {"$set": {"link": server.url("feed@mentaloutlaw@001.xml")}})
+            self.assertEqual(collect_data(self.collection, max_workers=4, max_per_host=2), 2)
+            self.assertEqual(server.requests, 2)
+        sub_dict = self.collection.find_one({"_id": self.sub1._id})
+        assert sub_dict # To appease mypy.
+        self.assertEqual(self.videos.count_documents({VIDEO_KEYS["sub_id"]: sub_dict["_id"]}), 15)
+        sub_dict = self.collection.find_one({"_id": self.sub2._id})
+        assert sub_dict # To appease mypy.
+        self.assertEqual(self.videos.count_documents({VIDEO_KEYS["sub_id"]: sub_dict["_id"]}), 15)
+
+    def test_collect_data_concurrently_with_failure(self) -> None:
+        self.collection.update_one({"_id": self.sub1._id}, {"$set": {"link": 5}})
+        self.assertEqual(collect_data(self.collection, max_workers=4), 2)
+        sub_dict = self.collection.find_one({"_id": self.sub1._id})
+        assert sub_dict # To appease mypy.
+        # The failed subscription is rescheduled without being marked as fetched.
+        self.assertEqual(sub_dict["last_fetch"], datetime.min.replace(tzinfo=UTC))
+        self.assertGreater(sub_dict["next_fetch_at"], datetime.now(tz=UTC))
+
+    def test_collect_data_round_trips(self) -> None:
+        with patch.object(MockCollection, "bulk_write", autospec=True,
+                          side_effect=MockCollection.bulk_write) as bulk_write, \
+             patch.object(MockCollection, "update_one", autospec=True,
+                          side_effect=MockCollection.update_one) as update_one:
+            self.assertEqual(collect_data(self.collection), 2)
+        # One bulk write for the videos and one for the subscriptions.
+        self.assertEqual(bulk_write.call_count, 2)
+        update_one.assert_not_called()
+        for sub in (self.sub1, self.sub2):
+            sub_dict = self.collection.find_one({"_id": sub._id})
+            assert sub_dict # To appease mypy.
+            self.assertEqual(sub_dict["video_count"], 15)
+            self.assertGreater(sub_dict["last_fetch"], datetime.min.replace(tzinfo=UTC))
+
+    def test_host_limiter(self) -> None:
+        limiter = HostLimiter(max_per_host=2)
+        lock = Lock()
+        active = {"current": 0, "peak": 0}
+        def work() -> None:
+            with limiter.limit("https://www.youtube.com/feeds/videos.xml"):
+                with lock:
+                    active["current"] += 1
+                    active["peak"] = max(active["peak"], active["current"])
+                sleep(0.01)
+                with lock:
+                    active["current"] -= 1
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for _ in range(16):
+                executor.submit(work)
+        self.assertEqual(active["peak"], 2)
+
+    def tearDown(self) -> None:
+        self.client.close()
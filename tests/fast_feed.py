@@ -0,0 +1,45 @@
+from glob import glob
+from unittest import TestCase
+from unittest.mock import patch
+from xml.etree.ElementTree import ParseError
+
+from feedparser import parse # type: ignore
+
+from components.extractor.fast_feed import UnexpectedFeed, feed_videos, parse_youtube_feed
+from components.extractor.http_client import parse_feed, parse_feed_content
+from components.videos import VideoTuple
+
+class TestFastFeed(TestCase):
+    def test_parity_with_feedparser(self) -> None:
+        paths = glob("tests/data/feed@*.xml")
+        self.assertTrue(paths)
+        for path in paths:
+            expected = parse(path)
+            with open(path, "rb") as file:
+                rss = parse_youtube_feed(file.read())
+            self.assertListEqual(rss["videos"], [VideoTuple.from_rss_entry(entry) for entry in expected.entries], path)
+            self.assertEqual(rss.feed.id, expected.feed.id, path)
+            self.assertEqual(rss.feed.title, expected.feed.title, path)
+            self.assertEqual(rss.feed.links[0]["href"], expected.feed.links[0]["href"], path)
+
+    def test_unexpected_feeds(self) -> None:
+        with open("tests/data/feed@mentaloutlaw@001.xml", "rb") as file:
+            content = file.read()
+        with self.assertRaises(ParseError):
+            parse_youtube_feed(content[:len(content) // 2])
+        with self.assertRaises(UnexpectedFeed):
+            parse_youtube_feed(content.replace(b"<media:thumbnail", b"<media:image"))
+        with self.assertRaises(UnexpectedFeed):
+            parse_youtube_feed(b'<rss version="2.0"><channel><title>Not Atom</title></channel></rss>')
+
+    def test_feedparser_fallback(self) -> None:
+        with open("tests/data/feed@mentaloutlaw@001.xml", "rb") as file:
+            content = file.read()
+        # Plain Atom summaries instead of media descriptions.
+        rss = parse_feed_content(content.replace(b"media:description>", b"summary>"))
+        self.assertNotIn("videos", rss)
+        self.assertListEqual(feed_videos(rss), parse_youtube_feed(content)["videos"])
+        with patch.dict("os.environ", {"FAST_FEED_PARSER": "0"}):
+            rss = parse_feed("tests/data/feed@mentaloutlaw@001.xml")
+        self.assertNotIn("videos", rss)
+        self.assertListEqual(feed_videos(rss), feed_videos(parse_feed("tests/data/feed@mentaloutlaw@001.xml")))
@@ -0,0 +1,43 @@
+from glob import glob
+from typing import Any
+from unittest import TestCase
+from unittest.mock import patch
+
+from bs4 import BeautifulSoup
+
+from components.extractor.extract_sub_info import get_channel_feed
+from components.extractor.fast_html import find_tag_attribute
+from components.extractor.obtain_vid_info import obtain_vid_duration
+
+class TestFastHTML(TestCase):
+    def test_parity_with_soup(self) -> None:
+        for path, tag, attrs, attribute in (
+            *((path, 'link', {'title': "RSS"}, 'href') for path in glob("tests/data/channel@*.html")),
+            *((path, 'meta', {'itemprop': 'duration'}, 'content') for path in glob("tests/data/video@*.html")),
+        ):
+            with open(path) as file:
+                html = file.read()
+            expected = BeautifulSoup(html, 'html.parser').find(tag, dict[str, Any](attrs))
+            assert expected # To appease mypy.
+            self.assertEqual(find_tag_attribute(html, tag, attrs, attribute), expected[attribute], path)
+
+    def test_attribute_syntax(self) -> None:
+        html = """<html><head>
+        <LINK rel=alternate TITLE='RSS' href="https://example.com/feed?a=1&amp;b=2" >
+        <meta itemprop="duration" content="PT1M0S"/>
+        </head></html>"""
+        self.assertEqual(find_tag_attribute(html, 'link', {'title': "RSS"}, 'href'),
+                         "https://example.com/feed?a=1&b=2")
+        self.assertEqual(find_tag_attribute(html, 'meta', {'itemprop': 'duration'}, 'content'), "PT1M0S")
+        self.assertIsNone(find_tag_attribute(html, 'link', {'title': "Atom"}, 'href'))
+        # <linkage> is not a <link>.
+        self.assertIsNone(find_tag_attribute('<linkage title="RSS" href="x">', 'link', {'title': "RSS"}, 'href'))
+
+    def test_soup_fallback(self) -> None:
+        with patch('components.extractor.extract_sub_info.find_tag_attribute', return_value=None), \
+             patch('components.extractor.obtain_vid_info.find_tag_attribute', return_value=None):
+            with open("tests/data/channel@aljazeera.html") as file:
+                self.assertEqual(get_channel_feed('https://www.youtube.com/@aljazeera', html=file.read()),
+                                 "https://www.youtube.com/feeds/videos.xml?channel_id=UCfiwzLy-8yKzIbsmZTzxDgw")
+            with open("tests/data/video@iD1Z7ccGyhk.html") as file:
+                self.assertEqual(obtain_vid_duration('', '', html=file.read()), 60)
@@ -1,16 +1,22 @@
-from typing import Any
+from typing import Any, Dict, List
+from unittest.mock import patch
 from mongomock import MongoClient
 from pymongo.collection import Collection
 from unittest import TestCase
+from components.database import get_videos_collection
 from components.subscriptions.main import Subscription
 from components.subscriptions.typing import SubsDict
+from components.videos import VIDEO_KEYS, VideoDict
 from components.users.typing import UserDict
+from .utils.fake_videos import fake_video
+from .utils.stub_server import StubServer
 
 
 class TestFeeds(TestCase):
     def setUp(self) -> None:
         self.client: MongoClient[Any] = MongoClient(tz_aware=True)
         self.collection: Collection[SubsDict] = self.client.db.collection
+        self.videos: Collection[VideoDict] = get_videos_collection(self.collection)
 
     def test_insert(self) -> None:
         sub = Subscription(
@@ -40,7 +46,7 @@ class TestFeeds(TestCase):
         sub_dict = self.collection.find_one({"_id": "yt:channel:hlgI3UHCOnwUGzWzbJ3H5w"})
         self.assertIsNotNone(sub_dict)
         assert sub_dict # To appease mypy.
-        self.assertEqual(15, len(sub_dict["videos"]))
+        self.assertEqual(15, self.videos.count_documents({VIDEO_KEYS["sub_id"]: sub_dict["_id"]}))
 
     def test_feed_update(self) -> None:
         sub = Subscription(
@@ -58,7 +64,122 @@ class TestFeeds(TestCase):
         sub_dict = self.collection.find_one({"_id": "yt:channel:hlgI3UHCOnwUGzWzbJ3H5w"})
         self.assertIsNotNone(sub_dict)
         assert sub_dict # To appease mypy.
-        self.assertEqual(16, len(sub_dict["videos"]))
+        self.assertEqual(16, self.videos.count_documents({VIDEO_KEYS["sub_id"]: sub_dict["_id"]}))
+        self.assertEqual(16, sub_dict["video_count"])
+        # Each fetch writes the subscription and its videos once.
+        self.assertEqual(4, sub_dict["version"])
+
+    def test_feed_update_without_loaded_videos(self) -> None:
+        sub = Subscription(
+            _id="yt:channel:hlgI3UHCOnwUGzWzbJ3H5w",
+            link="tests/data/feed@ytnnews24@001.xml",
+            title="YTN",
+            time_between_fetches=1,
+        )
+        sub._collection = self.collection
+        sub.insert()
+        sub.fetch()
+        sub_dict = self.collection.find_one({"_id": "yt:channel:hlgI3UHCOnwUGzWzbJ3H5w"})
+        assert sub_dict # To appease mypy.
+        sub = Subscription(**sub_dict)
+        sub._collection = self.collection
+        sub.link=r"tests/data/feed@ytnnews24@002.xml"
+        sub.fetch()
+        self.assertEqual(16, self.videos.count_documents({VIDEO_KEYS["sub_id"]: sub._id}))
+        # Videos that were only updated are not counted again.
+        sub_dict = self.collection.find_one({"_id": sub._id})
+        assert sub_dict # To appease mypy.
+        self.assertEqual(16, sub_dict["video_count"])
+        sub.load_videos()
+        self.assertEqual(16, len(sub.videos))
+
+    def test_feed_conditional_fetch(self) -> None:
+        with StubServer(validators=True) as server:
+            sub = Subscription(
+                _id="yt:channel:hlgI3UHCOnwUGzWzbJ3H5w",
+                link=server.url("feed@ytnnews24@001.xml"),
+                title="YTN",
+                time_between_fetches=1,
+            )
+            sub._collection = self.collection
+            sub.insert()
+            sub.fetch()
+            self.assertEqual(15, len(sub.videos))
+            self.assertEqual(0, server.not_modified)
+            sub_dict = self.collection.find_one({"_id": "yt:channel:hlgI3UHCOnwUGzWzbJ3H5w"})
+            assert sub_dict # To appease mypy.
+            self.assertTrue(sub_dict["etag"])
+            self.assertTrue(sub_dict["modified"])
+            first_fetch = sub_dict["last_fetch"]
+            # The stored validators are sent back and the server replies 304.
+            sub = Subscription(**sub_dict)
+            sub._collection = self.collection
+            sub.fetch()
+            self.assertEqual(1, server.not_modified)
+            sub_dict = self.collection.find_one({"_id": "yt:channel:hlgI3UHCOnwUGzWzbJ3H5w"})
+            assert sub_dict # To appease mypy.
+            self.assertEqual(15, self.videos.count_documents({VIDEO_KEYS["sub_id"]: sub_dict["_id"]}))
+            self.assertGreater(sub_dict["last_fetch"], first_fetch)
+            self.assertGreater(sub_dict["next_fetch_at"], first_fetch)
+
+    def test_feed_replaces_updated_videos(self) -> None:
+        sub = Subscription(
+            _id="yt:channel:hlgI3UHCOnwUGzWzbJ3H5w",
+            link="tests/data/feed@ytnnews24@001.xml",
+            title="YTN",
+            time_between_fetches=1,
+        )
+        sub._collection = self.collection
+        sub.insert()
+        sub.fetch()
+        newest_update = sub.last_video_update
+        # Pretend the stored videos are outdated versions of the feed entries.
+        sub = Subscription(
+            _id=sub._id,
+            link=sub.link,
+            title=sub.title,
+            time_between_fetches=1,
+            last_video_update=max(vid.published for vid in sub.videos),
+            videos=[vid._replace(title="Old title", updated=vid.published) for vid in sub.videos],
+        )
+        sub._collection = self.collection
+        sub.fetch()
+        self.assertEqual(15, len(sub.videos))
+        self.assertEqual(newest_update, sub.last_video_update)
+        updated = [vid for vid in sub.videos if vid.title != "Old title"]
+        self.assertTrue(updated)
+        for vid in updated:
+            self.assertGreater(vid.updated, vid.published)
+
+    def test_video_writes_independent_of_history(self) -> None:
+        requests: Dict[int, List[Any]] = {}
+        for history in (10, 100, 1000):
+            self.collection.delete_many({})
+            self.videos.delete_many({})
+            sub = Subscription(
+                _id="yt:channel:hlgI3UHCOnwUGzWzbJ3H5w",
+                link="tests/data/feed@ytnnews24@001.xml",
+                title="YTN",
+                time_between_fetches=1,
+            )
+            sub._collection = self.collection
+            sub.insert()
+            self.videos.insert_many([fake_video(i).to_document(sub._id) for i in range(history)])
+            sub.load_videos()
+            with patch.object(self.videos, "bulk_write", wraps=self.videos.bulk_write) as bulk_write:
+                sub.fetch()
+            bulk_write.assert_called_once()
+            requests[history] = bulk_write.call_args.args[0]
+            self.assertEqual(history + 15, self.videos.count_documents({}))
+            # Analysing a single video writes only that video.
+            with patch.object(self.videos, "bulk_write", wraps=self.videos.bulk_write) as bulk_write:
+                sub.replace_video(0, sub.videos[0]._replace(analysed=True, duration=5))
+                sub.update_videos()
+            self.assertEqual(len(bulk_write.call_args.args[0]), 1)
+        # Only the 15 new videos are written, whatever the length of the history.
+        self.assertEqual(len(requests[10]), 15)
+        self.assertListEqual(requests[10], requests[100])
+        self.assertListEqual(requests[10], requests[1000])
 
     def tearDown(self) -> None:
         self.client.close()
@@ -0,0 +1,50 @@
+from unittest import TestCase
+
+from requests.exceptions import HTTPError, RequestException
+
+from components.extractor.fast_feed import feed_videos
+from components.extractor.http_client import create_session, get_session, http_get, parse_feed
+from .utils.stub_server import StubServer
+
+class TestHTTPClient(TestCase):
+    def test_shared_session(self) -> None:
+        self.assertIs(get_session(), get_session())
+
+    def test_keep_alive(self) -> None:
+        session = create_session()
+        with StubServer() as server:
+            for _ in range(5):
+                http_get(server.url("feed@mentaloutlaw@001.xml"), session=session)
+            self.assertEqual(server.requests, 5)
+            self.assertEqual(server.connections, 1)
+
+    def test_retry(self) -> None:
+        session = create_session(retries=2, backoff=0)
+        with StubServer() as server:
+            server.fail_next = 2
+            response = http_get(server.url("feed@mentaloutlaw@001.xml"), session=session)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(server.requests, 3)
+            server.fail_next = 3
+            with self.assertRaises(HTTPError):
+                http_get(server.url("feed@mentaloutlaw@001.xml"), session=session)
+
+    def test_timeout(self) -> None:
+        session = create_session(retries=0)
+        with StubServer(latency=0.5) as server:
+            with self.assertRaises(RequestException):
+                http_get(server.url("feed@mentaloutlaw@001.xml"), session=session, timeout=0.1)
+
+    def test_parse_feed(self) -> None:
+        local = parse_feed("tests/data/feed@mentaloutlaw@001.xml")
+        with StubServer(validators=True) as server:
+            url = server.url("feed@mentaloutlaw@001.xml")
+            remote = parse_feed(url)
+            self.assertEqual(remote["status"], 200)
+            self.assertEqual(remote.feed.title, local.feed.title)
+            self.assertListEqual([vid.id for vid in feed_videos(remote)],
+                                 [vid.id for vid in feed_videos(local)])
+            not_modified = parse_feed(url, etag=remote["etag"], modified=remote["modified"])
+            self.assertEqual(not_modified["status"], 304)
+            self.assertListEqual(feed_videos(not_modified), [])
+            self.assertEqual(server.not_modified, 1)
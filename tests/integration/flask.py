@@ -4,13 +4,19 @@ from unittest import TestCase
 from werkzeug.http import parse_date
 
 from api import app
-from components.database import subscriptions
+from components.database import imports, resolutions, subscriptions, videos
+
+def clear_database() -> None:
+    subscriptions.delete_many({})
+    videos.delete_many({})
+    resolutions.delete_many({})
+    imports.delete_many({})
 
 class TestFlask(TestCase):
     def setUp(self) -> None:
         app.config['TESTING'] = True
         self.client = app.test_client()
-        subscriptions.delete_many({})
+        clear_database()
 
     def test_add_sub(self) -> None:
         # A valid channel - should succeed.
@@ -169,4 +175,4 @@ class TestFlask(TestCase):
         self.assertEqual(response.status_code, 404)
 
     def tearDown(self) -> None:
-        subscriptions.delete_many({})
+        clear_database()
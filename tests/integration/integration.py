@@ -2,15 +2,21 @@ from os import getenv
 from unittest import TestCase
 
 from api import app
-from components.database import subscriptions
+from components.database import imports, resolutions, subscriptions, videos
 from data_analyser.utils import analyse_collection
 from data_collector.utils import collect_data
 
+def clear_database() -> None:
+    subscriptions.delete_many({})
+    videos.delete_many({})
+    resolutions.delete_many({})
+    imports.delete_many({})
+
 class TestIntegration(TestCase):
     def setUp(self) -> None:
         app.config['TESTING'] = True
         self.client = app.test_client()
-        subscriptions.delete_many({})
+        clear_database()
         self.client.post("/add-sub/", data={
             'url': "https://www.youtube.com/playlist?list=PLZmiPrHYOIsRtlMRPjLd5WhmM8BddIdj0",
             'time_between_fetches': 1,
@@ -44,4 +50,4 @@ class TestIntegration(TestCase):
             self.assertGreaterEqual(vid["duration"], 0)
 
     def tearDown(self) -> None:
-        subscriptions.delete_many({})
+        clear_database()
@@ -0,0 +1,138 @@
+from collections import Counter
+from datetime import datetime, timedelta, UTC
+from threading import Lock, Thread
+from time import sleep
+from typing import Any, List
+from unittest import TestCase
+from unittest.mock import patch
+
+from mongomock import MongoClient
+from mongomock.collection import Collection as MockCollection
+from pymongo.collection import Collection
+
+from components.subscriptions.main import Subscription
+from components.subscriptions.typing import SubsDict
+from data_collector.scheduler import FetchScheduler
+from data_collector.utils import claim_due_subscriptions, collector_id, due_subscriptions, release_leases
+
+FEEDS = [
+    "tests/data/feed@mentaloutlaw@001.xml",
+    "tests/data/feed@ytnnews24@001.xml",
+    "tests/data/feed@EssesnceOfLinearAlgebra@3Blue1Brown@001.xml",
+]
+NUM_SUBS = 30
+
+class TestLeases(TestCase):
+    def setUp(self) -> None:
+        self.client: MongoClient[Any] = MongoClient(tz_aware=True)
+        self.collection: Collection[SubsDict] = self.client.db.collection
+        for i in range(NUM_SUBS):
+            sub = Subscription(_id="yt:channel:%d" % i, link=FEEDS[i % len(FEEDS)],
+                               title="Channel %d" % i, time_between_fetches=3600)
+            sub._collection = self.collection
+            sub.insert()
+        self.now = datetime.now(tz=UTC)
+
+    def claimed_ids(self, owner: str, limit: int = 0, later: float = 0) -> List[str]:
+        return [sub._id for sub in claim_due_subscriptions(
+            self.collection, owner, 60, limit, self.now,
+            clock=lambda: self.now + timedelta(seconds=later),
+        )]
+
+    def test_claims_are_disjoint(self) -> None:
+        owners = ["a", "b", "c"]
+        claimed: List[str] = []
+        # Take turns until nothing is left.
+        while batches := [self.claimed_ids(owner, 4) for owner in owners]:
+            if not any(batches):
+                break
+            for owner, batch in zip(owners, batches):
+                self.assertEqual(self.collection.count_documents({"lease_owner": owner, "_id": {"$in": batch}}), len(batch))
+                claimed += batch
+        self.assertEqual(len(claimed), NUM_SUBS)
+        self.assertEqual(len(set(claimed)), NUM_SUBS)
+
+    def test_expired_leases_are_reclaimed(self) -> None:
+        self.assertEqual(len(self.claimed_ids("crashed")), NUM_SUBS)
+        self.assertListEqual(self.claimed_ids("alive"), [])
+        self.assertListEqual(self.claimed_ids("alive", later=59), [])
+        self.assertEqual(len(self.claimed_ids("alive", later=61)), NUM_SUBS)
+        # The crashed collector cannot release the new owner's leases.
+        self.assertEqual(release_leases(self.collection, "crashed"), 0)
+        self.assertEqual(release_leases(self.collection, "alive"), NUM_SUBS)
+        self.assertEqual(self.collection.count_documents({"lease_owner": {"$exists": True}}), 0)
+
+    def test_leases_are_left_out(self) -> None:
+        sub_id = self.claimed_ids("a", 1)[0]
+        # The leased document still loads as a Subscription.
+        subs = list(due_subscriptions(self.collection, self.now))
+        self.assertEqual(len(subs), NUM_SUBS)
+        self.assertIn(sub_id, [sub._id for sub in subs])
+
+    def test_several_collectors(self) -> None:
+        fetched: Counter[str] = Counter()
+        lock = Lock()
+        download_feed = Subscription.download_feed
+        def download(sub: Subscription) -> Any:
+            with lock:
+                fetched[sub._id] += 1
+            sleep(0.001)
+            return download_feed(sub)
+        # mongomock does not make find_one_and_update() atomic, as MongoDB does.
+        find_one_and_update: Any = MockCollection.find_one_and_update
+        def atomic(*args: Any, **kwargs: Any) -> Any:
+            with lock:
+                return find_one_and_update(*args, **kwargs)
+        schedulers = [
+            FetchScheduler(self.collection, owner=collector_id(), claim_batch=3, max_workers=2)
+            for _ in range(4)
+        ]
+        counts: List[int] = []
+        with patch.object(Subscription, "download_feed", autospec=True, side_effect=download), \
+             patch.object(MockCollection, "find_one_and_update", autospec=True, side_effect=atomic):
+            threads = [Thread(target=lambda s=scheduler: counts.append(s.run_pending())) for scheduler in schedulers]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(sum(counts), NUM_SUBS)
+            # The work was shared.
+            self.assertGreater(sum(count > 0 for count in counts), 1)
+            self.assertEqual(len(fetched), NUM_SUBS)
+            self.assertEqual(max(fetched.values()), 1)
+            # All were fetched and released, so nothing is due anymore.
+            self.assertListEqual([scheduler.run_pending() for scheduler in schedulers], [0] * 4)
+        self.assertEqual(self.collection.count_documents({"lease_owner": {"$exists": True}}), 0)
+        self.assertEqual(self.collection.count_documents({"next_fetch_at": {"$lte": self.now}}), 0)
+        self.assertEqual(self.collection.count_documents({"video_count": 15}), NUM_SUBS)
+
+    def test_batches_outlasting_the_lease(self) -> None:
+        ids = ["yt:channel:0", "yt:channel:1", "yt:channel:2"]
+        self.collection.delete_many({"_id": {"$nin": ids}})
+        others: List[str] = []
+        download_feed = Subscription.download_feed
+        def download(sub: Subscription) -> Any:
+            sleep(0.1)
+            # Every lease was granted when its batch was claimed, so none
+            # has expired yet, although the cycle started long ago.
+            others.extend(sub._id for sub in claim_due_subscriptions(
+                self.collection, "other", 0.15, exclude=[id for id in ids if id != sub._id],
+            ))
+            return download_feed(sub)
+        scheduler = FetchScheduler(self.collection, owner="slow", lease_time=0.15, claim_batch=1)
+        with patch.object(Subscription, "download_feed", autospec=True, side_effect=download):
+            self.assertEqual(scheduler.run_pending(), 3)
+        self.assertListEqual(others, [])
+
+    def test_failed_writes_are_not_claimed_again(self) -> None:
+        update = Subscription._update
+        def drop_writes(sub: Subscription, changes: Any) -> Any:
+            # As if writing the subscription failed, so it is still due.
+            return None if sub._id == "yt:channel:0" else update(sub, changes)
+        scheduler = FetchScheduler(self.collection, owner="a", claim_batch=4)
+        with patch.object(Subscription, "_update", autospec=True, side_effect=drop_writes):
+            self.assertEqual(scheduler.run_pending(), NUM_SUBS)
+            self.assertEqual(scheduler.run_pending(), 1)
+
+    def tearDown(self) -> None:
+        self.client.close()
@@ -0,0 +1,91 @@
+from typing import Any, Dict, cast
+from unittest import TestCase
+
+from mongomock import MongoClient
+from pymongo.collection import Collection
+
+from components.database import get_videos_collection
+from components.subscriptions.main import Subscription
+from components.subscriptions.typing import SubsDict
+from components.videos import RETRY_KEYS, VIDEO_KEYS, VIDEO_SCHEMA_VERSION, VideoDict, VideoTuple
+from migrations.utils import count_videos, move_embedded_videos, requeue_failed_analyses, upgrade_video_documents
+from .utils.fake_videos import fake_video
+
+class TestMigrations(TestCase):
+    def setUp(self) -> None:
+        self.client: MongoClient[Any] = MongoClient(tz_aware=True)
+        self.collection: Collection[SubsDict] = self.client.db.collection
+        self.videos: Collection[VideoDict] = get_videos_collection(self.collection)
+
+        # Store a subscription the way it used to be, with embedded videos.
+        sub = Subscription(
+            _id="yt:channel:hlgI3UHCOnwUGzWzbJ3H5w",
+            link="tests/data/feed@ytnnews24@001.xml",
+            title="YTN",
+            time_between_fetches=1,
+        )
+        sub._collection = self.collection
+        self.vids = [fake_video(i, analysed=bool(i % 2)) for i in range(5)]
+        sub_dict: Any = {**sub.asdict(), "videos": [list(vid) for vid in self.vids]}
+        del sub_dict["video_count"]
+        self.collection.insert_one(sub_dict)
+
+    def test_move_embedded_videos(self) -> None:
+        self.assertEqual(move_embedded_videos(self.collection), 1)
+        sub_dict = self.collection.find_one({"_id": "yt:channel:hlgI3UHCOnwUGzWzbJ3H5w"})
+        assert sub_dict # To appease mypy.
+        self.assertNotIn("videos", sub_dict)
+        sub = Subscription(**sub_dict)
+        sub._collection = self.collection
+        sub.load_videos()
+        self.assertListEqual(sub.videos, self.vids)
+        # Running it again does nothing.
+        self.assertEqual(move_embedded_videos(self.collection), 0)
+        self.assertEqual(self.videos.count_documents({}), 5)
+
+    def test_count_videos(self) -> None:
+        move_embedded_videos(self.collection)
+        self.assertEqual(count_videos(self.collection), 1)
+        sub_dict = self.collection.find_one({"_id": "yt:channel:hlgI3UHCOnwUGzWzbJ3H5w"})
+        assert sub_dict # To appease mypy.
+        self.assertEqual(sub_dict["video_count"], 5)
+        # Running it again does nothing.
+        self.assertEqual(count_videos(self.collection), 0)
+
+    def test_requeue_failed_analyses(self) -> None:
+        move_embedded_videos(self.collection)
+        self.video_docs = cast(Collection[Dict[str, Any]], self.videos)
+        failed = {VIDEO_KEYS["analysed"]: True, VIDEO_KEYS["duration"]: -2}
+        self.video_docs.update_many({VIDEO_KEYS["id"]: {"$in": ["yt:video:fake1", "yt:video:fake3"]}}, {"$set": failed})
+        # Given up on after retries.
+        self.video_docs.update_one({VIDEO_KEYS["id"]: "yt:video:fake3"}, {"$set": {RETRY_KEYS["attempts"]: 5}})
+        self.assertEqual(requeue_failed_analyses(self.collection), 1)
+        doc = self.video_docs.find_one({VIDEO_KEYS["id"]: "yt:video:fake1"})
+        assert doc # To appease mypy.
+        self.assertFalse(doc[VIDEO_KEYS["analysed"]])
+        self.assertEqual(doc[VIDEO_KEYS["duration"]], -1)
+        self.assertEqual(self.video_docs.count_documents(failed), 1)
+        # Running it again does nothing.
+        self.assertEqual(requeue_failed_analyses(self.collection), 0)
+
+    def test_upgrade_video_documents(self) -> None:
+        # Videos stored with the field names as keys, and indexed on them.
+        self.videos.insert_many([
+            {"sub_id": "yt:channel:hlgI3UHCOnwUGzWzbJ3H5w", **vid._asdict()} for vid in self.vids # type: ignore[misc]
+        ])
+        self.videos.create_index([("sub_id", 1), ("id", 1)], unique=True)
+        self.assertEqual(upgrade_video_documents(self.collection, batch_size=2), 5)
+        for doc in self.videos.find():
+            self.assertEqual(doc["_v"], VIDEO_SCHEMA_VERSION)
+            self.assertNotIn("sub_id", doc)
+            self.assertNotIn("summary", doc)
+        self.assertListEqual(
+            sorted(map(VideoTuple.from_document, self.videos.find())),
+            sorted(self.vids),
+        )
+        self.assertListEqual(list(self.videos.index_information()), ["_id_"])
+        # Running it again does nothing.
+        self.assertEqual(upgrade_video_documents(self.collection), 0)
+
+    def tearDown(self) -> None:
+        self.client.close()
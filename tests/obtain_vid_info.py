@@ -1,6 +1,8 @@
+from typing import Any, Dict
 from unittest import TestCase
+from unittest.mock import MagicMock
 
-from components.extractor.obtain_vid_info import obtain_vid_duration
+from components.extractor.obtain_vid_info import obtain_vid_duration, obtain_vid_durations
 from .utils.vid_url_to_html import get_vid_html_from_url
 
 class TestObtainVidInfo(TestCase):
@@ -15,3 +17,27 @@ class TestObtainVidInfo(TestCase):
     def test_obtain_vid_duration_from_videos_with_params(self) -> None:
         url = "https://www.youtube.com/watch?v=k7RM-ot2NWY&list=PLZHQObOWTQDPD3MizzM2xVFitgF8hE_ab&index=2&pp=iAQB"
         self.assertEqual(9*60+59, obtain_vid_duration(url, '', html=get_vid_html_from_url(url)))
+
+    def test_obtain_vid_durations(self) -> None:
+        ids = ["yt:video:vid%03d" % i for i in range(120)]
+        def api_response(url: str, params: Dict[str, str], **kwargs: Any) -> Any:
+            response = MagicMock()
+            # The API leaves out videos it does not know about (every 7th one here).
+            response.json.return_value = {"items": [
+                {"id": vid_id, "contentDetails": {"duration": "PT%dS" % int(vid_id[3:])}}
+                for vid_id in params["id"].split(",") if int(vid_id[3:]) % 7
+            ]}
+            return response
+        session = MagicMock()
+        session.get.side_effect = api_response
+        durations = obtain_vid_durations(ids, "key", session=session)
+        # 120 ids fit in 3 requests of at most 50.
+        self.assertEqual(session.get.call_count, 3)
+        for call in session.get.call_args_list:
+            self.assertLessEqual(len(call.kwargs["params"]["id"].split(",")), 50)
+        self.assertEqual(durations, {vid_id: int(vid_id[12:]) for vid_id in ids if int(vid_id[12:]) % 7})
+
+    def test_obtain_vid_durations_with_error(self) -> None:
+        session = MagicMock()
+        session.get.side_effect = Exception("Network error")
+        self.assertEqual(obtain_vid_durations(["yt:video:WI4U1SVIO3I"], "key", session=session), {})
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, UTC
+from typing import Any
+from unittest import TestCase
+
+from mongomock import MongoClient
+from pymongo.collection import Collection
+
+from components.subscriptions.main import Subscription
+from components.subscriptions.polling import HISTORY_SIZE, adaptive_interval, merge_upload_history
+from components.subscriptions.typing import SubsDict
+from .utils.polling_simulation import regular_timeline, simulate
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+class TestPolling(TestCase):
+    def setUp(self) -> None:
+        self.start = datetime(2024, 1, 1, tzinfo=UTC)
+        self.daily = regular_timeline(self.start, 10, timedelta(days=1))
+
+    def test_adaptive_interval(self) -> None:
+        last = self.daily[-1]
+        # A quarter of a day right after an upload.
+        self.assertEqual(adaptive_interval(self.daily, last, 60, 7 * DAY), DAY // 4)
+        self.assertEqual(adaptive_interval(self.daily, last + timedelta(hours=12), 60, 7 * DAY), DAY // 4)
+        # Backing off once uploads are overdue.
+        self.assertEqual(adaptive_interval(self.daily, last + timedelta(days=4), 60, 7 * DAY), DAY)
+        # Within the bounds.
+        self.assertEqual(adaptive_interval(self.daily, last, 12 * HOUR, 7 * DAY), 12 * HOUR)
+        self.assertEqual(adaptive_interval(self.daily, last + timedelta(days=400), 60, 7 * DAY), 7 * DAY)
+        self.assertEqual(adaptive_interval([], last, 60, 7 * DAY), 7 * DAY)
+        # The order of the history does not matter.
+        self.assertEqual(adaptive_interval(self.daily[::-1], last, 60, 7 * DAY), DAY // 4)
+
+    def test_merge_upload_history(self) -> None:
+        history = merge_upload_history(self.daily[:8], self.daily[5:])
+        self.assertListEqual(history, self.daily)
+        longer = regular_timeline(self.start, 40, timedelta(hours=1))
+        self.assertListEqual(merge_upload_history(self.daily, longer), sorted(self.daily + longer)[-HISTORY_SIZE:])
+
+    def test_simulation(self) -> None:
+        # A month of daily uploads, then silence for half a year.
+        uploads = regular_timeline(self.start, 30, timedelta(days=1), timedelta(hours=6))
+        start, end = uploads[4], uploads[-1] + timedelta(days=180)
+        fixed = simulate(uploads, lambda history, now: HOUR, start, end)
+        adaptive = simulate(uploads, lambda history, now: adaptive_interval(history, now, HOUR, DAY), start, end)
+        self.assertEqual(len(fixed.delays), 25)
+        self.assertEqual(len(adaptive.delays), 25)
+        self.assertLess(adaptive.requests, fixed.requests / 5)
+        # Uploads are still noticed within a quarter of the usual gap,
+        # give or take the jitter.
+        self.assertLessEqual(adaptive.max_delay, timedelta(hours=12))
+        self.assertLessEqual(fixed.max_delay, timedelta(hours=1))
+
+class TestAdaptiveSubscription(TestCase):
+    def setUp(self) -> None:
+        self.client: MongoClient[Any] = MongoClient(tz_aware=True)
+        self.collection: Collection[SubsDict] = self.client.db.collection
+        self.sub = Subscription(
+            _id="yt:channel:7YOGHUfC1Tb6E4pudI9STA",
+            link="tests/data/feed@mentaloutlaw@001.xml",
+            title="Mental Outlaw",
+            time_between_fetches=HOUR,
+        )
+        self.sub._collection = self.collection
+        self.sub.insert()
+
+    def test_fixed(self) -> None:
+        self.sub.fetch()
+        sub_dict = self.collection.find_one({"_id": self.sub._id})
+        assert sub_dict # To appease mypy.
+        self.assertEqual(sub_dict["time_between_fetches"], HOUR)
+        self.assertListEqual(sub_dict["upload_history"], [])
+
+    def test_adaptive(self) -> None:
+        self.sub.min_time_between_fetches = HOUR
+        self.sub.max_time_between_fetches = 3 * DAY
+        self.sub.fetch()
+        sub_dict = self.collection.find_one({"_id": self.sub._id})
+        assert sub_dict # To appease mypy.
+        self.assertEqual(len(sub_dict["upload_history"]), HISTORY_SIZE)
+        self.assertEqual(sub_dict["upload_history"], sorted(sub_dict["upload_history"]))
+        # The fixture's uploads are long past, so it backs off to the maximum.
+        self.assertEqual(sub_dict["time_between_fetches"], 3 * DAY)
+        self.assertEqual(sub_dict["next_fetch_at"], sub_dict["last_fetch"] + timedelta(days=3))
+        # Failed fetches are rescheduled the same way.
+        self.sub.link = "tests/data/missing.xml"
+        self.sub.fetch_failed(Exception("Not found"))
+        sub_dict = self.collection.find_one({"_id": self.sub._id})
+        assert sub_dict # To appease mypy.
+        self.assertEqual(sub_dict["time_between_fetches"], 3 * DAY)
+
+    def tearDown(self) -> None:
+        self.client.close()
@@ -0,0 +1,75 @@
+from datetime import timedelta
+from typing import Any, Dict
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from mongomock import MongoClient
+from pymongo.collection import Collection
+from requests import ConnectionError, HTTPError
+
+from components.database import get_resolutions_collection
+from components.extractor.resolution_cache import ResolutionCache, resolution_key
+from components.extractor.typing import ResolutionDict
+from components.subscriptions.typing import SubsDict
+
+INFO = {
+    "id": "yt:channel:hlgI3UHCOnwUGzWzbJ3H5w",
+    "link": "https://www.youtube.com/channel/UChlgI3UHCOnwUGzWzbJ3H5w",
+    "title": "YTN NEWS",
+}
+
+class TestResolutionCache(TestCase):
+    def setUp(self) -> None:
+        self.client: MongoClient[Any] = MongoClient(tz_aware=True)
+        self.collection: Collection[SubsDict] = self.client.db.collection
+        self.resolutions: Collection[ResolutionDict] = get_resolutions_collection(self.collection)
+        self.cache = ResolutionCache(self.resolutions)
+        self.get_sub_info = patch('components.extractor.resolution_cache.get_sub_info_from_yt_url').start()
+        self.get_sub_info.return_value = INFO
+        self.addCleanup(patch.stopall)
+
+    def test_resolution_key(self) -> None:
+        for url in ("https://www.youtube.com/@YTNNEWS24", "https://youtube.com/@ytnnews24/videos",
+                    "//m.youtube.com/@ytnnews24?feature=shared"):
+            self.assertEqual(resolution_key(url), "@ytnnews24")
+        for url in ("https://www.youtube.com/channel/UChlgI3UHCOnwUGzWzbJ3H5w/featured",
+                    "https://www.youtube.com/feeds/videos.xml?channel_id=UChlgI3UHCOnwUGzWzbJ3H5w"):
+            self.assertEqual(resolution_key(url), INFO["id"])
+        for url in ("https://www.youtube.com/playlist?list=PLZHQObOWTQDMsr9K-rj53DwVRMYO3t5Yr",
+                    "https://www.youtube.com/watch?v=fNk_zzaMoSs&list=PLZHQObOWTQDMsr9K-rj53DwVRMYO3t5Yr"):
+            self.assertEqual(resolution_key(url), "yt:playlist:PLZHQObOWTQDMsr9K-rj53DwVRMYO3t5Yr")
+        self.assertEqual(resolution_key("https://www.youtube.com/c/YTNNEWS"), "c/ytnnews")
+        self.assertIsNone(resolution_key("https://www.youtube.com/watch?v=fNk_zzaMoSs"))
+        self.assertIsNone(resolution_key("https://example.com/@ytnnews24"))
+
+    def test_hits(self) -> None:
+        self.assertEqual(self.cache.get_sub_info("https://www.youtube.com/@ytnnews24"), INFO)
+        # Equivalent URLs, and those containing the resolved id, are hits.
+        for url in ("https://youtube.com/@YTNNEWS24/videos",
+                    "https://www.youtube.com/channel/UChlgI3UHCOnwUGzWzbJ3H5w"):
+            self.assertEqual(self.cache.get_sub_info(url), INFO)
+        self.get_sub_info.assert_called_once()
+        self.assertEqual(self.cache.stats(), {"hits": 2, "negative_hits": 0, "misses": 1})
+
+    def test_expiry(self) -> None:
+        self.cache.ttl = timedelta(0)
+        self.cache.get_sub_info("https://www.youtube.com/@ytnnews24")
+        self.cache.get_sub_info("https://www.youtube.com/@ytnnews24")
+        self.assertEqual(self.get_sub_info.call_count, 2)
+
+    def test_negative_caching(self) -> None:
+        self.get_sub_info.side_effect = AssertionError("No RSS link")
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                self.cache.get_sub_info("https://www.youtube.com/@nobody")
+        self.get_sub_info.assert_called_once()
+        self.assertEqual(self.cache.negative_hits, 1)
+        # Failures which may not happen again are not remembered.
+        response = MagicMock(status_code=503)
+        for error in (ConnectionError(), HTTPError(response=response)):
+            self.get_sub_info.side_effect = error
+            for _ in range(2):
+                with self.assertRaises(Exception):
+                    self.cache.get_sub_info("https://www.youtube.com/@flaky")
+        self.assertEqual(self.get_sub_info.call_count, 5)
+        self.assertEqual(self.resolutions.count_documents({}), 1)
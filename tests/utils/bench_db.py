@@ -0,0 +1,15 @@
+from os import getenv
+from typing import Any
+
+from mongomock import MongoClient as MockClient
+from pymongo import MongoClient
+
+def bench_client() -> Any:
+    """
+    Benchmarks use mongomock by default. Set BENCH_MONGO_URI to run them
+    against a real (throwaway) mongod instead, where indexes are used.
+    """
+    uri = getenv("BENCH_MONGO_URI")
+    if uri:
+        return MongoClient(uri, tz_aware=True)
+    return MockClient(tz_aware=True)
@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta, UTC
+
+from components.videos import VideoTuple
+
+def fake_video(i: int, analysed: bool = False,
+               start: datetime = datetime(2020, 1, 1, tzinfo=UTC)) -> VideoTuple:
+    """
+    A made-up video published i hours after start, for building histories
+    of arbitrary length.
+    """
+    published = start + timedelta(hours=i)
+    return VideoTuple(
+        id="yt:video:fake%d" % i,
+        link="https://www.youtube.com/watch?v=fake%d" % i,
+        title="Video %d" % i,
+        author="Fake",
+        author_channel="https://www.youtube.com/channel/UCfake",
+        published=published,
+        updated=published,
+        thumbnail="https://i1.ytimg.com/vi/fake%d/hqdefault.jpg" % i,
+        summary="Summary of video %d" % i,
+        analysed=analysed,
+        duration=i if analysed else -1,
+    )
@@ -0,0 +1,19 @@
+from typing import Any
+
+from mongomock.collection import BulkOperationBuilder
+
+def allow_update_one_in_bulk_write() -> None:
+    """
+    pymongo's UpdateOne passes a sort argument (new in pymongo 4.11) when it
+    is added to a bulk write, which mongomock does not accept, so its
+    bulk_write() fails on them. Accept it as long as it is not used.
+    """
+    add_update: Any = BulkOperationBuilder.add_update
+    if getattr(add_update, "accepts_sort", False):
+        return
+    def add_update_with_sort(self: Any, *args: Any, sort: Any = None, **kwargs: Any) -> Any:
+        if sort is not None:
+            raise NotImplementedError("mongomock cannot sort the documents of a bulk update")
+        return add_update(self, *args, **kwargs)
+    setattr(add_update_with_sort, "accepts_sort", True)
+    setattr(BulkOperationBuilder, "add_update", add_update_with_sort)
@@ -0,0 +1,56 @@
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from random import Random
+from statistics import mean
+from typing import Callable, List, NamedTuple, Sequence
+
+from feedparser import parse # type: ignore
+
+from components.subscriptions.polling import HISTORY_SIZE
+
+# Seconds to wait before the next fetch, given the upload times a fetch at
+# that time would have seen in the feed, oldest first.
+Strategy = Callable[[Sequence[datetime], datetime], int]
+
+class SimulationResult(NamedTuple):
+    requests: int
+    delays: List[timedelta] # From each upload to the fetch which saw it.
+
+    @property
+    def mean_delay(self) -> timedelta:
+        return timedelta(seconds=mean(delay.total_seconds() for delay in self.delays)) if self.delays else timedelta(0)
+
+    @property
+    def max_delay(self) -> timedelta:
+        return max(self.delays, default=timedelta(0))
+
+def simulate(uploads: Sequence[datetime], strategy: Strategy,
+             start: datetime, end: datetime) -> SimulationResult:
+    """
+    Replay an upload timeline, fetching at start and then whenever the
+    strategy says until end. Uploads before start are only history; later
+    ones are measured by how long it took a fetch to see them.
+    """
+    uploads = sorted(uploads)
+    requests = 0
+    delays = []
+    seen = bisect_right(uploads, start)
+    now = start
+    while now <= end:
+        requests += 1
+        visible = bisect_right(uploads, now)
+        delays += [now - upload for upload in uploads[seen:visible]]
+        seen = visible
+        now += timedelta(seconds=max(1, strategy(uploads[max(0, visible - HISTORY_SIZE):visible], now)))
+    return SimulationResult(requests, delays)
+
+def feed_timeline(path: str) -> List[datetime]:
+    return sorted(datetime.fromisoformat(entry.published) for entry in parse(path).entries)
+
+def regular_timeline(start: datetime, count: int, every: timedelta,
+                     jitter: timedelta = timedelta(0), seed: int = 0) -> List[datetime]:
+    """
+    count uploads every so often, each up to jitter late (reproducibly).
+    """
+    random = Random(seed)
+    return [start + every * i + jitter * random.random() for i in range(count)]
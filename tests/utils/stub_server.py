@@ -0,0 +1,131 @@
+from email.utils import formatdate
+from hashlib import md5
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps
+from os.path import basename
+from threading import Lock, Thread
+from time import sleep
+from types import TracebackType
+from typing import Any, List, Optional, Type
+from urllib.parse import parse_qs, urlparse
+
+from .get_random_vid_info import get_random_vid_duration
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: "_StubHTTPServer"
+    protocol_version = "HTTP/1.1" # Keep connections alive.
+    disable_nagle_algorithm = True # Headers and body are written separately.
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.stub.connections += 1
+
+    def do_GET(self) -> None:
+        stub = self.server.stub
+        with stub.lock:
+            stub.requests += 1
+            stub.active += 1
+            stub.max_active = max(stub.max_active, stub.active)
+        try:
+            sleep(stub.latency)
+            self.respond()
+        finally:
+            with stub.lock:
+                stub.active -= 1
+
+    def respond(self) -> None:
+        stub = self.server.stub
+        if stub.fail_next:
+            stub.fail_next -= 1
+            self.send_error(503)
+            return
+        url = urlparse(self.path)
+        if url.path == "/youtube/v3/videos":
+            self.respond_with_durations(parse_qs(url.query)["id"][0].split(","))
+            return
+        try:
+            with open("tests/data/" + basename(url.path), 'rb') as file:
+                body = file.read()
+        except OSError:
+            self.send_error(404)
+            return
+        etag = '"%s"' % md5(body).hexdigest()
+        last_modified = formatdate(stub.last_modified, usegmt=True)
+        if (self.headers.get("If-None-Match") == etag
+                or self.headers.get("If-Modified-Since") == last_modified):
+            stub.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/atom+xml; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        if stub.validators:
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def respond_with_durations(self, ids: List[str]) -> None:
+        # Like the YouTube Data API, with the durations used by the tests.
+        body = dumps({"items": [
+            {
+                "id": vid_id,
+                "contentDetails": {"duration": "PT%dS" % get_random_vid_duration(
+                    "https://www.youtube.com/watch?v=" + vid_id)},
+            }
+            for vid_id in ids
+        ]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    stub: "StubServer"
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        pass # Clients hanging up (e.g. on a timeout) are expected.
+
+class StubServer:
+    """
+    Serve the files in tests/data/ over HTTP on a random local port, with an
+    optional artificial latency per request. When validators is set, ETag and
+    Last-Modified headers are sent and conditional requests get a 304. The
+    next fail_next requests get a 503. /youtube/v3/videos answers like the
+    YouTube Data API, and max_active records the most requests handled at
+    once. Use it as a context manager.
+    """
+    def __init__(self, latency: float = 0, validators: bool = False) -> None:
+        self.latency = latency
+        self.validators = validators
+        self.last_modified = 1700000000.0
+        self.requests = 0
+        self.connections = 0
+        self.not_modified = 0
+        self.fail_next = 0
+        self.active = 0
+        self.max_active = 0
+        self.lock = Lock()
+        self._server = _StubHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self._server.stub = self
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+
+    def url(self, filename: str) -> str:
+        return "http://127.0.0.1:%d/%s" % (self._server.server_address[1], filename)
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type: Optional[Type[BaseException]],
+                 exc: Optional[BaseException], tb: Optional[TracebackType]) -> None:
+        self._server.shutdown()
+        self._server.server_close()
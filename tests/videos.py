@@ -0,0 +1,31 @@
+from unittest import TestCase
+
+from components.videos import (
+    VIDEO_KEYS, VIDEO_SCHEMA_VERSION, VideoTuple, decode_video_fields, video_projection,
+)
+from .utils.fake_videos import fake_video
+
+class TestVideos(TestCase):
+    def setUp(self) -> None:
+        self.vid = fake_video(3, analysed=True)
+
+    def test_document_round_trip(self) -> None:
+        doc = self.vid.to_document("yt:channel:fake")
+        self.assertEqual(doc["_v"], VIDEO_SCHEMA_VERSION)
+        self.assertEqual(doc["sid"], "yt:channel:fake")
+        self.assertEqual(set(doc), {"_v", *VIDEO_KEYS.values()})
+        self.assertEqual(VideoTuple.from_document(doc), self.vid)
+
+    def test_decode_old_documents(self) -> None:
+        # Positional arrays, from when videos were embedded in subscriptions.
+        self.assertEqual(VideoTuple.from_document(list(self.vid)), self.vid)
+        # Documents keyed by field name (schema version 0).
+        self.assertEqual(VideoTuple.from_document({"sub_id": "yt:channel:fake", **self.vid._asdict()}),
+                         self.vid)
+
+    def test_projection(self) -> None:
+        doc = self.vid.to_document("yt:channel:fake")
+        projection = video_projection(("id", "published"))
+        projected = {key: value for key, value in doc.items() if projection.get(key)}
+        self.assertEqual(decode_video_fields(projected),
+                         {"id": self.vid.id, "published": self.vid.published})